@@ -0,0 +1,125 @@
+import threading
+
+from typing import Optional, Hashable
+
+
+# 剪贴板后端基类：统一 "是否变化" 探测与读写接口
+class ClipboardBackend:
+    """
+    剪贴板后端接口
+    change_token() 必须是与剪贴板内容大小无关的廉价探测，返回值变化即表示剪贴板可能已变化；
+    无法廉价探测的后端返回None，调用方需自行读取内容比较
+    """
+    def change_token(self) -> Optional[Hashable]:
+        """返回当前剪贴板的变化标记"""
+        raise NotImplementedError("子类必须实现change_token方法")
+
+    def read_text(self) -> Optional[str]:
+        """读取剪贴板中的完整文本，没有文本时返回None"""
+        raise NotImplementedError("子类必须实现read_text方法")
+
+    def write_text(self, text: str) -> Optional[Hashable]:
+        """
+        写入文本到剪贴板
+        :return: 写入后的变化标记
+        """
+        raise NotImplementedError("子类必须实现write_text方法")
+
+
+# macOS 通用粘贴板：changeCount 探测
+class MacPasteboardBackend(ClipboardBackend):
+    def __init__(self):
+        from AppKit import NSPasteboard, NSPasteboardTypeString
+        self._pasteboard = NSPasteboard.generalPasteboard()
+        self._string_type = NSPasteboardTypeString
+
+    def change_token(self) -> int:
+        return self._pasteboard.changeCount()
+
+    def read_text(self) -> Optional[str]:
+        text = self._pasteboard.stringForType_(self._string_type)
+        return str(text) if text is not None else None
+
+    def write_text(self, text: str) -> int:
+        self._pasteboard.clearContents()
+        self._pasteboard.setString_forType_(text, self._string_type)
+        return self._pasteboard.changeCount()
+
+
+# wx 剪贴板：无廉价探测，作为非macOS平台的回退实现
+class WxClipboardBackend(ClipboardBackend):
+    def __init__(self):
+        # 使用线程局部存储来保存wx.App实例，避免线程问题
+        self._thread_local = threading.local()
+
+    def _get_wx_app(self):
+        """确保每个线程都有一个wx.App实例"""
+        import wx
+        if threading.current_thread() is threading.main_thread():
+            return
+        if not hasattr(self._thread_local, 'app'):
+            # 对于非GUI线程，必须创建一个wx.App实例
+            self._thread_local.app = wx.App(False)
+
+    def change_token(self) -> None:
+        return None
+
+    def read_text(self) -> Optional[str]:
+        import wx
+        self._get_wx_app()
+        clipboard = wx.Clipboard.Get()
+        if not clipboard.Open():
+            raise RuntimeError("无法打开剪贴板。")
+        try:
+            text_data = wx.TextDataObject()
+            if clipboard.GetData(text_data):
+                return text_data.GetText()
+            return None
+        finally:
+            clipboard.Close()
+
+    def write_text(self, text: str) -> None:
+        # 写入只在GUI线程发生，直接使用已有的wx.App
+        import wx
+        clipboard = wx.Clipboard.Get()
+        if not clipboard.Open():
+            raise RuntimeError("无法打开剪贴板。")
+        try:
+            clipboard.SetData(wx.TextDataObject(text))
+        finally:
+            clipboard.Close()
+        return None
+
+
+# 内存剪贴板：用于Linux下测试与基准
+class MemoryClipboardBackend(ClipboardBackend):
+    def __init__(self, text: Optional[str] = None):
+        self._lock = threading.Lock()
+        self._text = text
+        self._change_count = 0
+        self.read_count = 0  # 完整读取次数，便于验证探测是否生效
+
+    def change_token(self) -> int:
+        return self._change_count
+
+    def read_text(self) -> Optional[str]:
+        with self._lock:
+            self.read_count += 1
+            return self._text
+
+    def write_text(self, text: str) -> int:
+        with self._lock:
+            self._text = text
+            self._change_count += 1
+            return self._change_count
+
+    # 模拟其他应用的复制操作
+    set_text = write_text
+
+
+def default_backend() -> ClipboardBackend:
+    """优先使用macOS粘贴板，不可用时回退到wx剪贴板"""
+    try:
+        return MacPasteboardBackend()
+    except ImportError:
+        return WxClipboardBackend()
@@ -0,0 +1,1313 @@
+import bisect
+import hashlib
+import heapq
+import logging
+import os
+import pickle
+import re
+import struct
+import threading
+import time
+import zlib
+
+from array import array
+from collections import OrderedDict, namedtuple
+from collections.abc import MutableSequence
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # 未安装时使用标准库zlib
+    zstandard = None
+
+
+PREVIEW_CHARS = 100  # 列表预览长度
+
+# 正文编码方式
+CODEC_RAW = 0  # 未压缩的UTF-8
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+
+
+def text_digest(text: str) -> str:
+    """文本内容摘要（内容寻址的键）"""
+    return hashlib.sha256(text.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def pack_text(text: str, compress: bool = True) -> Tuple[int, bytes]:
+    """
+    把文本编码为字节，可用时优先使用zstd压缩，压缩后不更小则保留原文
+    :return: (编码方式, 数据)
+    """
+    data = text.encode('utf-8', 'surrogatepass')
+    if not compress:
+        return CODEC_RAW, data
+    if zstandard is not None:
+        codec, packed = CODEC_ZSTD, zstandard.ZstdCompressor(level=3).compress(data)
+    else:
+        codec, packed = CODEC_ZLIB, zlib.compress(data, 6)
+    if len(packed) >= len(data):
+        return CODEC_RAW, data
+    return codec, packed
+
+
+def unpack_text(codec: int, data: bytes) -> str:
+    """还原 pack_text 编码的文本"""
+    if codec == CODEC_ZLIB:
+        data = zlib.decompress(data)
+    elif codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("该条目使用zstd压缩，需要安装 zstandard")
+        data = zstandard.ZstdDecompressor().decompress(data)
+    return data.decode('utf-8', 'surrogatepass')
+
+
+# 剪贴板历史条目
+class ClipEntry:
+    """
+    剪贴板历史条目
+    小文本直接保存在内存中；较大的文本在内存中压缩保存（_packed）；
+    超过阈值的大文本保存为磁盘blob，内存只保留摘要、长度和预览
+    从分页快照加载的条目正文留在快照文件中（_ref 记录其位置和编码），需要时再读取
+    timestamp 为最近一次加入/使用的时间，pinned 的条目不会被保留策略淘汰
+    """
+    __slots__ = ('_text', 'digest', 'length', '_preview', 'timestamp', 'pinned', '_packed', '_ref')
+
+    def __init__(self, text: Optional[str] = None, digest: Optional[str] = None,
+                 length: int = 0, preview: str = "", timestamp: Optional[float] = None,
+                 pinned: bool = False):
+        self._text = text
+        self.digest = digest
+        self.length = len(text) if text is not None else length
+        self._preview = preview
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.pinned = pinned
+        self._packed = None  # 压缩后的正文 (编码方式, 数据)
+        self._ref = None  # 正文在快照文件中的位置 (偏移, 字节数, 编码方式)
+
+    @classmethod
+    def packed(cls, text: str) -> "ClipEntry":
+        """创建压缩保存正文的条目（预览不压缩）"""
+        packed = pack_text(text)
+        if packed[0] == CODEC_RAW:
+            return cls(text)
+        entry = cls(None, text_digest(text), len(text), text[:PREVIEW_CHARS])
+        entry._packed = packed
+        return entry
+
+    @classmethod
+    def from_meta(cls, meta: tuple) -> "ClipEntry":
+        """由快照页中的元数据创建条目（不含正文）"""
+        digest, length, preview, timestamp, pinned, ref = meta
+        entry = cls(None, digest, length, preview, timestamp, pinned)
+        entry._ref = ref
+        return entry
+
+    def to_meta(self, ref: Optional[tuple]) -> tuple:
+        """快照页中保存的元数据：(摘要, 长度, 预览, 时间戳, 固定标记, 正文位置)"""
+        return (self.content_digest(), self.length, self.preview, self.timestamp, self.pinned, ref)
+
+    @property
+    def is_blob(self) -> bool:
+        """完整内容是否保存在磁盘blob中"""
+        return self._text is None and self._packed is None and self._ref is None
+
+    @property
+    def preview(self) -> str:
+        """列表显示用的预览文本"""
+        text = self._text
+        if text is None:
+            return self._preview
+        return text[:PREVIEW_CHARS]
+
+    def display_text(self) -> str:
+        """列表框中显示的文本，超长内容加省略标记"""
+        if self.length > PREVIEW_CHARS:
+            return f"{self.preview} ~~"
+        return self.preview
+
+    def content_digest(self) -> str:
+        """内容摘要（内存条目首次使用时计算并缓存）"""
+        if self.digest is None:
+            self.digest = text_digest(self._text)
+        return self.digest
+
+    def __getstate__(self):
+        return (self._text, self.digest, self.length, self._preview, self.timestamp, self.pinned,
+                self._packed)
+
+    def __setstate__(self, state):
+        self._text, self.digest, self.length, self._preview = state[:4]
+        self._packed = state[6] if len(state) > 6 else None
+        self._ref = None
+        # 旧版本条目没有时间戳和固定标记，按刚加入处理
+        if len(state) > 4:
+            self.timestamp, self.pinned = state[4:6]
+        else:
+            self.timestamp, self.pinned = time.time(), False
+
+
+# 内容寻址的大文本存储
+class BlobStore:
+    """
+    超过阈值的剪贴板文本按内容摘要存放在blob目录中，
+    相同内容只存一份，完整文本仅在拷贝/编辑等需要时读取。
+    新blob先挂在内存待写队列中，由后台持久化线程调用flush()落盘。
+    超过压缩阈值的文本（内存条目和blob文件）压缩保存，读取时才解压。
+    """
+    _BLOB_MAGIC = b"MTBZ"  # 压缩blob文件头，后跟1字节编码方式；旧blob为纯文本
+
+    def __init__(self, blob_dir: str, threshold: int, compress_threshold: int = 0):
+        """
+        :param blob_dir: blob存放目录
+        :param threshold: 文本长度阈值（字符数），超过则存为blob
+        :param compress_threshold: 文本长度超过该值时压缩保存，0表示不压缩
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.blob_dir = blob_dir
+        self.threshold = threshold
+        self.compress_threshold = compress_threshold
+        self._pending: dict = {}  # 摘要 -> 尚未落盘的文本
+        self._lock = threading.Lock()
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir, digest)
+
+    def should_compress(self, text: str) -> bool:
+        """文本是否需要压缩保存"""
+        return 0 < self.compress_threshold < len(text)
+
+    def make_entry(self, text: str) -> ClipEntry:
+        """根据文本大小创建条目：小文本留在内存，较大的文本在内存中压缩，大文本登记为待写blob"""
+        if len(text) <= self.threshold:
+            return ClipEntry.packed(text) if self.should_compress(text) else ClipEntry(text)
+
+        digest = text_digest(text)
+        with self._lock:
+            self._pending.setdefault(digest, text)
+        return ClipEntry(None, digest, len(text), text[:PREVIEW_CHARS])
+
+    def read(self, entry: ClipEntry) -> str:
+        """读取blob条目的完整文本（快照中的正文由 ClipboardHistory.entry_text 读取）"""
+        if not entry.is_blob:
+            return entry._text
+        with self._lock:
+            text = self._pending.get(entry.digest)
+        if text is not None:
+            return text
+        with open(self._blob_path(entry.digest), "rb") as f:
+            data = f.read()
+        if data.startswith(self._BLOB_MAGIC):
+            header_size = len(self._BLOB_MAGIC) + 1
+            return unpack_text(data[header_size - 1], data[header_size:])
+        return data.decode('utf-8', 'surrogatepass')
+
+    def flush(self) -> bool:
+        """
+        把待写blob写入磁盘（先写临时文件再改名，避免中途崩溃留下残缺的blob）
+        :return: 是否全部写入（写入失败的留在队列中，下次重试）
+        """
+        with self._lock:
+            pending = list(self._pending.items())
+        for digest, text in pending:
+            path = self._blob_path(digest)
+            try:
+                if not os.path.exists(path):
+                    tmp_path = f"{path}.tmp"
+                    codec, data = pack_text(text, self.should_compress(text))
+                    with open(tmp_path, "wb") as f:
+                        if codec != CODEC_RAW:
+                            f.write(self._BLOB_MAGIC + bytes((codec,)))
+                        f.write(data)
+                    os.replace(tmp_path, path)
+                    self.logger.debug(f"写入大文本blob: {digest}（{len(text)} 字符）")
+            except OSError as e:
+                self.logger.error(f"写入blob失败: {str(e)}")
+                continue
+            with self._lock:
+                self._pending.pop(digest, None)
+        with self._lock:
+            return not self._pending
+
+    def collect_garbage(self, live: Iterable[str]):
+        """
+        删除已不被任何条目引用的blob
+        :param live: 仍被引用的blob摘要
+        """
+        live = set(live)
+        try:
+            for name in os.listdir(self.blob_dir):
+                if name not in live:
+                    os.remove(self._blob_path(name))
+                    self.logger.debug(f"清理未引用的blob: {name}")
+        except OSError as e:
+            self.logger.warning(f"清理blob失败: {str(e)}")
+
+
+# 保留策略只需要条目的长度、时间戳和固定标记
+_MetaView = namedtuple('_MetaView', ('length', 'timestamp', 'pinned'))
+
+
+# 待淘汰条目的标识：内容摘要（去重后在历史中唯一）和挑选时的使用时间，删除前据此确认条目未被重新使用
+EvictionKey = namedtuple('EvictionKey', ('digest', 'timestamp'))
+
+
+# 分页快照的元数据摘要
+class _SnapshotMeta:
+    """
+    快照中全部条目的元数据（不含预览和正文），按快照序号索引的紧凑数组，
+    供去重索引、保留策略和blob清理使用，避免为此加载所有页
+    """
+    __slots__ = ('digests', 'lengths', 'timestamps', 'flags')
+    PINNED = 1
+    BLOB = 2
+
+    def __init__(self, metas: Iterable[tuple] = ()):
+        self.digests: List[str] = []
+        self.lengths = array('q')
+        self.timestamps = array('d')
+        self.flags = bytearray()
+        for meta in metas:
+            self.add(meta)
+
+    def add(self, meta: tuple):
+        digest, length, _, timestamp, pinned, ref = meta
+        self.digests.append(digest)
+        self.lengths.append(length)
+        self.timestamps.append(timestamp)
+        self.flags.append((self.PINNED if pinned else 0) | (self.BLOB if ref is None else 0))
+
+    def view(self, idx: int) -> _MetaView:
+        return _MetaView(self.lengths[idx], self.timestamps[idx], bool(self.flags[idx] & self.PINNED))
+
+    def is_blob(self, idx: int) -> bool:
+        return bool(self.flags[idx] & self.BLOB)
+
+
+# 日志式剪贴板历史存储
+class ClipboardHistory(MutableSequence):
+    """
+    剪贴板历史列表：对外表现为普通列表，每次修改只在内存中登记一条小记录
+    (插入/更新/删除/移动/清空)，不做任何磁盘I/O。
+    后台持久化线程调用flush_pending()把积累的记录追加到日志，写入开销与条目大小相关
+    而与历史长度无关；日志记录超过阈值时压缩为快照（临时文件+改名，原子替换）。
+    日志记录带长度和CRC校验，崩溃时写了一半的末尾记录会被丢弃，不会破坏历史；
+    启动时加载快照并按序号重放日志。
+    同时维护 内容摘要->条目 的去重索引，相同内容在历史中只保留一份。
+
+    快照分页保存：文件头标记，之后依次为条目正文（较大的正文压缩保存）、
+    元数据页（摘要/长度/预览/时间戳/固定标记/正文位置）
+    和页表，文件末尾记录页表长度。启动时只读页表和第一页，其余条目在列表中以快照序号(int)占位，
+    访问时按页加载元数据；正文一直留在快照中，拷贝/编辑时才读取。
+    去重索引和保留策略需要的元数据由后台线程调用warm_up()一次性扫描得到。
+    """
+    SNAPSHOT_NAME = "history.snapshot"
+    JOURNAL_NAME = "history.journal"
+    _RECORD_HEADER = struct.Struct("<II")  # (记录长度, CRC32)
+    _SNAPSHOT_MAGIC = b"MTBHIST2"  # 分页快照文件头（旧版本快照为整体pickle）
+    _SNAPSHOT_FOOTER = struct.Struct("<Q")  # 页表长度，位于文件末尾
+    _PAGE_CACHE_SIZE = 8  # 缓存的元数据页数
+
+    def __init__(self, data_dir: str, compact_threshold: int = 500, page_size: int = 256,
+                 blob_store: Optional[BlobStore] = None):
+        """
+        :param data_dir: 快照与日志所在目录
+        :param compact_threshold: 日志记录数超过该值时压缩为快照
+        :param page_size: 快照每页的条目数
+        :param blob_store: 读取blob条目正文用的 BlobStore，其压缩阈值同时用于快照中的正文
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.compact_threshold = compact_threshold
+        self.page_size = page_size
+        self.blob_store = blob_store
+        self._snapshot_path = os.path.join(data_dir, self.SNAPSHOT_NAME)
+        self._journal_path = os.path.join(data_dir, self.JOURNAL_NAME)
+
+        self._items: list = []  # ClipEntry，或尚未加载的快照条目序号(int)
+        self._seq = 0  # 最后一条记录的序号
+        self._pending: list = []  # 尚未写入日志的记录 (序号, 操作, 参数)
+        self._journal_records = 0  # 日志文件中的记录数
+        self._journal = None  # 日志文件句柄（追加模式，仅持久化线程使用）
+        self._needs_compact = False  # 旧格式快照需要尽快改写为分页快照
+        self._lock = threading.Lock()  # 保证列表修改与记录登记一致（持久化线程据此拍快照）
+        self._io_lock = threading.Lock()  # 串行化日志/快照写入
+        self._observers: list = []  # 条目增删观察者（如搜索索引）
+        self._by_digest: Optional[dict] = None  # 内容摘要 -> 条目或占位序号（去重索引，warm_up时建立）
+
+        self._reader = None  # 分页快照只读句柄（读取页和正文，持有self._lock时使用）
+        self._pages: list = []  # 快照页表 [(偏移, 长度)]
+        self._snapshot_page_size = page_size  # 当前快照文件的每页条目数
+        self._page_cache: OrderedDict = OrderedDict()  # 页号 -> 该页条目（最近使用的几页）
+        self._meta: Optional[_SnapshotMeta] = None  # 快照元数据摘要（warm_up后可用）
+
+    def add_observer(self, observer):
+        """
+        注册条目变化观察者，观察者需实现：
+        entry_added(entry) / entry_removed(entry) / entry_moved(entry) / entries_cleared()
+        """
+        self._observers.append(observer)
+
+    def _notify(self, event: str, *args):
+        for observer in self._observers:
+            getattr(observer, event)(*args)
+
+    # ---------- 列表接口 ----------
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __getitem__(self, idx):
+        with self._lock:
+            if isinstance(idx, slice):
+                return [self._entry_at(i) for i in range(*idx.indices(len(self._items)))]
+            return self._entry_at(self._normalize_index(idx))
+
+    def __iter__(self):
+        # 逐项加载；需要全部条目时才遍历（如建立搜索索引）
+        for idx in range(len(self._items)):
+            try:
+                yield self[idx]
+            except IndexError:
+                return
+
+    def index(self, entry, start: int = 0, stop: int = None) -> int:
+        return self._items.index(entry, start, len(self._items) if stop is None else stop)
+
+    def __setitem__(self, idx: int, entry: ClipEntry):
+        with self._lock:
+            idx = self._normalize_index(idx)
+            old_entry = self._entry_at(idx)
+            self._detach(entry)
+            self._items[idx] = entry
+            self._unindex(old_entry)
+            if self._by_digest is not None:
+                self._by_digest[entry.content_digest()] = entry
+            self._record('update', idx, entry)
+        self._notify('entry_removed', old_entry)
+        self._notify('entry_added', entry)
+
+    def __delitem__(self, idx: int):
+        with self._lock:
+            idx = self._normalize_index(idx)
+            old_entry = self._entry_at(idx)
+            del self._items[idx]
+            self._unindex(old_entry)
+            self._record('delete', idx)
+        self._notify('entry_removed', old_entry)
+
+    def insert(self, idx: int, entry: ClipEntry):
+        with self._lock:
+            idx = max(0, min(len(self._items), idx if idx >= 0 else len(self._items) + idx))
+            self._detach(entry)
+            self._items.insert(idx, entry)
+            if self._by_digest is not None:
+                self._by_digest[entry.content_digest()] = entry
+            self._record('insert', idx, entry)
+        self._notify('entry_added', entry)
+
+    def move(self, src: int, dst: int, touch: bool = False):
+        """
+        把第src项移动到dst位置
+        :param touch: 是否同时把条目的使用时间更新为当前时间
+        """
+        with self._lock:
+            src = self._normalize_index(src)
+            dst = self._normalize_index(dst)
+            if src == dst and not touch:
+                return
+            entry = self._entry_at(src)
+            del self._items[src]
+            self._items.insert(dst, entry)
+            if touch:
+                entry.timestamp = time.time()
+            self._record('move', src, dst, entry.timestamp)
+        self._notify('entry_moved', entry)
+
+    def set_pinned(self, idx: int, pinned: bool):
+        """固定/取消固定第idx项，固定的条目不会被保留策略淘汰"""
+        with self._lock:
+            idx = self._normalize_index(idx)
+            self._entry_at(idx).pinned = pinned
+            self._record('pin', idx, pinned)
+
+    def remove_entries(self, keys: Iterable["EvictionKey"]) -> int:
+        """
+        一次删除多个条目（只记一条日志），返回实际删除的条数
+        :param keys: select_evictions()/warm_up() 返回的条目标识；挑选之后已被删除、固定或重新使用（时间戳变化）的条目跳过。
+                     每个标识只删除一项，内容相同的多项中删除最靠后的一项
+        """
+        keys = set(keys)
+        if not keys:
+            return 0
+        with self._lock:
+            meta = self._meta
+            indices = []
+            # 从后往前按 (摘要, 时间戳) 匹配，只比较内存中的摘要和元数据，不读取快照
+            for idx in range(len(self._items) - 1, -1, -1):
+                item = self._items[idx]
+                if isinstance(item, ClipEntry):
+                    key = EvictionKey(item.content_digest(), item.timestamp)
+                    pinned = item.pinned
+                elif meta is not None:
+                    view = meta.view(item)
+                    key = EvictionKey(meta.digests[item], view.timestamp)
+                    pinned = view.pinned
+                else:
+                    continue
+                if key in keys and not pinned:
+                    keys.discard(key)
+                    indices.append(idx)
+                    if not keys:
+                        break
+            if not indices:
+                return 0
+            indices.reverse()
+            removed = [self._items[idx] for idx in indices]
+            removed_ids = set(map(id, removed))
+            self._items = [item for item in self._items if id(item) not in removed_ids]
+            for entry in removed:
+                self._unindex(entry)
+            self._record('delete_many', indices)
+        for entry in removed:
+            # 未加载的占位条目不可能被观察者记录过
+            if isinstance(entry, ClipEntry):
+                self._notify('entry_removed', entry)
+        return len(removed)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            if self._by_digest is not None:
+                self._by_digest.clear()
+            self._record('clear')
+        self._notify('entries_cleared')
+
+    # ---------- 分页加载 ----------
+    def entry_text(self, entry: ClipEntry) -> str:
+        """读取条目的完整文本（内存、压缩数据、快照或blob），压缩的正文在此时才解压"""
+        with self._lock:
+            text = entry._text
+            if text is not None:
+                return text
+            packed = entry._packed
+            if packed is None and entry._ref is not None:
+                packed = self._read_body(entry._ref)
+        if packed is not None:
+            return unpack_text(*packed)
+        return self.blob_store.read(entry)
+
+    def text_at(self, idx: int) -> str:
+        """读取第idx项的完整文本"""
+        return self.entry_text(self[idx])
+
+    def digest_at(self, idx: int) -> str:
+        """第idx项的内容摘要（占位条目不加载正文）"""
+        with self._lock:
+            return self._digest_of(self._items[self._normalize_index(idx)])
+
+    def iter_pages(self) -> Iterator[List[ClipEntry]]:
+        """
+        逐页加载条目并返回（供后台线程建立索引，调用方处理完一页再读下一页）
+        每次只持锁加载一页，不长时间阻塞界面线程；期间的插入删除可能使个别条目被跳过，
+        最后在锁内补齐，每个条目只返回一次
+        """
+        idx = 0
+        returned = set()  # 已返回条目的id
+        while True:
+            with self._lock:
+                stop = min(len(self._items), idx + self._snapshot_page_size)
+                if stop < len(self._items):
+                    page = [self._entry_at(i) for i in range(idx, stop)]
+                else:
+                    page = [self._entry_at(i) for i in range(len(self._items))]
+                page = [entry for entry in page if id(entry) not in returned]
+                returned.update(map(id, page))
+            if page:
+                yield page
+            if stop >= len(self._items):
+                return
+            idx = stop
+
+    def _entry_at(self, idx: int) -> ClipEntry:
+        """返回第idx项，占位条目按页加载（调用方需持有self._lock）"""
+        item = self._items[idx]
+        if isinstance(item, ClipEntry):
+            return item
+        entry = self._load_page(item // self._snapshot_page_size)[item % self._snapshot_page_size]
+        self._items[idx] = entry
+        if self._by_digest is not None and self._by_digest.get(entry.digest) is item:
+            self._by_digest[entry.digest] = entry
+        return entry
+
+    def _load_page(self, page_no: int) -> List[ClipEntry]:
+        """读取一页条目，最近使用的页留在缓存中（调用方需持有self._lock）"""
+        page = self._page_cache.get(page_no)
+        if page is not None:
+            self._page_cache.move_to_end(page_no)
+            return page
+        page = [ClipEntry.from_meta(meta) for meta in self._read_page_meta(self._reader, self._pages, page_no)]
+        self._page_cache[page_no] = page
+        if len(self._page_cache) > self._PAGE_CACHE_SIZE:
+            self._page_cache.popitem(last=False)
+        return page
+
+    @staticmethod
+    def _read_page_meta(f, pages: list, page_no: int) -> list:
+        offset, length = pages[page_no]
+        f.seek(offset)
+        return pickle.loads(f.read(length))
+
+    def _read_body(self, ref: tuple) -> Tuple[int, bytes]:
+        """
+        读取快照中的条目正文（调用方需持有self._lock）
+        :return: (编码方式, 数据)
+        """
+        offset, size, codec = ref
+        self._reader.seek(offset)
+        return codec, self._reader.read(size)
+
+    def _detach(self, entry: ClipEntry):
+        """
+        新加入的条目若引用快照正文则先读入内存（保持压缩），
+        保证写入日志的条目自带内容（调用方需持有self._lock）
+        """
+        if entry._ref is not None:
+            codec, data = self._read_body(entry._ref)
+            if codec == CODEC_RAW:
+                entry._text = unpack_text(codec, data)
+            else:
+                entry._packed = (codec, data)
+            entry._ref = None
+
+    def _scan_snapshot(self):
+        """读取快照全部元数据页得到元数据摘要（只读页，不创建条目，在后台线程调用）"""
+        if self._meta is not None:
+            return
+        with self._io_lock:
+            if self._meta is not None or not self._pages:
+                return
+            started = time.perf_counter()
+            meta = _SnapshotMeta()
+            try:
+                # 使用单独的句柄，不与界面线程的页读取争用文件位置
+                with open(self._snapshot_path, "rb") as f:
+                    for page_no in range(len(self._pages)):
+                        for page_meta in self._read_page_meta(f, self._pages, page_no):
+                            meta.add(page_meta)
+            except OSError as e:
+                self.logger.error(f"读取剪贴板历史快照元数据失败: {str(e)}")
+                return
+            with self._lock:
+                self._meta = meta
+            self.logger.debug(f"快照元数据扫描完成（{len(meta.digests)} 条，"
+                              f"{(time.perf_counter() - started) * 1000:.1f} 毫秒）")
+
+    def is_warmed_up(self) -> bool:
+        """去重索引是否已建立（warm_up 读取快照失败时为False，可以重试）"""
+        return self._by_digest is not None
+
+    def warm_up(self) -> List["EvictionKey"]:
+        """
+        扫描快照元数据并建立去重索引（在后台线程调用，界面线程从不扫描快照）
+        :return: 建立索引之前加入、与已有条目重复的靠后条目的标识，交给 remove_entries() 删除
+        """
+        self._scan_snapshot()
+        return self._build_digest_index()
+
+    def blob_digests(self) -> set:
+        """当前历史引用的全部blob摘要（供blob清理使用）"""
+        self._scan_snapshot()
+        with self._lock:
+            digests = set()
+            for item in self._items:
+                if isinstance(item, ClipEntry):
+                    if item.is_blob:
+                        digests.add(item.digest)
+                elif self._meta.is_blob(item):
+                    digests.add(self._meta.digests[item])
+        return digests
+
+    # ---------- 去重 ----------
+    def find(self, entry: ClipEntry) -> int:
+        """
+        查找与条目内容相同的历史项位置，不存在返回-1
+        去重索引建立之前只在已加载的条目（和已扫描的元数据）中查找，不读取快照；
+        漏掉的重复项由 warm_up() 找出后删除
+        """
+        digest = entry.content_digest()
+        with self._lock:
+            if self._by_digest is None:
+                meta = self._meta
+                for idx, item in enumerate(self._items):
+                    if isinstance(item, ClipEntry):
+                        if item.content_digest() == digest:
+                            return idx
+                    elif meta is not None and meta.digests[item] == digest:
+                        return idx
+                return -1
+            existing = self._by_digest.get(digest)
+            if existing is None:
+                return -1
+            # list.index 对未定义__eq__的对象按身份比较，在C层完成
+            return self._items.index(existing)
+
+    def add_front(self, entry: ClipEntry) -> int:
+        """
+        把内容加到第一项：已存在则把原条目移到最前，不新增副本
+        :return: 原位置（0表示已在第一项，无变化），新增时返回-1
+        """
+        idx = self.find(entry)
+        if idx == -1:
+            self.insert(0, entry)
+        else:
+            self.move(idx, 0, touch=True)
+        return idx
+
+    def update(self, idx: int, entry: ClipEntry) -> int:
+        """
+        替换第idx项的内容；新内容与其他条目重复时删除那一项
+        :return: 替换后条目所在位置
+        """
+        idx = self._normalize_index(idx)
+        dup_idx = self.find(entry)
+        if dup_idx != -1 and dup_idx != idx:
+            del self[dup_idx]
+            if dup_idx < idx:
+                idx -= 1
+        self[idx] = entry
+        return idx
+
+    def remove_duplicates(self) -> int:
+        """删除重复内容（保留靠前的一项），返回删除的条数"""
+        seen = set()
+        duplicates = []
+        for idx, entry in enumerate(self):
+            digest = entry.content_digest()
+            if digest in seen:
+                duplicates.append(idx)
+            else:
+                seen.add(digest)
+        for idx in reversed(duplicates):
+            del self[idx]
+        return len(duplicates)
+
+    def _digest_of(self, item) -> str:
+        """条目或占位序号的内容摘要（调用方需持有self._lock）"""
+        if isinstance(item, ClipEntry):
+            return item.content_digest()
+        return self._meta.digests[item]
+
+    def _unindex(self, item):
+        """从去重索引中移除条目（仅当索引指向的正是该条目）"""
+        if self._by_digest is None:
+            return
+        digest = self._digest_of(item)
+        if self._by_digest.get(digest) is item:
+            del self._by_digest[digest]
+
+    def _build_digest_index(self) -> List["EvictionKey"]:
+        """
+        建立去重索引（靠前的条目优先），占位条目的摘要取自快照元数据
+        :return: 重复的靠后条目的标识
+        """
+        with self._lock:
+            if self._by_digest is not None or (self._meta is None and
+                                               not all(isinstance(item, ClipEntry) for item in self._items)):
+                return []
+            by_digest, duplicates = {}, []
+            for item in self._items:
+                digest = self._digest_of(item)
+                if digest not in by_digest:
+                    by_digest[digest] = item
+                elif isinstance(item, ClipEntry):
+                    duplicates.append(EvictionKey(digest, item.timestamp))
+                else:
+                    duplicates.append(EvictionKey(digest, self._meta.timestamps[item]))
+            self._by_digest = by_digest
+            return duplicates
+
+    def _normalize_index(self, idx: int) -> int:
+        if idx < 0:
+            idx += len(self._items)
+        if not 0 <= idx < len(self._items):
+            raise IndexError("剪贴板历史索引越界")
+        return idx
+
+    # ---------- 保留策略 ----------
+    def select_evictions(self, policy: "RetentionPolicy") -> List["EvictionKey"]:
+        """
+        按保留策略挑选应淘汰的条目（只读，可在后台线程调用）
+        固定的条目永不淘汰；从最旧的条目开始淘汰
+        返回不依赖列表位置和快照序号的标识，交给 remove_entries() 删除，期间压缩快照不影响结果
+        """
+        self._scan_snapshot()
+        with self._lock:
+            items = list(self._items)
+            meta = self._meta
+        views = [item if isinstance(item, ClipEntry) else meta.view(item) for item in items]
+        keys = []
+        for idx in policy.select(views):
+            item = items[idx]
+            digest = item.content_digest() if isinstance(item, ClipEntry) else meta.digests[item]
+            keys.append(EvictionKey(digest, views[idx].timestamp))
+        return keys
+
+    # ---------- 日志 ----------
+    def _record(self, op: str, *args):
+        """登记一条修改记录（调用方需持有self._lock）"""
+        self._seq += 1
+        self._pending.append((self._seq, op, args))
+
+    def has_pending(self) -> bool:
+        """是否有尚未写入日志的记录"""
+        return bool(self._pending)
+
+    def flush_pending(self):
+        """把积累的记录追加写入日志，必要时压缩为快照（在持久化线程中调用）"""
+        with self._io_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if pending:
+                try:
+                    if self._journal is None:
+                        self._journal = open(self._journal_path, "ab")
+                    for record in pending:
+                        payload = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+                        self._journal.write(self._RECORD_HEADER.pack(len(payload), zlib.crc32(payload)))
+                        self._journal.write(payload)
+                    self._journal.flush()
+                    os.fsync(self._journal.fileno())
+                    self._journal_records += len(pending)
+                except OSError as e:
+                    self.logger.error(f"写入剪贴板历史日志失败: {str(e)}")
+                    # 放回队列，下次重试
+                    with self._lock:
+                        self._pending[:0] = pending
+                    return
+            if self._needs_compact or self._journal_records >= self.compact_threshold:
+                self._compact()
+
+    def _read_journal(self, path: str) -> Tuple[list, int]:
+        """
+        读取日志文件中的完整记录
+        :return: (记录列表, 最后一条完整记录之后的文件偏移)
+        """
+        records = []
+        valid_end = 0
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return records, valid_end
+
+        header_size = self._RECORD_HEADER.size
+        pos = 0
+        while pos + header_size <= len(data):
+            length, crc = self._RECORD_HEADER.unpack_from(data, pos)
+            payload = data[pos + header_size:pos + header_size + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                self.logger.warning(f"日志 {path} 在偏移 {pos} 处记录不完整，已丢弃之后的内容")
+                break
+            records.append(pickle.loads(payload))
+            pos += header_size + length
+            valid_end = pos
+        return records, valid_end
+
+    def _apply(self, op: str, args: tuple):
+        """在内存列表上重放一条记录"""
+        items = self._items
+        if op == 'insert':
+            items.insert(args[0], args[1])
+        elif op == 'update':
+            items[args[0]] = args[1]
+        elif op == 'delete':
+            del items[args[0]]
+        elif op == 'move':
+            entry = self._entry_at(args[0]) if len(args) > 2 else items[args[0]]
+            del items[args[0]]
+            items.insert(args[1], entry)
+            if len(args) > 2:
+                entry.timestamp = args[2]
+        elif op == 'pin':
+            self._entry_at(args[0]).pinned = args[1]
+        elif op == 'delete_many':
+            for idx in reversed(args[0]):
+                del items[idx]
+        elif op == 'clear':
+            items.clear()
+
+    def _open_snapshot(self) -> bool:
+        """
+        打开快照：分页快照只读取页表和第一页，旧格式快照整体加载
+        :return: 快照是否存在
+        """
+        try:
+            f = open(self._snapshot_path, "rb")
+        except FileNotFoundError:
+            return False
+
+        if f.read(len(self._SNAPSHOT_MAGIC)) != self._SNAPSHOT_MAGIC:
+            with f:
+                f.seek(0)
+                snapshot = pickle.load(f)
+            self._items = list(snapshot['items'])
+            self._seq = snapshot['seq']
+            self._needs_compact = True
+            return True
+
+        footer_size = self._SNAPSHOT_FOOTER.size
+        f.seek(-footer_size, os.SEEK_END)
+        index_size, = self._SNAPSHOT_FOOTER.unpack(f.read(footer_size))
+        f.seek(-footer_size - index_size, os.SEEK_END)
+        index = pickle.loads(f.read(index_size))
+
+        self._reader = f
+        self._pages = index['pages']
+        self._snapshot_page_size = index['page_size']
+        self._seq = index['seq']
+        self._items = list(range(index['count']))
+        if self._pages:
+            self._load_page(0)
+        return True
+
+    def load(self) -> bool:
+        """
+        加载快照并重放日志
+        :return: 是否存在已保存的历史
+        """
+        found = self._open_snapshot()
+
+        snapshot_seq = self._seq
+        records, valid_end = self._read_journal(self._journal_path)
+        for seq, op, args in records:
+            # 快照已包含的记录跳过（快照替换后、截断日志前崩溃的情况）
+            if seq <= snapshot_seq:
+                continue
+            self._apply(op, args)
+            self._seq = seq
+            found = True
+        if os.path.exists(self._journal_path):
+            self._journal_records = len(records)
+            # 截掉末尾残缺的记录，后续追加从完整记录之后开始
+            with open(self._journal_path, "r+b") as f:
+                f.truncate(valid_end)
+        return found
+
+    def replace_all(self, entries: Iterable[ClipEntry]) -> bool:
+        """
+        用给定条目整体替换历史并立即写快照（用于迁移旧格式数据）
+        :return: 快照是否写入成功
+        """
+        with self._io_lock:
+            with self._lock:
+                self._items = list(entries)
+                self._by_digest = None
+            if self._compact():
+                return True
+            with self._lock:
+                self._needs_compact = True  # 替换的内容不在日志中，下次写日志时重试压缩
+            return False
+
+    # ---------- 压缩 ----------
+    def _compact(self) -> bool:
+        """
+        把当前列表写成分页快照并清空日志（调用方需持有self._io_lock）
+        占位条目的元数据和正文直接从旧快照复制，不创建条目对象；
+        内存中的正文（超过压缩阈值的压缩保存）写入快照后释放，之后按需从快照读取
+        :return: 新快照是否已替换旧快照（之后只是清空日志失败也算成功，日志记录都已包含在快照中）
+        """
+        with self._lock:
+            items = list(self._items)
+            seq = self._seq
+            old_pages = self._pages
+            old_page_size = self._snapshot_page_size
+
+        tmp_path = f"{self._snapshot_path}.tmp"
+        metas = []
+        ref_map = {}  # 旧快照正文位置 -> 新快照正文位置
+        written = []  # (条目, 正文位置)：内存中的正文已写入新快照
+        old = None
+        try:
+            if old_pages:
+                old = open(self._snapshot_path, "rb")
+            page_no, page = -1, None
+            with open(tmp_path, "wb") as f:
+                f.write(self._SNAPSHOT_MAGIC)
+                for item in items:
+                    packed = None
+                    if isinstance(item, ClipEntry):
+                        text = item._text
+                        if text is not None:
+                            packed = pack_text(text, self.blob_store is not None and
+                                               self.blob_store.should_compress(text))
+                        else:
+                            packed = item._packed
+                        meta = item.to_meta(None)
+                        old_ref = item._ref if packed is None else None
+                    else:
+                        if item // old_page_size != page_no:
+                            page_no = item // old_page_size
+                            page = self._read_page_meta(old, old_pages, page_no)
+                        meta = page[item % old_page_size]
+                        old_ref = meta[5]
+
+                    if packed is not None:
+                        codec, data = packed
+                        ref = (f.tell(), len(data), codec)
+                        f.write(data)
+                        written.append((item, ref))
+                    elif old_ref is not None:
+                        ref = ref_map.get(old_ref)
+                        if ref is None:
+                            old.seek(old_ref[0])
+                            data = old.read(old_ref[1])
+                            ref = (f.tell(), len(data), old_ref[2])
+                            f.write(data)
+                            ref_map[old_ref] = ref
+                    else:
+                        ref = None  # blob条目，正文在blob目录
+                    metas.append(meta[:5] + (ref,))
+
+                pages = []
+                for start in range(0, len(metas), self.page_size):
+                    data = pickle.dumps(metas[start:start + self.page_size], protocol=pickle.HIGHEST_PROTOCOL)
+                    pages.append((f.tell(), len(data)))
+                    f.write(data)
+                index = pickle.dumps({'seq': seq, 'count': len(metas), 'page_size': self.page_size,
+                                      'pages': pages}, protocol=pickle.HIGHEST_PROTOCOL)
+                f.write(index)
+                f.write(self._SNAPSHOT_FOOTER.pack(len(index)))
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            self.logger.error(f"剪贴板历史压缩失败: {str(e)}")
+            return False
+        finally:
+            if old is not None:
+                old.close()
+
+        meta_summary = _SnapshotMeta(metas)
+        with self._lock:
+            try:
+                os.replace(tmp_path, self._snapshot_path)
+                reader = open(self._snapshot_path, "rb")
+            except OSError as e:
+                self.logger.error(f"剪贴板历史压缩失败: {str(e)}")
+                return False
+            if self._reader is not None:
+                self._reader.close()
+            self._reader = reader
+            self._pages = pages
+            self._snapshot_page_size = self.page_size
+            self._page_cache.clear()
+            self._meta = meta_summary
+
+            # 占位序号改为新快照中的序号，已加载条目的正文位置改为新快照中的位置
+            remap = {item: new_idx for new_idx, item in enumerate(items) if not isinstance(item, ClipEntry)}
+            new_items = []
+            for item in self._items:
+                if isinstance(item, ClipEntry):
+                    if item._ref is not None:
+                        item._ref = ref_map[item._ref]
+                    new_items.append(item)
+                else:
+                    new_items.append(remap[item])
+            self._items = new_items
+            if self._by_digest is not None:
+                for digest, item in self._by_digest.items():
+                    if not isinstance(item, ClipEntry):
+                        self._by_digest[digest] = remap[item]
+            for entry, ref in written:
+                entry._preview = entry.preview
+                entry._ref = ref
+                entry._text = None
+                entry._packed = None
+            # 快照已包含的待写记录不必再写入日志
+            self._pending = [record for record in self._pending if record[0] > seq]
+            self._needs_compact = False
+
+        try:
+            # 日志中的记录都已包含在快照中
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            with open(self._journal_path, "wb"):
+                pass
+            self._journal_records = 0
+            self.logger.debug(f"剪贴板历史压缩完成（{len(metas)} 条，序号 {seq}）")
+        except OSError as e:
+            self.logger.error(f"清空剪贴板历史日志失败: {str(e)}")
+        return True
+
+    def close(self):
+        """写出剩余记录并关闭日志和快照"""
+        self.flush_pending()
+        with self._io_lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            with self._lock:
+                if self._reader is not None:
+                    self._reader.close()
+                    self._reader = None
+
+
+# 剪贴板历史保留策略
+class RetentionPolicy:
+    """
+    限制历史的条数、总字符数和最长保留时间（0表示不限制）
+    超出上限后一次淘汰到上限的 low_watermark 比例，把淘汰开销分摊到多次修改上
+    """
+    def __init__(self, max_items: int = 0, max_chars: int = 0, max_age: float = 0,
+                 low_watermark: float = 0.9):
+        """
+        :param max_items: 最大条数
+        :param max_chars: 最大总字符数
+        :param max_age: 最长保留时间(秒)，按最近使用时间计算
+        :param low_watermark: 触发淘汰后保留到上限的比例
+        """
+        self.max_items = max_items
+        self.max_chars = max_chars
+        self.max_age = max_age
+        self.low_watermark = low_watermark
+
+    def is_limited(self) -> bool:
+        """是否设置了任何限制"""
+        return bool(self.max_items or self.max_chars or self.max_age)
+
+    def select(self, items: list) -> List[int]:
+        """
+        返回应淘汰条目的位置（从最旧的开始）
+        :param items: 具有 length/timestamp/pinned 属性的条目
+        """
+        victims = []
+        count = len(items)
+        total_chars = sum(entry.length for entry in items) if self.max_chars else 0
+
+        # 超过上限才淘汰，淘汰到低水位
+        target_items = int(self.max_items * self.low_watermark) if self.max_items and count > self.max_items else count
+        target_chars = int(self.max_chars * self.low_watermark) if self.max_chars and total_chars > self.max_chars else total_chars
+        expire_before = time.time() - self.max_age if self.max_age else None
+
+        for idx in range(len(items) - 1, -1, -1):
+            entry = items[idx]
+            if entry.pinned:
+                continue
+            expired = expire_before is not None and entry.timestamp < expire_before
+            if not expired and count <= target_items and total_chars <= target_chars:
+                # 更新的条目只可能因过期被淘汰，没有过期限制时可以提前结束
+                if expire_before is None:
+                    break
+                continue
+            victims.append(idx)
+            count -= 1
+            total_chars -= entry.length
+        return victims
+
+
+# 剪贴板历史全文索引
+class SearchIndex:
+    """
+    增量维护的倒排索引：
+        中日韩文字按单字和相邻双字(bigram)切分，无需分词词典；
+        其他文字按单词切分，查询词按前缀匹配（完整匹配得分更高）
+    多个查询词取交集，按得分和最近使用排序
+    作为 ClipboardHistory 的观察者，随条目增删自动更新；第一次搜索时调用request_build()，
+    由后台线程调用build()逐页读取历史整体建立，建立期间发生的增删记录下来，建立完成后补上
+    """
+    _CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff'
+    _TOKEN_RE = re.compile(f'(?P<cjk>[{_CJK}]+)|(?P<word>[^\\W_{_CJK}]+)')
+    _CJK_SET = frozenset(chr(c) for start, end in ((0x3040, 0x30ff), (0x3400, 0x4dbf), (0x4e00, 0x9fff),
+                                                    (0xac00, 0xd7af), (0xf900, 0xfaff)) for c in range(start, end + 1))
+
+    def __init__(self, text_of, max_indexed_chars: int = 200000):
+        """
+        :param text_of: 获取条目完整文本的函数
+        :param max_indexed_chars: 每个条目最多索引的字符数
+        """
+        self._text_of = text_of
+        self.max_indexed_chars = max_indexed_chars
+        self._postings: dict = {}  # 词 -> 条目集合
+        self._entry_tokens: dict = {}  # 条目 -> 词集合（删除时使用）
+        self._order: dict = {}  # 条目 -> 最近使用序号
+        self._counter = 0
+        self._vocab: List[str] = []  # 排序的单词表，用于前缀查询
+        self._built = False
+        self._requested = False  # 是否已请求建立（第一次搜索时）
+        self._missed: Optional[list] = None  # 建立期间发生的 (处理方法, 参数...)，None表示不在建立中
+        self._lock = threading.Lock()  # 界面线程的增删查询与后台建立互斥
+
+    @classmethod
+    def tokenize(cls, text: str) -> set:
+        """切分文本为索引词集合"""
+        tokens = set()
+        for match in cls._TOKEN_RE.finditer(text.casefold()):
+            run = match.group()
+            if match.lastgroup == 'cjk':
+                tokens.update(run)
+                tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+            else:
+                tokens.add(run)
+        return tokens
+
+    def request_build(self):
+        """请求建立索引（不阻塞，由后台线程调用build()完成）"""
+        self._requested = True
+
+    def is_requested(self) -> bool:
+        return self._requested and not self._built
+
+    def build(self, history: "ClipboardHistory"):
+        """
+        按历史顺序（新在前）整体建立索引（在后台线程调用）
+        逐页读取和切分正文，不持锁，也不把全部正文留在内存中；
+        最后一次性写入索引、排序单词表，再补上期间的增删
+        """
+        with self._lock:
+            if self._built or self._missed is not None:
+                return
+            self._missed = []
+        started = time.perf_counter()
+        staged = []
+        try:
+            for page in history.iter_pages():
+                staged.extend((entry, self._tokens_of(entry)) for entry in page)
+        except Exception:
+            with self._lock:
+                self._missed = None  # 读取失败，下次搜索时重新请求建立
+                self._requested = False
+            raise
+        with self._lock:
+            self._postings.clear()
+            self._entry_tokens.clear()
+            self._order.clear()
+            for entry, tokens in reversed(staged):
+                self._index(entry, tokens)
+            self._vocab = sorted(token for token in self._postings if token[0] not in self._CJK_SET)
+            missed, self._missed = self._missed, None
+            self._built = True
+            for method, *args in missed:
+                getattr(self, method)(*args)
+        logging.getLogger(self.__class__.__name__).debug(
+            f"全文索引建立完成（{len(staged)} 条，{(time.perf_counter() - started) * 1000:.1f} 毫秒）")
+
+    def is_built(self) -> bool:
+        return self._built
+
+    # ---------- 观察者接口 ----------
+    def entry_added(self, entry: ClipEntry):
+        with self._lock:
+            if self._missed is not None:
+                self._missed.append(('_on_added', entry))
+            elif self._built:
+                self._on_added(entry)
+
+    def entry_removed(self, entry: ClipEntry):
+        with self._lock:
+            if self._missed is not None:
+                self._missed.append(('_on_removed', entry))
+            elif self._built:
+                self._on_removed(entry)
+
+    def entry_moved(self, entry: ClipEntry):
+        with self._lock:
+            if self._missed is not None:
+                self._missed.append(('_on_moved', entry))
+            elif self._built:
+                self._on_moved(entry)
+
+    def entries_cleared(self):
+        with self._lock:
+            if self._missed is not None:
+                self._missed.append(('_clear',))
+            else:
+                self._clear()
+
+    # 以下方法调用方需持有self._lock
+    def _on_added(self, entry: ClipEntry):
+        if entry not in self._entry_tokens:
+            tokens = self._tokens_of(entry)
+            for token in tokens:
+                if token not in self._postings and token[0] not in self._CJK_SET:
+                    bisect.insort(self._vocab, token)
+            self._index(entry, tokens)
+
+    def _on_removed(self, entry: ClipEntry):
+        for token in self._entry_tokens.pop(entry, ()):
+            entries = self._postings.get(token)
+            if entries is None:
+                continue
+            entries.discard(entry)
+            if not entries:
+                del self._postings[token]
+                if token[0] not in self._CJK_SET:
+                    idx = bisect.bisect_left(self._vocab, token)
+                    if idx < len(self._vocab) and self._vocab[idx] == token:
+                        del self._vocab[idx]
+        self._order.pop(entry, None)
+
+    def _on_moved(self, entry: ClipEntry):
+        if entry in self._order:
+            self._counter += 1
+            self._order[entry] = self._counter
+
+    def _clear(self):
+        self._postings.clear()
+        self._entry_tokens.clear()
+        self._order.clear()
+        self._vocab.clear()
+
+    def _tokens_of(self, entry: ClipEntry) -> set:
+        return self.tokenize(self._text_of(entry)[:self.max_indexed_chars])
+
+    def _index(self, entry: ClipEntry, tokens: set):
+        """写入倒排表（不维护单词表）"""
+        self._entry_tokens[entry] = tokens
+        self._counter += 1
+        self._order[entry] = self._counter
+        for token in tokens:
+            entries = self._postings.get(token)
+            if entries is None:
+                entries = self._postings[token] = set()
+            entries.add(entry)
+
+    # ---------- 查询 ----------
+    def search(self, query: str, limit: int = 5) -> List[ClipEntry]:
+        """
+        查询条目
+        :return: 按相关度排序的条目列表
+        """
+        with self._lock:
+            return self._search(query, limit)
+
+    def _search(self, query: str, limit: int) -> List[ClipEntry]:
+        terms = []  # 每个查询词的 {条目: 得分}
+        vocab = self._vocab
+        for match in self._TOKEN_RE.finditer(query.casefold()):
+            run = match.group()
+            if match.lastgroup == 'cjk':
+                grams = [run] if len(run) == 1 else [run[i:i + 2] for i in range(len(run) - 1)]
+                for gram in grams:
+                    terms.append(dict.fromkeys(self._postings.get(gram, ()), 2))
+            else:
+                scores = {}
+                idx = bisect.bisect_left(vocab, run)
+                while idx < len(vocab) and vocab[idx].startswith(run):
+                    token = vocab[idx]
+                    idx += 1
+                    weight = 2 if token == run else 1
+                    for entry in self._postings[token]:
+                        if scores.get(entry, 0) < weight:
+                            scores[entry] = weight
+                terms.append(scores)
+        if not terms:
+            return []
+
+        # 从最小的候选集开始求交集
+        terms.sort(key=len)
+        candidates = terms[0]
+        for scores in terms[1:]:
+            candidates = {entry: score + scores[entry] for entry, score in candidates.items() if entry in scores}
+            if not candidates:
+                return []
+        return heapq.nlargest(limit, candidates, key=lambda entry: (candidates[entry], self._order[entry]))
@@ -0,0 +1,448 @@
+import json
+import logging
+import marshal
+import os
+import sys
+import threading
+import time
+
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+
+# 采样标签注册表：线程ID -> 当前正在运行的工作类/热键处理器名称
+_thread_tags: dict = {}
+
+
+def set_thread_tag(tag: Optional[str]) -> Optional[str]:
+    """
+    设置当前线程的采样标签
+    :param tag: 标签名称，None表示清除
+    :return: 之前的标签
+    """
+    tid = threading.get_ident()
+    previous = _thread_tags.get(tid)
+    if tag is None:
+        _thread_tags.pop(tid, None)
+    else:
+        _thread_tags[tid] = tag
+    return previous
+
+
+def current_tag() -> Optional[str]:
+    """当前线程的采样标签"""
+    return _thread_tags.get(threading.get_ident())
+
+
+@contextmanager
+def sample_tag(tag: str):
+    """在with块内为当前线程打上采样标签，退出时恢复原标签"""
+    previous = set_thread_tag(tag)
+    try:
+        yield
+    finally:
+        set_thread_tag(previous)
+
+
+# 采样分析器：低开销的墙钟时间、分线程采样
+class SamplingProfiler:
+    """
+    定时抓取所有线程的调用栈并按 (标签, 线程, 调用栈) 计数
+    输出格式：
+        "collapsed": 折叠栈文本，可直接交给 flamegraph.pl / speedscope
+        "pstats": 与 cProfile 兼容的统计文件，可用 pstats / snakeviz 打开
+    """
+    FORMATS = ("collapsed", "pstats")
+
+    def __init__(self, output_dir: str, interval: float = 0.005, output_format: str = "collapsed",
+                 max_depth: int = 128, log_level: int = logging.INFO):
+        """
+        :param output_dir: 采样结果输出目录
+        :param interval: 采样间隔(秒)
+        :param output_format: 输出格式，"collapsed" 或 "pstats"
+        :param max_depth: 单个调用栈最多记录的帧数
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.setLevel(log_level)
+
+        if output_format not in self.FORMATS:
+            raise ValueError(f"不支持的输出格式: {output_format}")
+        self.output_dir = output_dir
+        self.interval = interval
+        self.output_format = output_format
+        self.max_depth = max_depth
+
+        self._samples: Counter = Counter()  # (标签, 线程名, 调用栈) -> 采样次数
+        self._frame_labels: dict = {}  # 代码对象 -> 帧标签缓存，避免每次采样拼接字符串
+        self._stop_event = threading.Event()
+        self._sampler_thread: Optional[threading.Thread] = None
+        self._started_at = 0.0
+
+    @classmethod
+    def from_env(cls, output_dir: str, env_var: str = "MAGIC_TOOLBOX_PROFILE") -> Optional["SamplingProfiler"]:
+        """
+        根据环境变量创建分析器
+        环境变量取值："1"/"collapsed" 输出折叠栈，"pstats" 输出pstats文件；未设置返回None
+        """
+        value = os.environ.get(env_var, "").strip().lower()
+        if not value or value in ("0", "false", "off"):
+            return None
+        output_format = value if value in cls.FORMATS else "collapsed"
+        return cls(output_dir, output_format=output_format)
+
+    def is_running(self) -> bool:
+        """判断是否正在采样"""
+        return self._sampler_thread is not None and self._sampler_thread.is_alive()
+
+    def start(self):
+        """开始采样"""
+        if self.is_running():
+            self.logger.warning("采样已在运行中，无需重复启动")
+            return
+        self._samples.clear()
+        self._stop_event.clear()
+        self._started_at = time.time()
+        self._sampler_thread = threading.Thread(target=self._sample_loop, name="SamplingProfiler", daemon=True)
+        self._sampler_thread.start()
+        self.logger.info(f"开始性能采样，间隔: {self.interval}秒，格式: {self.output_format}")
+
+    def stop(self) -> Optional[str]:
+        """
+        停止采样并写出结果
+        :return: 输出文件路径，没有采样数据时返回None
+        """
+        if not self.is_running():
+            return None
+        self._stop_event.set()
+        self._sampler_thread.join(timeout=1.0)
+        self._sampler_thread = None
+        return self.dump()
+
+    def toggle(self) -> Optional[str]:
+        """切换采样状态，停止时返回输出文件路径"""
+        if self.is_running():
+            return self.stop()
+        self.start()
+        return None
+
+    def _sample_loop(self):
+        """采样线程主循环"""
+        own_ident = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            thread_names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid == own_ident:
+                    continue
+                tag = _thread_tags.get(tid, "-")
+                self._samples[(tag, thread_names.get(tid, str(tid)), self._walk_stack(frame))] += 1
+
+    def _walk_stack(self, frame) -> Tuple:
+        """从叶子帧回溯，返回由根到叶排列的代码对象元组"""
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            stack.append(frame.f_code)
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def _frame_label(self, code) -> str:
+        """折叠栈中单帧的显示名称：函数名 (文件名:行号)"""
+        label = self._frame_labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._frame_labels[code] = label
+        return label
+
+    def dump(self) -> Optional[str]:
+        """将当前采样数据写入输出目录"""
+        if not self._samples:
+            self.logger.info("没有采样数据，跳过输出")
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self._started_at))
+        if self.output_format == "pstats":
+            path = os.path.join(self.output_dir, f"profile-{stamp}.prof")
+            self._write_pstats(path)
+        else:
+            path = os.path.join(self.output_dir, f"profile-{stamp}.collapsed")
+            self._write_collapsed(path)
+        self.logger.info(f"性能采样结果已写入: {path}（共 {sum(self._samples.values())} 个样本）")
+        return path
+
+    def _write_collapsed(self, path: str):
+        """折叠栈格式：标签;线程;根帧;...;叶帧 次数"""
+        with open(path, "w", encoding="utf-8") as f:
+            for (tag, thread_name, stack), count in self._samples.most_common():
+                frames = ";".join(self._frame_label(code) for code in stack)
+                f.write(f"{tag};{thread_name};{frames} {count}\n")
+
+    def _write_pstats(self, path: str):
+        """
+        写出 pstats.Stats 可加载的 marshal 字典
+        每个样本按采样间隔计时：叶子帧记自身时间，栈上每个函数记累计时间
+        """
+        def func_key(code):
+            return (code.co_filename, code.co_firstlineno, code.co_name)
+
+        stats = {}
+        for (_, _, stack), count in self._samples.items():
+            elapsed = count * self.interval
+            seen = set()
+            for depth, code in enumerate(stack):
+                key = func_key(code)
+                cc, nc, tt, ct, callers = stats.get(key, (0, 0, 0.0, 0.0, {}))
+                if depth == len(stack) - 1:
+                    tt += elapsed
+                # 递归调用只计一次累计时间
+                if key not in seen:
+                    ct += elapsed
+                    seen.add(key)
+                nc += count
+                cc += count
+                if depth > 0:
+                    caller = func_key(stack[depth - 1])
+                    c_cc, c_nc, c_tt, c_ct = callers.get(caller, (0, 0, 0.0, 0.0))
+                    callers[caller] = (c_cc + count, c_nc + count, c_tt, c_ct + elapsed)
+                stats[key] = (cc, nc, tt, ct, callers)
+        with open(path, "wb") as f:
+            marshal.dump(stats, f)
+
+
+def percentile(sorted_samples: list, p: float) -> float:
+    """已排序样本的百分位数（最近秩法）"""
+    return sorted_samples[min(len(sorted_samples) - 1, int(p * len(sorted_samples)))]
+
+
+# 一次热键触发的追踪记录
+class Trace:
+    """
+    一条追踪：从热键按下开始，记录之后各阶段（可能跨线程）的跨度
+    交给其他线程继续处理时引用计数加一，所有持有者都释放后追踪结束
+    """
+    __slots__ = ('name', 'start', 'spans', '_refs')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.spans: list = []  # (阶段名, 线程ID, 开始, 结束)
+        self._refs = 1
+
+    def add_span(self, name: str, start: float, end: float):
+        self.spans.append((name, threading.get_ident(), start, end))
+
+    def latency(self) -> float:
+        """热键按下到开始朗读的时间；没有朗读时为到最后一个阶段结束的时间"""
+        output_starts = [start for name, _, start, _ in self.spans if name == LatencyTracer.OUTPUT_SPAN]
+        if output_starts:
+            return min(output_starts) - self.start
+        return max((end for _, _, _, end in self.spans), default=self.start) - self.start
+
+
+# 端到端延迟追踪
+class LatencyTracer:
+    """
+    轻量跨度追踪：热键处理器开启一条追踪，各处用 span() 记录阶段耗时；
+    工作排入其他线程的队列时用 handoff() 交接，工作线程用 resume()/activate() 接着记录，
+    并自动记下排队时间。
+    按追踪名称（热键）维护滚动的延迟统计（p50/p95/p99），可导出 Chrome Trace 格式文件
+    （chrome://tracing 或 Perfetto 打开）。未处于追踪中时 span() 几乎没有开销。
+    """
+    OUTPUT_SPAN = "speak"  # 朗读开始即视为端到端延迟的终点
+    SUMMARY_NAME = "latency-summary.json"
+    TRACE_NAME = "latency-trace.json"
+
+    def __init__(self, output_dir: Optional[str] = None, window: int = 500, trace_buffer: int = 200,
+                 dump_every: int = 50):
+        """
+        :param output_dir: 统计与追踪文件输出目录，None表示只在内存中统计
+        :param window: 每个热键保留最近多少次的延迟用于统计
+        :param trace_buffer: 保留最近多少条完整追踪用于导出
+        :param dump_every: 每完成多少条追踪自动写一次文件（在后台线程写，不阻塞释放追踪的线程）
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.output_dir = output_dir
+        self.window = window
+        self.dump_every = dump_every
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._latencies: dict = {}  # 追踪名 -> deque(端到端延迟)
+        self._phases: dict = {}  # 追踪名 -> {阶段名 -> deque(耗时)}
+        self._traces: deque = deque(maxlen=trace_buffer)  # 最近完成的追踪
+        self._completed = 0
+        self._dump_thread: Optional[threading.Thread] = None  # 正在自动写文件的后台线程
+        self._dump_lock = threading.Lock()  # 串行化文件写出
+
+    # ---------- 记录 ----------
+    def current(self) -> Optional[Trace]:
+        """当前线程正在记录的追踪"""
+        return getattr(self._local, 'trace', None)
+
+    @contextmanager
+    def trace(self, name: str):
+        """开启一条追踪（热键处理器入口），整个处理过程记为 handler 阶段"""
+        trace = Trace(name)
+        previous = self.current()
+        self._local.trace = trace
+        try:
+            yield trace
+        finally:
+            trace.add_span("handler", trace.start, time.perf_counter())
+            self._local.trace = previous
+            self._release(trace)
+
+    @contextmanager
+    def span(self, name: str):
+        """记录当前追踪中的一个阶段"""
+        trace = self.current()
+        if trace is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            trace.add_span(name, start, time.perf_counter())
+
+    def handoff(self) -> Optional[Tuple[Trace, float]]:
+        """
+        把当前追踪交给另一个线程（入队时调用）
+        :return: 交接凭据，当前没有追踪时为None；凭据必须被 activate/resume 或 discard
+        """
+        trace = self.current()
+        if trace is None:
+            return None
+        with self._lock:
+            trace._refs += 1
+        return trace, time.perf_counter()
+
+    def discard(self, handoff: Optional[Tuple[Trace, float]]):
+        """放弃交接（排队的工作被合并或丢弃时调用）"""
+        if handoff is not None:
+            self._release(handoff[0])
+
+    def activate(self, handoff: Optional[Tuple[Trace, float]], queue_span: str):
+        """
+        在工作线程中接着记录交接来的追踪，并把入队到现在的时间记为排队阶段
+        须在 scope() 内调用，scope 结束时释放
+        """
+        if handoff is None:
+            return
+        trace, queued_at = handoff
+        trace.add_span(queue_span, queued_at, time.perf_counter())
+        self._local.trace = trace
+
+    @contextmanager
+    def scope(self):
+        """在此范围内 activate 的追踪于退出时释放，并恢复原来的追踪"""
+        previous = self.current()
+        try:
+            yield
+        finally:
+            trace = self.current()
+            if trace is not previous:
+                self._local.trace = previous
+                if trace is not None:
+                    self._release(trace)
+
+    @contextmanager
+    def resume(self, handoff: Optional[Tuple[Trace, float]], queue_span: str):
+        """activate 的上下文管理器形式"""
+        with self.scope():
+            self.activate(handoff, queue_span)
+            yield
+
+    def _release(self, trace: Trace):
+        with self._lock:
+            trace._refs -= 1
+            if trace._refs > 0:
+                return
+            latencies = self._latencies.get(trace.name)
+            if latencies is None:
+                latencies = self._latencies[trace.name] = deque(maxlen=self.window)
+                self._phases[trace.name] = {}
+            latencies.append(trace.latency())
+            phases = self._phases[trace.name]
+            for name, _, start, end in trace.spans:
+                if name not in phases:
+                    phases[name] = deque(maxlen=self.window)
+                phases[name].append(end - start)
+            self._traces.append(trace)
+            self._completed += 1
+            # 上一次自动写出尚未完成时跳过本次
+            if (self.output_dir is None or self._completed % self.dump_every != 0
+                    or (self._dump_thread is not None and self._dump_thread.is_alive())):
+                return
+            self._dump_thread = threading.Thread(target=self.dump, name="LatencyTracerDump", daemon=True)
+            self._dump_thread.start()
+
+    # ---------- 输出 ----------
+    def summary(self) -> dict:
+        """每个热键的端到端延迟与各阶段耗时统计（毫秒）"""
+        def stats(samples) -> dict:
+            ordered = sorted(samples)
+            return {f"p{int(p * 100)}": round(percentile(ordered, p) * 1000, 2) for p in (0.5, 0.95, 0.99)}
+
+        with self._lock:
+            latencies = {name: list(samples) for name, samples in self._latencies.items()}
+            phases = {name: {phase: list(samples) for phase, samples in by_phase.items()}
+                      for name, by_phase in self._phases.items()}
+        return {
+            name: {
+                'count': len(samples),
+                'latency_ms': stats(samples),
+                'phases_ms': {phase: stats(phase_samples) for phase, phase_samples in phases[name].items()},
+            }
+            for name, samples in latencies.items()
+        }
+
+    def chrome_trace(self) -> dict:
+        """最近完成的追踪转换为 Chrome Trace Event 格式"""
+        with self._lock:
+            traces = list(self._traces)
+        pid = os.getpid()
+        thread_names = {t.ident: t.name for t in threading.enumerate()}
+        events = []
+        seen_threads = set()
+        for trace_id, trace in enumerate(traces):
+            for name, tid, start, end in trace.spans:
+                seen_threads.add(tid)
+                events.append({
+                    'name': name, 'cat': trace.name, 'ph': 'X', 'pid': pid, 'tid': tid,
+                    'ts': round(start * 1e6, 1), 'dur': round((end - start) * 1e6, 1),
+                    'args': {'trace': trace.name, 'trace_id': trace_id},
+                })
+        for tid in seen_threads:
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                           'args': {'name': thread_names.get(tid, str(tid))}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def dump(self) -> Optional[str]:
+        """
+        写出延迟统计和追踪文件
+        :return: 统计文件路径，未设置输出目录时返回None
+        """
+        output_dir = self.output_dir
+        if output_dir is None:
+            return None
+        with self._dump_lock:
+            try:
+                os.makedirs(output_dir, exist_ok=True)
+                summary_path = os.path.join(output_dir, self.SUMMARY_NAME)
+                with open(summary_path, "w", encoding="utf-8") as f:
+                    json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+                with open(os.path.join(output_dir, self.TRACE_NAME), "w", encoding="utf-8") as f:
+                    json.dump(self.chrome_trace(), f)
+            except OSError as e:
+                self.logger.error(f"写出延迟追踪失败: {str(e)}")
+                return None
+        return summary_path
+
+
+# 全局追踪器：热键处理器、翻译器和朗读等各处共用
+tracer = LatencyTracer()
+
+
+def span(name: str):
+    """在全局追踪器的当前追踪中记录一个阶段"""
+    return tracer.span(name)
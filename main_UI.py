@@ -1,21 +1,38 @@
+import diagnostics
 import logging
 import objc
 import os
 import pickle
 import setting
 import sys
+import threading
 import time
 import wx
 import wx.adv
+import wx.dataview as dv
 
 from AppKit import NSApplication, NSApp, NSWindow
-from processer import MBartTranslator, VoiceOverHandler, ClipboardMonitor, TextBrowser, reboot_VoiceOver, TextProcessor
+from clipboard_store import BlobStore, ClipEntry, ClipboardHistory, RetentionPolicy, SearchIndex
+from processer import MBartTranslator, VoiceOverHandler, ClipboardMonitor, TextBrowser, reboot_VoiceOver, TextProcessor, HistoryPersister, SpeechQueue, changed_segment, MacroStore
 from typing import Optional, Tuple
 
 
 # 剪贴板编辑对话框
 class EditDialog(wx.Dialog):
-    def __init__(self, parent, title: str, init_content: str, size=(420, 350)):
+    # 处理步骤名称 -> 菜单文字的语言键
+    STEP_LABEL_KEYS = {
+        "remove_whitespace": 'edd_remove_whitespace_btn',
+        "merge_spaces": 'edd_merge_spaces_btn',
+        "num_to_chinese": 'edd_num_to_chinese_btn',
+        "punc_to_newline": 'edd_punc_to_newline_btn',
+        "to_halfwidth": 'edd_to_halfwidth_btn',
+    }
+    MACRO_HOTKEYS = "56789"  # 前几个宏的 Alt+数字 快捷键
+
+    def __init__(self, parent, title: str, init_content: str, size=(420, 350), macros_path: Optional[str] = None):
+        """
+        :param macros_path: 用户宏文件路径，None表示不提供宏
+        """
         super().__init__(parent, title=title, size=size)
         self.edit_content = init_content
 
@@ -71,6 +88,16 @@ class EditDialog(wx.Dialog):
             wx.NewIdRef(),
             f"{setting.lang_dict[setting.current_lang]['edd_punc_to_newline_btn']} ⌥+4"
         )
+        # 用户宏：多个处理步骤合并执行，只写回一次编辑框
+        self.macro_store = MacroStore(macros_path) if macros_path else None
+        self.macro_names: list = []
+        if self.macro_store:
+            self.func_menu.AppendSeparator()
+            for name in self.macro_store.load():
+                self.append_macro_menu(name)
+            self.new_macro_menu = self.func_menu.Append(
+                wx.NewIdRef(), setting.lang_dict[setting.current_lang]['edd_new_macro'])
+            self.Bind(wx.EVT_MENU, self.on_new_macro, self.new_macro_menu)
 
         # 按钮布局
         btn_sizer.Add(self.more_btn, 0, wx.RIGHT, 10)
@@ -166,6 +193,9 @@ class EditDialog(wx.Dialog):
             elif key_code == ord('4'):
                 self.on_punc_to_newline(None)
                 event.Skip(False)
+            elif key_code in map(ord, self.MACRO_HOTKEYS[:len(self.macro_names)]):
+                self.run_macro(self.macro_names[self.MACRO_HOTKEYS.index(chr(key_code))])
+                event.Skip(False)
             elif key_code in (ord('X'), ord('x')):
                 self.on_ok(None)
                 event.Skip(False)
@@ -311,6 +341,202 @@ class EditDialog(wx.Dialog):
         self.text_ctrl.SetValue(result)
 
 
+    def append_macro_menu(self, name: str):
+        """在弹出菜单中加入一个宏（前几个带 Alt+数字 快捷键）"""
+        idx = len(self.macro_names)
+        self.macro_names.append(name)
+        label = f"{name} ⌥+{self.MACRO_HOTKEYS[idx]}" if idx < len(self.MACRO_HOTKEYS) else name
+        if getattr(self, 'new_macro_menu', None):
+            item = self.func_menu.Insert(self.func_menu.GetMenuItemCount() - 1, wx.NewIdRef(), label)
+        else:
+            item = self.func_menu.Append(wx.NewIdRef(), label)
+        self.Bind(wx.EVT_MENU, lambda event: self.run_macro(name), item)
+
+
+    def run_macro(self, name: str):
+        """执行宏：所有步骤合并扫描，结果一次写回编辑框"""
+        text = self.text_ctrl.GetValue()
+        result = self.macro_store.pipeline(name).run(text)
+        if result != text:
+            self.text_ctrl.SetValue(result)
+
+
+    def on_new_macro(self, event):
+        """新建宏：输入名称后依次选择步骤，选择“完成”结束"""
+        lang = setting.lang_dict[setting.current_lang]
+        dialog = wx.TextEntryDialog(self, lang['edd_macro_name_prompt'], lang['edd_new_macro'])
+        name = dialog.GetValue().strip() if dialog.ShowModal() == wx.ID_OK else ""
+        dialog.Destroy()
+        if not name:
+            return
+
+        step_names = list(self.STEP_LABEL_KEYS)
+        choices = [lang[self.STEP_LABEL_KEYS[step]] for step in step_names] + [lang['edd_macro_done']]
+        steps = []
+        while True:
+            dialog = wx.SingleChoiceDialog(
+                self, lang['edd_macro_step_prompt'].format(len(steps) + 1), lang['edd_new_macro'], choices)
+            selection = dialog.GetSelection() if dialog.ShowModal() == wx.ID_OK else -1
+            dialog.Destroy()
+            if selection < 0:
+                return  # 取消则放弃整个宏
+            if selection == len(step_names):
+                break
+            steps.append(step_names[selection])
+        if not steps:
+            return
+
+        is_new = name not in self.macro_store.macros
+        self.macro_store.macros[name] = steps
+        self.macro_store.save()
+        if is_new:
+            self.append_macro_menu(name)
+        self.get_textCtrl_focus()
+
+
+# 剪贴板历史列表的虚拟数据模型
+class HistoryListModel(dv.DataViewVirtualListModel):
+    """只保存行数，控件显示某一行时才通过 row_label 取该行文本"""
+    def __init__(self, row_label):
+        """
+        :param row_label: 根据行号返回显示文本的函数
+        """
+        super().__init__(0)
+        self._row_label = row_label
+
+    def GetColumnCount(self) -> int:
+        return 1
+
+    def GetColumnType(self, col: int) -> str:
+        return "string"
+
+    def GetValueByRow(self, row: int, col: int) -> str:
+        return self._row_label(row)
+
+    def SetValueByRow(self, value, row: int, col: int) -> bool:
+        return False  # 只读
+
+
+# 剪贴板历史列表（虚拟模式）
+class HistoryListCtrl(dv.DataViewCtrl):
+    """
+    虚拟列表：DataViewCtrl 在 macOS 上是原生表格（NSTableView），VoiceOver 可以逐行朗读；
+    显示时通过 HistoryListModel 按需取可见行的文本，历史增删移动后只需重置行数，开销与历史长度无关。
+    提供与 wx.ListBox 相同的 GetSelection/SetSelection 接口，选中变化（包括代码设置）时调用 on_selection_changed
+    """
+    def __init__(self, parent, row_label, on_selection_changed):
+        """
+        :param row_label: 根据行号返回显示文本的函数
+        :param on_selection_changed: 选中项变化时调用的函数（无参数）
+        """
+        super().__init__(parent, style=dv.DV_SINGLE | dv.DV_NO_HEADER | wx.BORDER_SUNKEN)
+        self._model = HistoryListModel(row_label)
+        self.AssociateModel(self._model)
+        self._column = self.AppendTextColumn("", 0, mode=dv.DATAVIEW_CELL_INERT)
+        self._on_selection_changed = on_selection_changed
+        self.Bind(dv.EVT_DATAVIEW_SELECTION_CHANGED, lambda event: on_selection_changed())
+        self.Bind(wx.EVT_SIZE, self.on_size)
+
+    def on_size(self, event):
+        """唯一的一列占满控件宽度"""
+        self._column.SetWidth(self.GetClientSize().width)
+        event.Skip()
+
+    def GetSelection(self) -> int:
+        """当前选中行，没有选中返回-1"""
+        item = super().GetSelection()
+        return self._model.GetRow(item) if item.IsOk() else -1
+
+    def SetSelection(self, idx: int):
+        """选中并聚焦第idx行（滚动到可见）"""
+        item = self._model.GetItem(idx)
+        self.UnselectAll()
+        self.Select(item)
+        self.SetCurrentItem(item)
+        self.EnsureVisible(item)
+        self._on_selection_changed()
+
+    def clear_selection(self):
+        """取消选中"""
+        if self.GetSelection() != -1:
+            self.UnselectAll()
+            self._on_selection_changed()
+
+    def sync(self, count: int):
+        """
+        历史变化后同步行数并重绘
+        :param count: 当前历史条数
+        """
+        self._model.Reset(count)
+
+
+# 界面更新合并器
+class UIUpdateBatcher:
+    """
+    后台线程的更新请求先放入待处理队列（可在任意线程调用post），
+    界面线程每个帧间隔最多应用一次，一批事件只触发一次重绘，
+    连续的大量事件不会占满界面线程。
+    """
+    def __init__(self, apply_batch, frame_interval: float = 1 / 60):
+        """
+        :param apply_batch: 在界面线程中应用一批更新的函数，参数为 [(类型, 数据), ...]
+        :param frame_interval: 两次应用之间的最短间隔(秒)
+        """
+        self._apply_batch = apply_batch
+        self._frame_interval = frame_interval
+        self._pending: list = []
+        self._lock = threading.Lock()
+        self._scheduled = False  # 是否已安排下一次应用
+        self._last_flush = 0.0
+        self._closed = False
+
+    def post(self, kind: str, payload=None):
+        """登记一条更新（线程安全），同一帧内的更新合并应用"""
+        handoff = diagnostics.tracer.handoff()
+        with self._lock:
+            if self._closed:
+                diagnostics.tracer.discard(handoff)
+                return
+            self._pending.append((kind, payload, handoff))
+            if self._scheduled:
+                return
+            self._scheduled = True
+        wx.CallAfter(self._schedule)
+
+    def _schedule(self):
+        """界面线程：距离上次应用不足一个帧间隔时推迟到下一帧"""
+        delay = self._frame_interval - (time.monotonic() - self._last_flush)
+        if delay > 0:
+            wx.CallLater(max(1, int(delay * 1000)), self._flush)
+        else:
+            self._flush()
+
+    def _flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+            self._scheduled = False
+            if self._closed:
+                return
+        self._last_flush = time.monotonic()
+        if not batch:
+            return
+        # 每条更新都记下排队时间；应用这一批时接着记录最后一条的追踪（它决定了最终显示的内容）
+        handoffs = [handoff for _, _, handoff in batch if handoff is not None]
+        for handoff in handoffs[:-1]:
+            with diagnostics.tracer.resume(handoff, "ui_queue"):
+                pass
+        with diagnostics.tracer.resume(handoffs[-1] if handoffs else None, "ui_queue"):
+            self._apply_batch([(kind, payload) for kind, payload, _ in batch])
+
+    def close(self):
+        """退出时丢弃尚未应用的更新"""
+        with self._lock:
+            self._closed = True
+            batch, self._pending = self._pending, []
+        for _, _, handoff in batch:
+            diagnostics.tracer.discard(handoff)
+
+
 class MainFrame(wx.Frame):
     def __init__(self, parent, title):
         super(MainFrame, self).__init__(parent, title=title, size=(1024, 768))
@@ -319,36 +545,87 @@ class MainFrame(wx.Frame):
         self.init_toolbar()
         self.init_ui()
 
+        # 后台事件（新剪贴板内容、翻译结果、淘汰条目）按帧合并后在界面线程应用
+        self.ui_updates = UIUpdateBatcher(self._apply_ui_updates, frame_interval=setting.ui_frame_interval)
+
         # 实例化核心处理器
         self.translator = None
         self.vo_handler = VoiceOverHandler(
             log_level=logging.INFO,
             repeat_threshold=0.02,
-            loop_interval=0.01
+            loop_interval=setting.vo_phrase_poll_interval,
+            phrase_capacity=setting.vo_phrase_buffer_size
         )
+        # 朗读在独立线程中进行，热键处理立即返回，连续导航只朗读最新位置
+        self.speech = SpeechQueue(self.vo_handler.speak_text, log_level=logging.INFO)
         
         self.clipboard_monitor = ClipboardMonitor(
             log_level=logging.INFO, 
             loop_interval=0.1)
-        self.TB = TextBrowser()
+        self.TB = TextBrowser(
+            state_cache_size=setting.browse_state_cache_size,
+            state_cache_chars=setting.browse_state_cache_chars)
 
         # 初始化翻译器
         self.init_translator()
 
         #启动处理器
         self.clipboard_monitor.start_worker(callback=self.on_new_clipboard_content)
-        #self.vo_handler.start_worker()  # 启动 VO 监听线程
+        if setting.vo_phrase_monitor:
+            self.vo_handler.start_worker()  # 启动 VO 监听线程，朗读记入环形缓冲区
+        self.speech.start_worker()
 
         # 状态变量
         self.current_mode = "clipboard"
-        self.clipboard_list_data = []  # 剪贴板列表
+        self._spoken_text = ""  # 翻译编辑框上次朗读时的内容
+        self._text_speech_timer: Optional[wx.CallLater] = None
+        self._text_speech_handoff = None  # 引起文本变化的热键追踪，朗读时接着记录
         # 外部剪贴板数据
         app_support_dir = os.path.expanduser("~/Library/Application Support/")
         self.app_data_dir = os.path.join(app_support_dir, "MagicToolbox")
         os.makedirs(self.app_data_dir, exist_ok=True)
         self._clipboard_data_path = os.path.join(self.app_data_dir, ".clipboard_data")
+        # 超大剪贴板内容以blob形式存放，内存中只保留摘要、长度和预览；较大的内容压缩保存
+        self.blob_store = BlobStore(
+            os.path.join(self.app_data_dir, "blobs"),
+            threshold=setting.clipboard_blob_threshold,
+            compress_threshold=setting.clipboard_compress_threshold)
+        # 剪贴板列表（ClipEntry），修改以日志形式追加保存
+        self.clipboard_list_data = ClipboardHistory(
+            self.app_data_dir,
+            compact_threshold=setting.history_compact_threshold,
+            page_size=setting.history_page_size,
+            blob_store=self.blob_store)
+        # 全文索引：第一次搜索时由持久化线程在后台建立，之后随历史增删增量更新
+        self.search_index = SearchIndex(
+            self.clipboard_list_data.entry_text,
+            max_indexed_chars=setting.search_max_indexed_chars)
+        self.clipboard_list_data.add_observer(self.search_index)
+        # 后台持久化线程：合并保存请求并在界面线程之外写盘
+        # 设置了保留限制时，同时在后台按保留策略挑选淘汰条目
+        retention_policy = RetentionPolicy(
+            max_items=setting.history_max_items,
+            max_chars=setting.history_max_chars,
+            max_age=setting.history_max_age_days * 86400)
+        self.history_persister = HistoryPersister(
+            self.clipboard_list_data, self.blob_store,
+            log_level=logging.INFO,
+            coalesce_window=setting.history_save_delay,
+            retention_policy=retention_policy if retention_policy.is_limited() else None,
+            search_index=self.search_index)
+
+        # 性能采样分析器（环境变量 MAGIC_TOOLBOX_PROFILE 可在启动时直接开启）
+        profile_dir = os.path.join(self.app_data_dir, "profiles")
+        self.profiler = diagnostics.SamplingProfiler.from_env(profile_dir)
+        if self.profiler:
+            self.profiler.start()
+        else:
+            self.profiler = diagnostics.SamplingProfiler(profile_dir)
+        # 热键端到端延迟统计与追踪文件与采样结果放在一起
+        diagnostics.tracer.output_dir = profile_dir
 
         self.load_clipboard_data()
+        self.history_persister.start_worker(callback=self.on_history_evictions)
         self.edit_dialog = None
 
         # 注册热键
@@ -376,9 +653,11 @@ class MainFrame(wx.Frame):
         self.copy_btn = self.toolbar.AddTool(wx.NewIdRef(), setting.lang_dict[setting.current_lang]['copy_btn'], wx.Bitmap(), setting.lang_dict[setting.current_lang]['copy_btn_tips'])
         self.delete_btn = self.toolbar.AddTool(wx.NewIdRef(), setting.lang_dict[setting.current_lang]['delete_btn'], wx.Bitmap(), setting.lang_dict[setting.current_lang]['delete_btn_tips'])
         self.edit_btn = self.toolbar.AddTool(wx.NewIdRef(), setting.lang_dict[setting.current_lang]['edit_btn'], wx.Bitmap(), setting.lang_dict[setting.current_lang]['edit_btn_tips'])
+        self.pin_btn = self.toolbar.AddTool(wx.NewIdRef(), setting.lang_dict[setting.current_lang]['pin_btn'], wx.Bitmap(), setting.lang_dict[setting.current_lang]['pin_btn_tips'])
         self.toolbar.EnableTool(self.copy_btn.GetId(), False)
         self.toolbar.EnableTool(self.delete_btn.GetId(), False)
         self.toolbar.EnableTool(self.edit_btn.GetId(), False)
+        self.toolbar.EnableTool(self.pin_btn.GetId(), False)
         self.toolbar.Realize()
 
         # 事件绑定
@@ -386,6 +665,7 @@ class MainFrame(wx.Frame):
         self.Bind(wx.EVT_TOOL, self.on_copy_btn, self.copy_btn)
         self.Bind(wx.EVT_TOOL, self.on_delete_btn, self.delete_btn)
         self.Bind(wx.EVT_TOOL, self.on_edit_btn, self.edit_btn)
+        self.Bind(wx.EVT_TOOL, self.on_pin_btn, self.pin_btn)
 
 
     def create_menu_bar(self):
@@ -416,6 +696,11 @@ class MainFrame(wx.Frame):
         self.Bind(wx.EVT_MENU, self.on_reboot_vo_processer, rebootProc)
         cleanList = app_menu.Append(wx.NewId(), setting.lang_dict[setting.current_lang]['menu_opt_clean_list'])
         self.Bind(wx.EVT_MENU, self.on_clean_list, cleanList)
+        self.profiler_item = app_menu.AppendCheckItem(wx.NewId(), setting.lang_dict[setting.current_lang]['menu_opt_profiler'])
+        self.profiler_item.Check(self.profiler.is_running())
+        self.Bind(wx.EVT_MENU, self.on_toggle_profiler, self.profiler_item)
+        latency_item = app_menu.Append(wx.NewId(), setting.lang_dict[setting.current_lang]['menu_opt_latency'])
+        self.Bind(wx.EVT_MENU, self.on_export_latency, latency_item)
 
 
         # 将应用菜单添加到菜单栏
@@ -427,13 +712,23 @@ class MainFrame(wx.Frame):
 
     def on_exit(self, event):
         """处理退出事件：释放线程、热键，关闭窗口"""
-        # 存储剪贴板数据
-        self.save_clipboard_data()
+        self.ui_updates.close()
+        # 存储剪贴板数据：等后台持久化线程退出（启动扫描和建立索引可能仍在读取快照）后同步写出剩余数据
+        self.history_persister.stop_worker(timeout=None)
+        self.history_persister.flush()
+        self.clipboard_list_data.close()
+        # 写出未结束的性能采样
+        if self.profiler:
+            self.profiler.stop()
         # 1. 停止核心处理器线程
         if self.translator:
             self.translator.stop_worker()
-        #if self.vo_handler:
-            #self.vo_handler.stop_worker()
+        if self.vo_handler.is_running():
+            self.vo_handler.stop_worker()
+        self.speech.stop_worker()
+        logging.info(f"朗读延迟统计: {self.speech.latency_stats()}")
+        diagnostics.tracer.dump()
+        logging.info(f"屏幕阅读器调用统计: {self.vo_handler.vo.call_stats()}")
         if self.clipboard_monitor:
             self.clipboard_monitor.stop_worker()
 
@@ -486,25 +781,41 @@ class MainFrame(wx.Frame):
         self.main_sizer.Add(self.text_ctrl, 1, wx.EXPAND | wx.ALL, 10)
         self.text_ctrl.Hide()
 
-        # 剪贴板模式
-        self.list_Box = wx.ListBox(self.main_panel, style=wx.LB_HSCROLL | wx.SUNKEN_BORDER)
-        self.main_sizer.Add(self.list_Box, 1, wx.EXPAND | wx.ALL, 10)
+        # 剪贴板模式（虚拟列表，行文本取自条目缓存的预览）
+        self.history_list = HistoryListCtrl(self.main_panel, self._row_label, self.update_clipboard_buttons_state)
+        self.main_sizer.Add(self.history_list, 1, wx.EXPAND | wx.ALL, 10)
         
         self.main_panel.SetSizer(self.main_sizer)
         self.text_ctrl.Bind(wx.EVT_KEY_DOWN, self.on_key_to_translate)
         self.text_ctrl.Bind(wx.EVT_TEXT, self.on_text_changed)
-        self.list_Box.Bind(wx.EVT_KEY_DOWN, self.on_list_key_down)
-        self.list_Box.Bind(wx.EVT_LISTBOX, self.on_list_item_selected)
-        self.list_Box.Bind(wx.EVT_LISTBOX_DCLICK, self.on_list_item_deselected)
+        # 原生表格的按键不经过控件本身的 EVT_KEY_DOWN，用 EVT_CHAR_HOOK 在焦点位于列表内时处理
+        self.history_list.Bind(wx.EVT_CHAR_HOOK, self.on_list_key_down)
 
 
     def load_clipboard_data(self):
         """加载外部剪贴板列表"""
         try:
-            if os.path.exists(self._clipboard_data_path):
+            found = self.clipboard_list_data.load()
+            if not found and os.path.exists(self._clipboard_data_path):
+                # 迁移旧版本整表保存的数据文件
                 with open(self._clipboard_data_path, "rb") as f:  # 二进制读取
-                    self.clipboard_list_data = pickle.load(f)  # 列表对象
-                self.refresh_list_box()
+                    items = pickle.load(f)  # 列表对象
+                # 兼容旧版本保存的纯文本列表
+                entries = [item if isinstance(item, ClipEntry) else self.blob_store.make_entry(item)
+                           for item in items]
+                # 大文本blob和快照都写入成功后才移走旧文件（改名为.bak保留），否则下次启动重新迁移
+                blobs_written = self.blob_store.flush()
+                if self.clipboard_list_data.replace_all(entries) and blobs_written:
+                    os.replace(self._clipboard_data_path, f"{self._clipboard_data_path}.bak")
+                else:
+                    logging.error("迁移旧版剪贴板数据失败，保留原文件，下次启动时重试")
+                removed = self.clipboard_list_data.remove_duplicates()
+                if removed:
+                    logging.info(f"合并了 {removed} 条重复的剪贴板记录")
+                found = True
+            if found:
+                # 只加载了第一页，其余条目在访问时按页加载；blob清理由持久化线程在后台完成
+                self.refresh_history_list()
                 logging.info(f"加载剪贴板数据成功，共 {len(self.clipboard_list_data)} 条")
         except Exception as e:
             logging.warning(f"加载剪贴板数据失败（首次运行或文件损坏）: {str(e)}")
@@ -522,7 +833,7 @@ class MainFrame(wx.Frame):
             wx.MessageBox(str(e), "初始化错误", wx.OK | wx.ICON_ERROR)
             self.translator = None
         if self.translator.model_available == False:
-            self.text_ctrl.SetValue(setting.lang_dict[setting.current_lang]['model_warning'])
+            self.set_text_value(setting.lang_dict[setting.current_lang]['model_warning'])
 
 
     def register_hotkeys(self):
@@ -558,7 +869,7 @@ class MainFrame(wx.Frame):
                 # 绑定事件处理器（通过字符串获取类中的方法）
                 handler = getattr(self, hotkey["handler"], None)
                 if handler:
-                    self.Bind(wx.EVT_HOTKEY, handler, id=hk_id)
+                    self.Bind(wx.EVT_HOTKEY, self._tag_hotkey_handler(hotkey["handler"], handler), id=hk_id)
                 else:
                     logging.warning(f"热键'{hotkey['name']}'的处理器'{hotkey['handler']}'未定义")
 
@@ -566,6 +877,32 @@ class MainFrame(wx.Frame):
                 logging.error(f"注册热键'{hotkey['name']}'失败: {str(e)}")
 
 
+    def _tag_hotkey_handler(self, name: str, handler):
+        """包装热键处理器：执行期间为主线程打上采样标签，并开启一条端到端延迟追踪"""
+        def tagged_handler(event):
+            with diagnostics.sample_tag(name), diagnostics.tracer.trace(name):
+                return handler(event)
+        return tagged_handler
+
+
+    def on_toggle_profiler(self, event):
+        """菜单：开启/停止性能采样"""
+        output_path = self.profiler.toggle()
+        self.profiler_item.Check(self.profiler.is_running())
+        if output_path:
+            logging.info(f"性能采样已保存: {output_path}")
+            self.speech.say(setting.lang_dict[setting.current_lang]['profiler_saved'])
+
+
+    def on_export_latency(self, event):
+        """菜单：导出热键延迟统计（p50/p95/p99）和追踪文件"""
+        output_path = diagnostics.tracer.dump()
+        if output_path:
+            logging.info(f"热键延迟统计已保存: {output_path}")
+            logging.info(f"屏幕阅读器调用统计: {self.vo_handler.vo.call_stats()}")
+            self.speech.say(setting.lang_dict[setting.current_lang]['latency_saved'])
+
+
     def on_mode_switch(self, event):
         """翻译/剪贴板模式切换"""
         new_mode = "clipboard" if self.mode_group.GetSelection() == 1 else "translation"
@@ -576,15 +913,16 @@ class MainFrame(wx.Frame):
         if new_mode == "translation":
             # 显示编辑框，隐藏列表
             self.text_ctrl.Show()
-            self.list_Box.Hide()
+            self.history_list.Hide()
             self.toolbar.EnableTool(self.copy_btn.GetId(), False)
             self.toolbar.EnableTool(self.delete_btn.GetId(), False)
             self.toolbar.EnableTool(self.edit_btn.GetId(), False)
+            self.toolbar.EnableTool(self.pin_btn.GetId(), False)
         else:
             # 显示列表，隐藏编辑框
             self.text_ctrl.Hide()
-            self.list_Box.Show()
-            self.refresh_list_box()
+            self.history_list.Show()
+            self.refresh_history_list()
             self.update_clipboard_buttons_state()
         
         self.main_sizer.Layout()
@@ -592,45 +930,68 @@ class MainFrame(wx.Frame):
         self.Layout()
 
 
-    def refresh_list_box(self):
-        """刷新列表数据"""
-        self.list_Box.Clear()
-        for item in self.clipboard_list_data:
-            if len(item) > 100:
-                display_text = f"{item[:100]} ~~"
-            else:
-                display_text = item
-            self.list_Box.Append(display_text)
+    def _row_label(self, idx: int) -> str:
+        """列表第idx行显示的文本（条目所在页按需加载）"""
+        try:
+            item = self.clipboard_list_data[idx]
+        except IndexError:
+            return ""
+        if item.pinned:
+            return f"{setting.lang_dict[setting.current_lang]['pinned_mark']} {item.display_text()}"
+        return item.display_text()
+
+
+    def refresh_history_list(self):
+        """刷新列表：取消选中，同步行数并重绘可见行"""
+        self.history_list.clear_selection()
+        self.history_list.sync(len(self.clipboard_list_data))
+
+
+    def get_item_text(self, idx: int) -> str:
+        """获取列表项的完整文本（按需从快照或blob读取）"""
+        return self.clipboard_list_data.text_at(idx)
 
 
     def update_clipboard_buttons_state(self):
         """更新剪贴板按钮状态"""
-        # ListBox使用GetSelection()判断是否有选中项（-1表示无选中）
-        has_select = self.list_Box.GetSelection() != -1
+        # GetSelection()返回-1表示无选中
+        has_select = self.history_list.GetSelection() != -1
         self.toolbar.EnableTool(self.copy_btn.GetId(), has_select)
         self.toolbar.EnableTool(self.delete_btn.GetId(), has_select)
         self.toolbar.EnableTool(self.edit_btn.GetId(), has_select)
+        self.toolbar.EnableTool(self.pin_btn.GetId(), has_select)
 
 
     def on_copy_btn(self, event):
         """拷贝选中项到剪贴板"""
-        idx = self.list_Box.GetSelection()
+        idx = self.history_list.GetSelection()
         if idx == -1:
             return
-        content = self.clipboard_list_data[idx]
-        # 复制到系统剪贴板
-        clipboard = wx.Clipboard()
-        clipboard.Open()
-        clipboard.SetData(wx.TextDataObject(content))
-        clipboard.Close()
-        if idx > 0:
-            del self.clipboard_list_data[idx]
-            self.refresh_list_box()
+        if self.copy_item(idx):
+            self.refresh_history_list()
+            self.history_list.SetSelection(0)
+        self.save_clipboard_data()  # 使用时间已更新
+
+
+    def copy_item(self, idx: int) -> bool:
+        """
+        拷贝列表项到系统剪贴板并移到第一项，同时更新使用时间（保留策略按使用时间淘汰）
+        剪贴板监视器会忽略本程序自己的写入，因此在这里直接调整顺序
+        :return: 列表顺序是否发生变化
+        """
+        self.write_clipboard(self.get_item_text(idx))
+        self.clipboard_list_data.move(idx, 0, touch=True)
+        return idx != 0
+
+
+    def write_clipboard(self, content: str):
+        """写入系统剪贴板（经由监视器，避免把自身写入当作新内容再次处理）"""
+        self.clipboard_monitor.write_text(content)
 
 
     def on_delete_btn(self, event):
         """删除选中项"""
-        idx = self.list_Box.GetSelection()
+        idx = self.history_list.GetSelection()
         if idx == -1:
             return
 
@@ -639,21 +1000,21 @@ class MainFrame(wx.Frame):
             return
 
         del self.clipboard_list_data[idx]
-        self.refresh_list_box()
+        self.refresh_history_list()
         self.update_clipboard_buttons_state()
         self.save_clipboard_data()
 
 
     def on_edit_btn(self, event):
         """编辑选中项"""
-        idx = self.list_Box.GetSelection()
+        idx = self.history_list.GetSelection()
         if idx == -1:
             return
-        init_content = self.clipboard_list_data[idx]
+        init_content = self.get_item_text(idx)
         # 打开编辑窗口
         dialog = EditDialog(
             self, setting.lang_dict[setting.current_lang]['editor_title'],
-            init_content)
+            init_content, macros_path=os.path.join(self.app_data_dir, setting.macros_file_name))
         if dialog.ShowModal() == wx.ID_OK:
             new_content = dialog.get_result()
             list_len = len(self.clipboard_list_data)  # 记录当前列表长度
@@ -661,25 +1022,46 @@ class MainFrame(wx.Frame):
                 del self.clipboard_list_data[idx]
                 if list_len > 1:
                     new_idx = idx - 1 if idx == list_len - 1 else idx
-                    self.list_Box.SetSelection(new_idx)
+                    self.history_list.SetSelection(new_idx)
                 else:
                     new_idx = -1
             else:
-                self.clipboard_list_data[idx] = new_content
-                new_idx = idx  # 选中当前项
-            self.refresh_list_box()
+                # 编辑后与其他条目重复时合并为一项
+                new_idx = self.clipboard_list_data.update(idx, self.blob_store.make_entry(new_content))  # 选中当前项
             if self.clipboard_list_data and new_idx != -1:
-                self.list_Box.SetSelection(new_idx)  # 确保选中有效项
-                self.on_copy_btn(event)
+                self.copy_item(new_idx)  # 拷贝后该项位于第一项
+                new_idx = 0
+            self.refresh_history_list()
+            if new_idx != -1:
+                self.history_list.SetSelection(new_idx)  # 确保选中有效项
+            self.save_clipboard_data()
 
         dialog.Destroy()
+
+
+    def on_pin_btn(self, event):
+        """固定/取消固定选中项（固定项不会被自动淘汰）"""
+        idx = self.history_list.GetSelection()
+        if idx == -1:
+            return
+        pinned = not self.clipboard_list_data[idx].pinned
+        self.clipboard_list_data.set_pinned(idx, pinned)
+        self.refresh_history_list()
+        self.history_list.SetSelection(idx)
         self.save_clipboard_data()
+        self.speech.say(
+            setting.lang_dict[setting.current_lang]['pinned' if pinned else 'unpinned'])
+
+
+    def on_history_evictions(self, victims: list):
+        """后台线程挑出的淘汰条目，合并到下一帧在界面线程删除"""
+        self.ui_updates.post("evictions", victims)
 
 
     def on_list_key_down(self, event):
         """列表键盘事件"""
         key = event.GetKeyCode()
-        idx = self.list_Box.GetSelection()  # ListBox使用GetSelection()获取选中项索引
+        idx = self.history_list.GetSelection()
         if idx == -1:
             event.Skip()
             return
@@ -690,39 +1072,31 @@ class MainFrame(wx.Frame):
             self.on_copy_btn(None)
         elif key == wx.WXK_F2:
             self.on_edit_btn(None)
+        elif key == wx.WXK_F3:
+            self.on_pin_btn(None)
         else:
             event.Skip()
 
 
-    def on_list_item_selected(self, event):
-        """列表项选中：启用按钮"""
-        self.update_clipboard_buttons_state()
-
-
-    def on_list_item_deselected(self, event):
-        """列表项取消选中：禁用按钮"""
-        self.update_clipboard_buttons_state()
-
-
     def on_hotkey_altc(self, event):
         """Alt+C：查字典和英译中"""
         if event.GetId() != self.hotkey_ids["altc"]:
             return
 
-        last_phrase = self.vo_handler.get_last_phrase()
+        last_phrase = self.vo_handler.latest_phrase()
         if last_phrase:
             vo_text, _ = last_phrase
             explained_text = self.TB.get_char_explanation(vo_text)
             # 若解释存在（与原文本不同），则使用解释结果；否则用原文本
             
             if explained_text != vo_text:
-                self.vo_handler.speak_text(explained_text)
+                self.speech.say(explained_text)
                 return
 
             if self.translator:
                 self.translator.set_input_text(vo_text, "EN")
         else:
-            self.text_ctrl.SetValue(setting.lang_dict[setting.current_lang]['vo_warning'])
+            self.set_text_value(setting.lang_dict[setting.current_lang]['vo_warning'])
 
 
     def on_hotkey_altshiftc(self, event):
@@ -731,13 +1105,13 @@ class MainFrame(wx.Frame):
         if event.GetId() != self.hotkey_ids["altshiftc"]:
             return
 
-        last_phrase = self.vo_handler.get_last_phrase()
+        last_phrase = self.vo_handler.latest_phrase()
         if last_phrase:
             vo_text, _ = last_phrase
             if self.translator:
                 self.translator.set_input_text(vo_text, "ZH")
         else:
-            self.text_ctrl.SetValue(setting.lang_dict[setting.current_lang]['vo_warning'])
+            self.set_text_value(setting.lang_dict[setting.current_lang]['vo_warning'])
 
 
     def on_hotkey_altt(self, event):
@@ -751,39 +1125,31 @@ class MainFrame(wx.Frame):
         except Exception as e:
             logging.error(f"激活应用失败: {str(e)}")
         # 1. 读取系统剪贴板内容
-        clipboard = wx.Clipboard()
         init_content = ""
-        if clipboard.Open():
-            # 获取文本
-            text_data = wx.TextDataObject()
-            if clipboard.GetData(text_data):
-                init_content = text_data.GetText()
-            clipboard.Close()  # 关闭剪贴板
+        try:
+            init_content = self.clipboard_monitor.read_text() or ""
+        except Exception as e:
+            logging.error(f"读取剪贴板失败: {str(e)}")
 
         # 2. 打开编辑对话框
         self.edit_dialog = EditDialog(self, setting.lang_dict[setting.current_lang]["editor_title"], 
-            init_content)
+            init_content, macros_path=os.path.join(self.app_data_dir, setting.macros_file_name))
         if self.edit_dialog.ShowModal() == wx.ID_OK:
             new_content = self.edit_dialog.get_result()
             if self.clipboard_list_data:
                 del self.clipboard_list_data[0]
             if new_content:
-                self.clipboard_list_data.insert(0, new_content)  # 新增/替换为第一项
-                clipboard.Open()
-                clipboard.SetData(wx.TextDataObject(new_content))
-                clipboard.Close()
-                self.refresh_list_box()
-                self.list_Box.SetSelection(0)  # 确保选中第一项
+                self.clipboard_list_data.add_front(self.blob_store.make_entry(new_content))  # 新增/替换为第一项
+                self.write_clipboard(new_content)
             elif self.clipboard_list_data:
-                self.list_Box.SetSelection(0)
-                self.on_copy_btn(event)
+                self.copy_item(0)
             else:
-                clipboard.Open()
-                clipboard.SetData(wx.TextDataObject(''))
-                clipboard.Close()
+                self.write_clipboard('')
+            self.refresh_history_list()
+            if self.clipboard_list_data:
+                self.history_list.SetSelection(0)  # 确保选中第一项
+            self.save_clipboard_data()
         self.edit_dialog.Destroy()
-        self.save_clipboard_data()
-        self.refresh_list_box()
         self.system_level_hide_window(self)
 
 
@@ -792,18 +1158,17 @@ class MainFrame(wx.Frame):
         if event is not None and event.GetId() != self.hotkey_ids["altd"]:
             return
 
-        last_phrase = self.vo_handler.get_last_phrase()
+        last_phrase = self.vo_handler.latest_phrase()
         if not last_phrase:
             return
 
         vo_text, _ = last_phrase
-        # 与第一行相同则不添加（ListBox通过GetItems()获取所有项）
-        if self.clipboard_list_data and self.clipboard_list_data[0] == vo_text:
+        # 已在历史中则移到第一行，与第一行相同则不变
+        if self.clipboard_list_data.add_front(self.blob_store.make_entry(vo_text)) == 0:
             return
 
-        self.clipboard_list_data.insert(0, vo_text)
         if self.current_mode == "clipboard":
-            self.refresh_list_box()
+            self.refresh_history_list()
             self.update_clipboard_buttons_state()
             self.save_clipboard_data()
 
@@ -818,17 +1183,17 @@ class MainFrame(wx.Frame):
             self.on_hotkey_altd(None)
             return
 
-        last_phrase = self.vo_handler.get_last_phrase()
+        last_phrase = self.vo_handler.latest_phrase()
         if not last_phrase:
             return
 
         vo_text, _ = last_phrase
         # 追加内容（原内容+\n+VO内容）
-        self.clipboard_list_data[0] = f"{self.clipboard_list_data[0]}\n{vo_text}"
-        self.refresh_list_box()
-        # ListBox使用SetSelection()选中项，参数为索引
-        self.list_Box.SetSelection(0)
-        self.on_copy_btn(event)
+        self.clipboard_list_data.update(0, self.blob_store.make_entry(f"{self.get_item_text(0)}\n{vo_text}"))
+        self.refresh_history_list()
+        # 选中第一项
+        self.history_list.SetSelection(0)
+        self.copy_item(0)
         self.save_clipboard_data()
 
 
@@ -840,7 +1205,7 @@ class MainFrame(wx.Frame):
             return
 
         # 获取当前选中项索引
-        current_idx = self.list_Box.GetSelection()
+        current_idx = self.history_list.GetSelection()
         # 计算上一项索引（循环切换：顶部再往上回到最后一项）
         if current_idx <= 0:
             new_idx = len(self.clipboard_list_data) - 1  # 回到最后一项
@@ -848,22 +1213,65 @@ class MainFrame(wx.Frame):
             new_idx = current_idx - 1
 
         # 选中新项并获取内容
-        self.list_Box.SetSelection(new_idx)
-        selected_content = self.clipboard_list_data[new_idx]
+        self.history_list.SetSelection(new_idx)
+        selected_content = self.get_item_text(new_idx)
 
-        # 调用vo_handler朗读
-        self.vo_handler.speak_text(f"{new_idx + 1}, {selected_content}")
+        # 加入朗读队列
+        self.speech.say(f"{new_idx + 1}, {selected_content}")
         # 更新按钮状态
         self.update_clipboard_buttons_state()
 
-        self.TB.set_text(selected_content)
-        self.TB.browse("prev_line")
+        # 切换回浏览过的条目时恢复阅读位置
+        if not self.TB.set_text(selected_content, key=self.clipboard_list_data.digest_at(new_idx)):
+            self.TB.browse("prev_line")
+
+
+    def on_hotkey_altshifts(self, event):
+        """alt+shift+s: 搜索剪贴板历史并朗读结果"""
+        if not self.clipboard_list_data:
+            return
+        # 第一次搜索时才建立索引，在用户输入查询词期间由后台线程逐页读取历史
+        self.search_index.request_build()
+        try:
+            NSApp().activateIgnoringOtherApps_(True)
+        except Exception as e:
+            logging.error(f"激活应用失败: {str(e)}")
+
+        dialog = wx.TextEntryDialog(
+            self,
+            setting.lang_dict[setting.current_lang]['search_prompt'],
+            setting.lang_dict[setting.current_lang]['search_title'])
+        query = dialog.GetValue().strip() if dialog.ShowModal() == wx.ID_OK else ""
+        dialog.Destroy()
+        if not query:
+            return
+
+        if not self.search_index.is_built():
+            # 索引在后台建立，完成前不在界面线程读取全部历史
+            self.speech.say(setting.lang_dict[setting.current_lang]['search_indexing'])
+            return
+        hits = self.search_index.search(query, limit=setting.search_result_limit)
+        if not hits:
+            self.speech.say(setting.lang_dict[setting.current_lang]['search_no_result'])
+            return
+
+        # 选中最相关的一项，之后可继续用 alt+shift+7/9 浏览
+        hit_positions = [self.clipboard_list_data.index(entry) for entry in hits]
+        self.history_list.SetSelection(hit_positions[0])
+        self.update_clipboard_buttons_state()
+        if not self.TB.set_text(self.get_item_text(hit_positions[0]),
+                                key=self.clipboard_list_data.digest_at(hit_positions[0])):
+            self.TB.browse("prev_line")
+
+        spoken = "; ".join(f"{idx + 1}, {entry.preview}" for idx, entry in zip(hit_positions, hits))
+        self.speech.say(
+            f"{setting.lang_dict[setting.current_lang]['search_result']} {len(hits)}: {spoken}")
 
 
     def on_hotkey_altshift8(self, event):
         """alt+shift+8: 当前剪贴板上一行"""
         result_text = self.TB.browse("prev_line")
-        self.vo_handler.speak_text(result_text)
+        self.speech.say(result_text)
 
 
     def on_hotkey_altshift9(self, event):
@@ -874,7 +1282,7 @@ class MainFrame(wx.Frame):
             return
     
         # 获取当前选中项索引（-1表示无选中）
-        current_idx = self.list_Box.GetSelection()
+        current_idx = self.history_list.GetSelection()
         # 计算下一项索引（循环切换：底部再往下回到第一项）
         if current_idx == -1 or current_idx == len(self.clipboard_list_data) - 1:
             new_idx = 0  # 回到第一项
@@ -882,21 +1290,28 @@ class MainFrame(wx.Frame):
             new_idx = current_idx + 1  # 下一项
 
         # 选中新项并获取内容
-        self.list_Box.SetSelection(new_idx)
-        selected_content = self.clipboard_list_data[new_idx]  # 局部变量存储选中内容
+        self.history_list.SetSelection(new_idx)
+        selected_content = self.get_item_text(new_idx)  # 局部变量存储选中内容
 
-        # 调用vo_handler朗读
-        self.vo_handler.speak_text(f"{new_idx + 1}, {selected_content}")
+        # 加入朗读队列
+        self.speech.say(f"{new_idx + 1}, {selected_content}")
         # 更新按钮状态
         self.update_clipboard_buttons_state()
-        self.TB.set_text(selected_content)
-        self.TB.browse("prev_line")
+        # 切换回浏览过的条目时恢复阅读位置
+        if not self.TB.set_text(selected_content, key=self.clipboard_list_data.digest_at(new_idx)):
+            self.TB.browse("prev_line")
 
 
     def on_hotkey_altshiftu(self, event):
-        """alt+shift+u: 当前剪贴板前一个字"""
-        result_text = self.TB.browse("prev_char")
-        self.vo_handler.speak_text(result_text)
+        """alt+shift+u: 当前剪贴板按当前单位（字/词/句/段/行）向前移动"""
+        result_text = self.TB.browse("prev_unit")
+        self.speech.say(result_text)
+
+
+    def on_hotkey_altshiftl(self, event):
+        """alt+shift+l: 转子，切换 alt+shift+u/o 的浏览单位"""
+        unit = self.TB.cycle_unit()
+        self.speech.say(setting.lang_dict[setting.current_lang][f'unit_{unit}'])
 
 
     def on_hotkey_altshifti(self, event):
@@ -907,9 +1322,9 @@ class MainFrame(wx.Frame):
 
 
     def on_hotkey_altshifto(self, event):
-        """alt+shift+o: 当前剪贴板后一个字"""
-        result_text = self.TB.browse("next_char")
-        self.vo_handler.speak_text(result_text)
+        """alt+shift+o: 当前剪贴板按当前单位（字/词/句/段/行）向后移动"""
+        result_text = self.TB.browse("next_unit")
+        self.speech.say(result_text)
 
 
     def on_hotkey_altshiftj(self, event):
@@ -920,7 +1335,7 @@ class MainFrame(wx.Frame):
     def on_hotkey_altshiftk(self, event):
         """alt+shift+k: 当前剪贴板下一行"""
         result_text = self.TB.browse("next_line")
-        self.vo_handler.speak_text(result_text)
+        self.speech.say(result_text)
 
 
     def on_hotkey_altshiftm(self, event):
@@ -928,7 +1343,7 @@ class MainFrame(wx.Frame):
         row_column = self.TB._row_column
         total_chars = self.TB._total_chars
         if row_column:
-            self.vo_handler.speak_text(
+            self.speech.say(
                 f"{setting.lang_dict[setting.current_lang]['now']}: {row_column[0]} {setting.lang_dict[setting.current_lang]['row']}; {row_column[1]} {setting.lang_dict[setting.current_lang]['column']}; {total_chars}: {setting.lang_dict[setting.current_lang]['total_chars']}"
             )
 
@@ -938,16 +1353,108 @@ class MainFrame(wx.Frame):
         result_text = self.TB._current_line
         if not result_text:
             return
-        self.vo_handler.speak_text(result_text)
+        self.speech.say(result_text)
+
+
+    def _find_in_text(self, forward: bool, prompt: bool = False):
+        """在当前浏览的条目中查找并朗读匹配所在行"""
+        query = self.TB.last_query
+        if prompt or not query:
+            try:
+                NSApp().activateIgnoringOtherApps_(True)
+            except Exception as e:
+                logging.error(f"激活应用失败: {str(e)}")
+            dialog = wx.TextEntryDialog(
+                self,
+                setting.lang_dict[setting.current_lang]['find_prompt'],
+                setting.lang_dict[setting.current_lang]['find_title'],
+                query)
+            query = dialog.GetValue() if dialog.ShowModal() == wx.ID_OK else ""
+            dialog.Destroy()
+            if not query:
+                return
+        result_text = self.TB.find(query, forward=forward)
+        if result_text is None:
+            self.speech.say(setting.lang_dict[setting.current_lang]['find_not_found'])
+        else:
+            self.speech.say(result_text)
+
+
+    def on_hotkey_altshiftf(self, event):
+        """alt+shift+f: 输入内容并在当前条目中向后查找"""
+        self._find_in_text(forward=True, prompt=True)
+
+
+    def on_hotkey_altshiftg(self, event):
+        """alt+shift+g: 查找下一个"""
+        self._find_in_text(forward=True)
+
+
+    def on_hotkey_altshiftb(self, event):
+        """alt+shift+b: 查找上一个"""
+        self._find_in_text(forward=False)
+
+
+    def _recent_vo_text(self) -> Optional[str]:
+        """最近几条VO内容按行合并；未开启监听时提示并返回None"""
+        if not self.vo_handler.is_running():
+            self.speech.say(setting.lang_dict[setting.current_lang]['vo_monitor_off'])
+            return None
+        phrases = self.vo_handler.get_recent_phrases(setting.vo_recent_phrase_count)
+        return "\n".join(text for text, _ in phrases) or None
+
+
+    def on_hotkey_altshiftd(self, event):
+        """alt+shift+d: 最近几条VO内容合并后添加到列表第一行"""
+        vo_text = self._recent_vo_text()
+        if not vo_text:
+            return
+        if self.clipboard_list_data.add_front(self.blob_store.make_entry(vo_text)) == 0:
+            return
+        if self.current_mode == "clipboard":
+            self.refresh_history_list()
+            self.history_list.SetSelection(0)
+            self.update_clipboard_buttons_state()
+        self.save_clipboard_data()
+
+
+    def on_hotkey_altshiftr(self, event):
+        """alt+shift+r: 翻译最近几条VO内容"""
+        vo_text = self._recent_vo_text()
+        if vo_text and self.translator:
+            self.translator.set_input_text(vo_text, "EN")
 
 
     def on_text_changed(self, event):
-        """文本框内容变化：自动朗读"""
-        current_text = self.text_ctrl.GetValue()
-        self.vo_handler.speak_text(current_text)
+        """文本框内容变化：停顿后再朗读（连续输入时不断推迟）"""
+        delay_ms = int(setting.text_speech_delay * 1000)
+        # 只保留最近一次变化的追踪
+        diagnostics.tracer.discard(self._text_speech_handoff)
+        self._text_speech_handoff = diagnostics.tracer.handoff()
+        if self._text_speech_timer is not None and self._text_speech_timer.IsRunning():
+            self._text_speech_timer.Restart(delay_ms)
+        else:
+            self._text_speech_timer = wx.CallLater(delay_ms, self._speak_text_change)
         event.Skip()
 
 
+    def set_text_value(self, text: str):
+        """程序写入文本框（翻译结果、提示）：下次朗读完整内容，而不是与上次朗读内容的差异"""
+        self._spoken_text = ""
+        self.text_ctrl.SetValue(text)
+
+
+    def _speak_text_change(self):
+        """只朗读自上次朗读以来新增或改动的部分（用户输入）；程序写入后朗读完整内容"""
+        current_text = self.text_ctrl.GetValue()
+        segment = changed_segment(self._spoken_text, current_text)
+        self._spoken_text = current_text
+        handoff, self._text_speech_handoff = self._text_speech_handoff, None
+        with diagnostics.tracer.resume(handoff, "speech_delay"):
+            if segment.strip():
+                self.speech.say(segment)
+
+
     def on_to_translate(self, event, langType: str):
         """Option + 回车键：翻译文本"""
         if not self.translator:
@@ -976,24 +1483,51 @@ class MainFrame(wx.Frame):
 
 
     def on_translation_complete(self, original_text, translated_text):
-        """翻译完成：更新UI"""
-        wx.CallAfter(self._update_ui_with_translation, translated_text)
-
-    def _update_ui_with_translation(self, translated_text):
-        """更新编辑框内容"""
-        self.text_ctrl.SetValue(translated_text)
+        """翻译完成：合并到下一帧更新编辑框"""
+        self.ui_updates.post("translation", translated_text)
 
     def on_new_clipboard_content(self, content: str, timestamp: float):
-        wx.CallAfter(self._update_list_with_new_content, content, timestamp)
+        """新剪贴板内容：合并到下一帧加入历史"""
+        self.ui_updates.post("clipboard", content)
 
-    def _update_list_with_new_content(self, content: str, timestamp: float):
-        if self.clipboard_list_data and self.clipboard_list_data[0] == content:
+    def _apply_ui_updates(self, batch: list):
+        """
+        界面线程：先把一批更新全部应用到数据，再统一刷新一次列表、保存一次
+        有新内容时选中第一项，否则保持原选中项（被淘汰时取消选中）
+        """
+        history = self.clipboard_list_data
+        idx = self.history_list.GetSelection()
+        selected = history[idx] if idx != -1 else None
+        translation = None
+        added = False
+        removed = 0
+        for kind, payload in batch:
+            if kind == "clipboard":
+                # 已在历史中则移到第一项（不新增副本），与第一项相同则不变
+                if history.add_front(self.blob_store.make_entry(payload)) != 0:
+                    added = True
+            elif kind == "evictions":
+                removed += history.remove_entries(payload)
+            elif kind == "translation":
+                translation = payload  # 只显示最新的翻译结果
+
+        if translation is not None:
+            self.set_text_value(translation)
+        if not added and not removed:
             return
-        self.clipboard_list_data.insert(0, content)
+        if removed:
+            logging.info(f"删除了 {removed} 条重复或按保留策略淘汰的剪贴板记录")
         if self.current_mode == "clipboard":
-            self.refresh_list_box()
-            self.list_Box.SetSelection(0)
-            self.save_clipboard_data()
+            self.refresh_history_list()
+            if added:
+                self.history_list.SetSelection(0)
+            elif selected is not None:
+                try:
+                    self.history_list.SetSelection(history.index(selected))
+                except ValueError:
+                    pass
+            self.update_clipboard_buttons_state()
+        self.save_clipboard_data()
 
 
     def on_reboot_vo_processer(self, event):
@@ -1022,20 +1556,15 @@ class MainFrame(wx.Frame):
 
 
     def on_clean_list(self, event):
-        self.clipboard_list_data = []
-        self.refresh_list_box()
+        self.clipboard_list_data.clear()
+        self.refresh_history_list()
         self.update_clipboard_buttons_state()
         self.save_clipboard_data()
 
 
     def save_clipboard_data(self):
-        """保存剪贴板列表"""
-        try:
-            with open(self._clipboard_data_path, "wb") as f:  # 二进制写入
-                pickle.dump(self.clipboard_list_data, f)  # 直接存储列表对象
-            logging.debug(f"保存剪贴板数据成功（{len(self.clipboard_list_data)} 条）")
-        except Exception as e:
-            logging.error(f"保存剪贴板数据失败: {str(e)}")
+        """保存剪贴板列表：通知后台持久化线程，不在界面线程写盘"""
+        self.history_persister.mark_dirty()
 
 
     def system_level_hide_window(self, window):
@@ -1,18 +1,31 @@
 ## https://hf-mirror.com/facebook/mbart-large-50-many-to-many-mmt/resolve/main/model.safetensors?download=trueimport re
 
-import appscript
+import diagnostics
+import hashlib
+import json
 import logging
 import os
 import re 
+import screen_reader
 import setting
 import sys
 import threading
 import time
 import torch
-import wx
+import unicodedata
 
+from array import array
+from bisect import bisect_left, bisect_right
+from clipboard_backend import ClipboardBackend, default_backend
+from collections import OrderedDict, deque, namedtuple
+from functools import lru_cache
 from transformers import MBartForConditionalGeneration, MBart50TokenizerFast
-from typing import Optional, Tuple, Callable
+from typing import Optional, Tuple, Callable, Iterable, List
+
+try:
+    import jieba
+except ImportError:  # 未安装时中文按单字分词
+    jieba = None
 
 
 # 多线程管理基类：封装线程启停
@@ -54,19 +67,22 @@ class BaseThreadedWorker:
         """线程主循环：持续执行任务并处理结果"""
         self._is_running = True
         self._stop_event.clear()  # 重置停止事件
+        diagnostics.set_thread_tag(self.__class__.__name__)  # 采样分析器按工作类归类
         self.logger.info(f"线程启动，循环间隔: {self._loop_interval}秒")
         
         while self._is_running:
             try:
-                # 执行子类实现的任务逻辑
-                result = self._run_task()
-                
-                # 若有有效结果且设置了回调，触发回调
-                if result is not None and self._result_callback:
-                    if isinstance(result, tuple):
-                        self._result_callback(*result)  # 解包元组参数
-                    else:
-                        self._result_callback(result)  # 单个参数
+                # 任务中接手的延迟追踪在回调结束后释放
+                with diagnostics.tracer.scope():
+                    # 执行子类实现的任务逻辑
+                    result = self._run_task()
+
+                    # 若有有效结果且设置了回调，触发回调
+                    if result is not None and self._result_callback:
+                        if isinstance(result, tuple):
+                            self._result_callback(*result)  # 解包元组参数
+                        else:
+                            self._result_callback(result)  # 单个参数
                         
             except Exception as e:
                 self.logger.error(f"任务执行出错: {str(e)}", exc_info=True)
@@ -97,10 +113,10 @@ class BaseThreadedWorker:
         )
         self._worker_thread.start()
 
-    def stop_worker(self, timeout: float = 1.0):
+    def stop_worker(self, timeout: Optional[float] = 1.0):
         """
         停止工作线程
-        :param timeout: 等待线程退出的超时时间(秒)
+        :param timeout: 等待线程退出的超时时间(秒)，None表示一直等到线程退出
         """
         if not self._is_running or not self._worker_thread:
             self.logger.warning("线程未在运行，无需停止")
@@ -133,6 +149,7 @@ class MBartTranslator(BaseThreadedWorker):
         self._model = None
         self._tokenizer = None
         self._input_text: Optional[str] = None  # 待翻译文本
+        self._input_handoff = None  # 待翻译文本对应的延迟追踪交接
         self._dictionary: dict = {}
 
         #查找模型
@@ -229,9 +246,11 @@ class MBartTranslator(BaseThreadedWorker):
         
         # 统一转为小写，匹配词典键
         lower_word = word.strip().lower()
-        if lower_word in self._dictionary:
-            self.logger.debug(f"词典命中：{word} → {self._dictionary[lower_word]}")
-            return self._dictionary[lower_word]
+        with diagnostics.span("dict_lookup"):
+            explanation = self._dictionary.get(lower_word)
+        if explanation is not None:
+            self.logger.debug(f"词典命中：{word} → {explanation}")
+            return explanation
         else:
             self.logger.debug(f"词典未命中：{word}（将调用模型翻译）")
             return None
@@ -239,6 +258,9 @@ class MBartTranslator(BaseThreadedWorker):
 
     def set_input_text(self, text: str, langType: str):
         """设置待翻译的文本）"""
+        # 尚未处理的旧文本被替换，其追踪随之结束
+        diagnostics.tracer.discard(self._input_handoff)
+        self._input_handoff = diagnostics.tracer.handoff()
         self._input_text = text.strip()
         self._langType = langType
 
@@ -307,17 +329,18 @@ class MBartTranslator(BaseThreadedWorker):
         # 分词器编码（将文本转为模型可识别的Tensor
         self._tokenizer.src_lang = src_lang  # 设置源语言
         self._tokenizer.tgt_lang = tgt_lang  # 设置目标语言
-        inputs = self._tokenizer(
-            translate_prompt,
-            return_tensors="pt",
-            padding=False,
-            truncation=True,
-            max_length=1024,
-            add_special_tokens=True
-        ).to("mps")  # 移动到MPS设备
+        with diagnostics.span("tokenize"):
+            inputs = self._tokenizer(
+                translate_prompt,
+                return_tensors="pt",
+                padding=False,
+                truncation=True,
+                max_length=1024,
+                add_special_tokens=True
+            ).to("mps")  # 移动到MPS设备
 
         # 模型生成翻译结果（禁用梯度计算，减少内存占用
-        with torch.no_grad():
+        with torch.no_grad(), diagnostics.span("generate"):
             outputs = self._model.generate(
                 **inputs,
                 max_new_tokens=1024,  # 生成文本的最大新增token数
@@ -329,12 +352,13 @@ class MBartTranslator(BaseThreadedWorker):
             )
 
         # 解码并清理结果（移除特殊符号和提示词格式
-        translated_text = self._tokenizer.decode(
-            outputs[0],
-            skip_special_tokens=True,    # 跳过<pad>、</s>等特殊token
-            clean_up_tokenization_spaces=True,  # 清理多余空格
-            skip_prompt=False
-        )
+        with diagnostics.span("decode"):
+            translated_text = self._tokenizer.decode(
+                outputs[0],
+                skip_special_tokens=True,    # 跳过<pad>、</s>等特殊token
+                clean_up_tokenization_spaces=True,  # 清理多余空格
+                skip_prompt=False
+            )
 
         # 移除提示词残留
         clean_patterns = [
@@ -359,6 +383,9 @@ class MBartTranslator(BaseThreadedWorker):
             return None
             
         original_text = self._input_text
+        # 接手热键的追踪，轮询等待的时间记为排队阶段
+        handoff, self._input_handoff = self._input_handoff, None
+        diagnostics.tracer.activate(handoff, "translate_queue")
         try:
             # 调用整合后的translate方法（自动包含词典查询）
             translated_text = self.translate(original_text)
@@ -373,30 +400,57 @@ class MBartTranslator(BaseThreadedWorker):
 
 # VO监听类：继承多线程基类
 class VoiceOverHandler(BaseThreadedWorker):
-    def __init__(self, log_level: int = logging.WARNING, repeat_threshold: float = 0.05, loop_interval: float = 0.1):
+    """
+    监听线程运行时，把VoiceOver朗读过的内容及时间戳记入固定大小的环形缓冲区，
+    热键直接从内存读取最近的朗读，不必再发起一次AppleEvent往返
+    """
+    def __init__(self, log_level: int = logging.WARNING, repeat_threshold: float = 0.05, loop_interval: float = 0.1,
+                 phrase_capacity: int = 64, backend: Optional[screen_reader.ScreenReaderBackend] = None):
         """
         :param repeat_threshold: 重复内容的时间阈值（秒），超过此值视为新朗读
         :param loop_interval: 监听循环间隔时间（秒）
+        :param phrase_capacity: 环形缓冲区保留的最近朗读条数
+        :param backend: 屏幕阅读器后端，默认VoiceOver（不可用时回退到内存实现）
         """
         super().__init__(log_level=log_level, loop_interval=loop_interval)
         
         self.logger = logging.getLogger(__name__)
         self.logger.setLevel(log_level)
         self._vo_err_count = 0    #初始化错误计数器
-        self.vo = appscript.app("VoiceOver")  # 建立与VoiceOver的连接
+        self.vo = backend if backend is not None else screen_reader.default_backend()  # 建立与VoiceOver的连接
         
         # 缓存上次的朗读信息（内容+时间戳）
         self._last_content: Optional[str] = None
         self._last_timestamp: float = 0.0  # 时间戳（秒）
         self.repeat_threshold = repeat_threshold  # 阈值（默认0.05秒）
 
+        # 朗读环形缓冲区：预分配的文本槽位和时间戳数组，_phrase_head 指向下一个写入位置
+        self._phrase_capacity = max(1, phrase_capacity)
+        self._phrases: list = [None] * self._phrase_capacity
+        self._phrase_times = array('d', bytes(8 * self._phrase_capacity))
+        self._phrase_head = 0
+        self._phrase_count = 0
+        self._phrase_lock = threading.Lock()
+
+    def _query_phrase(self) -> Optional[str]:
+        """向VoiceOver查询最后朗读的内容（一次AppleEvent往返）"""
+        with diagnostics.span("vo_query"):
+            return self.vo.last_phrase()
+
+    def _on_vo_error(self, e: Exception):
+        self.logger.error(f"VoiceOver错误：{str(e)}")
+        self._vo_err_count += 1
+        if self._vo_err_count == 6:
+            reboot_VoiceOver()
+            self._vo_err_count = 0
+
     def get_last_phrase(self) -> Optional[Tuple[str, float]]:
         """
         获取最后朗读的内容及时间戳，返回元组(内容, 时间戳)
         若内容重复且未超过阈值，返回None；否则返回新内容
         """
         try:
-            current_content = self.vo.last_phrase.content()
+            current_content = self._query_phrase()
             current_timestamp = time.time()  # 获取当前时间戳（秒，精确到小数）
             
             # 内容为空返回None
@@ -419,14 +473,43 @@ class VoiceOverHandler(BaseThreadedWorker):
             return (current_content, current_timestamp)
             
         except Exception as e:
-            self.logger.error(f"VoiceOver错误：{str(e)}")
-            self._vo_err_count += 1
-            if self._vo_err_count == 6:
-                reboot_VoiceOver()
-                self._vo_err_count = 0
+            self._on_vo_error(e)
             return None
 
 
+    def _record_phrase(self, text: str, timestamp: float):
+        """写入环形缓冲区，满了覆盖最旧的一条"""
+        with self._phrase_lock:
+            head = self._phrase_head
+            self._phrases[head] = text
+            self._phrase_times[head] = timestamp
+            self._phrase_head = (head + 1) % self._phrase_capacity
+            if self._phrase_count < self._phrase_capacity:
+                self._phrase_count += 1
+
+    def get_recent_phrases(self, n: int) -> list:
+        """
+        从缓冲区读取最近的朗读
+        :param n: 最多返回的条数
+        :return: [(内容, 时间戳), ...]，按时间从旧到新
+        """
+        with self._phrase_lock:
+            n = min(n, self._phrase_count)
+            start = self._phrase_head - n
+            return [(self._phrases[i % self._phrase_capacity], self._phrase_times[i % self._phrase_capacity])
+                    for i in range(start, self._phrase_head)]
+
+    def latest_phrase(self) -> Optional[Tuple[str, float]]:
+        """
+        最后朗读的内容及时间戳：监听线程运行时直接读缓冲区，否则向VoiceOver查询
+        读缓冲区时不发起查询，结果可能比VoiceOver当前的朗读滞后最多一个轮询间隔(loop_interval)
+        """
+        if not self.is_running():
+            return self.get_last_phrase()
+        recent = self.get_recent_phrases(1)
+        return recent[0] if recent else None
+
+
     def speak_text(self, text: str) -> bool:
         #  朗读文本
         try:
@@ -449,83 +532,445 @@ class VoiceOverHandler(BaseThreadedWorker):
 
 
     def _run_task(self) -> Optional[Tuple[str, float]]:
-        """多线程任务实现：获取VO内容并返回"""
-        return self.get_last_phrase()
+        """多线程任务实现：获取VO内容，与缓冲区最新一条不同时记入并返回"""
+        try:
+            content = self._query_phrase()
+            self._vo_err_count = 0
+        except Exception as e:
+            self._on_vo_error(e)
+            return None
+        if not content:
+            return None
+        with self._phrase_lock:
+            newest = self._phrases[self._phrase_head - 1] if self._phrase_count else None
+        if content == newest:
+            return None
+        timestamp = time.time()
+        self._record_phrase(content, timestamp)
+        return (content, timestamp)
+
+
+# 异步朗读队列
+class SpeechQueue(BaseThreadedWorker):
+    """
+    界面线程只把要朗读的文本放入队列并立即返回，由本线程调用阻塞的朗读函数（AppleEvent往返）。
+    新的朗读默认打断尚未开始的朗读：按住导航热键产生的连续步进会合并，只朗读最新的位置。
+    记录每条文本从入队到开始朗读的延迟。
+    """
+    def __init__(self, speak_func: Callable[[str], bool], log_level: int = logging.WARNING,
+                 latency_samples: int = 256):
+        """
+        :param speak_func: 实际朗读文本的函数（如 VoiceOverHandler.speak_text）
+        :param latency_samples: 保留最近多少条朗读的延迟用于统计
+        """
+        super().__init__(log_level=log_level, loop_interval=0)
+        self._speak_func = speak_func
+        self._queue: deque = deque()  # (文本, 入队时间, 延迟追踪交接)
+        self._cond = threading.Condition()
+        self._latencies: deque = deque(maxlen=latency_samples)  # 入队到开始朗读的延迟(秒)
+        self.spoken_count = 0  # 已朗读条数
+        self.coalesced_count = 0  # 被新朗读打断而丢弃的条数
+
+    def say(self, text: str, interrupt: bool = True):
+        """
+        把文本加入朗读队列（不阻塞）
+        :param interrupt: 是否丢弃尚未朗读的内容，只保留这一条
+        """
+        if not text:
+            return
+        with self._cond:
+            if interrupt and self._queue:
+                self.coalesced_count += len(self._queue)
+                for _, _, handoff in self._queue:
+                    diagnostics.tracer.discard(handoff)
+                self._queue.clear()
+            self._queue.append((text, time.perf_counter(), diagnostics.tracer.handoff()))
+            self._cond.notify()
+
+    def _run_task(self) -> None:
+        """等待队列中的文本并朗读（等待带超时，保证停止线程时能及时退出）"""
+        with self._cond:
+            if not self._queue:
+                self._cond.wait(0.2)
+                if not self._queue:
+                    return None
+            text, queued_at, handoff = self._queue.popleft()
+        self._latencies.append(time.perf_counter() - queued_at)
+        self.spoken_count += 1
+        diagnostics.tracer.activate(handoff, "speech_queue")
+        with diagnostics.span(diagnostics.LatencyTracer.OUTPUT_SPAN):
+            self._speak_func(text)
+        return None
+
+    def latency_stats(self) -> dict:
+        """最近朗读的入队到开始朗读延迟统计（秒）"""
+        samples = sorted(self._latencies)
+        if not samples:
+            return {}
+        return {
+            'spoken': self.spoken_count,
+            'coalesced': self.coalesced_count,
+            'p50': diagnostics.percentile(samples, 0.5),
+            'p95': diagnostics.percentile(samples, 0.95),
+            'max': samples[-1],
+        }
+
+
+def changed_segment(old: str, new: str) -> str:
+    """
+    计算新文本相对旧文本新增或改动的部分（去掉公共前缀和后缀），
+    改动落在英文单词中间时扩展为完整的词；纯删除或没有变化返回空串
+    :param old: 上次朗读时的文本
+    :param new: 当前文本
+    """
+    limit = min(len(old), len(new))
+    start = 0
+    while start < limit and old[start] == new[start]:
+        start += 1
+    end = 0
+    while end < limit - start and old[len(old) - 1 - end] == new[len(new) - 1 - end]:
+        end += 1
+    stop = len(new) - end
+    if start >= stop:
+        return ""
+
+    def is_word_char(ch: str) -> bool:
+        return ch.isascii() and ch.isalnum()
+
+    # 改动落在单词中间时扩展到整个词
+    while 0 < start and is_word_char(new[start - 1]) and is_word_char(new[start]):
+        start -= 1
+    while stop < len(new) and is_word_char(new[stop - 1]) and is_word_char(new[stop]):
+        stop += 1
+    return new[start:stop]
 
 
 #  剪贴板监视器类
 class ClipboardMonitor(BaseThreadedWorker):
     """
     监测剪贴板内容变化，并返回 (新内容, 时间戳) 元组。
+    每次轮询只做后端的廉价变化探测，探测到变化后才读取完整内容，
+    轮询开销与剪贴板内容大小无关。
     """
-    def __init__(self, log_level: int = logging.INFO, loop_interval: float = 0.2):
+    def __init__(self, log_level: int = logging.INFO, loop_interval: float = 0.2,
+                 backend: Optional[ClipboardBackend] = None):
         """
         初始化剪贴板监视器。
         
         :param log_level: 日志级别
         :param loop_interval: 检查剪贴板的时间间隔（秒）
+        :param backend: 剪贴板后端，默认macOS粘贴板（不可用时回退到wx剪贴板）
         """
         super().__init__(log_level=log_level, loop_interval=loop_interval)
-        self._last_content: Optional[str] = None
-        # 使用线程局部存储来保存wx.App实例，避免线程问题
-        self._thread_local = threading.local()
+        self._backend = backend if backend is not None else default_backend()
+        self._last_fingerprint: Optional[Tuple[int, bytes]] = None  # 上次内容的(长度, 摘要)，不常驻大文本
+        self._last_token = None  # 上次探测到的变化标记
+        self._lock = threading.Lock()  # 串行化轮询与本程序自身的写入
+
+    @staticmethod
+    def _fingerprint(content: str) -> Tuple[int, bytes]:
+        """内容指纹：(长度, 摘要)"""
+        return (len(content), hashlib.sha1(content.encode('utf-8', 'surrogatepass')).digest())
+
+    def write_text(self, text: str):
+        """
+        由本程序写入剪贴板，并记住这次写入，
+        下一次轮询不会把它当作新的剪贴板变化回调出去
+        """
+        with self._lock:
+            self._last_token = self._backend.write_text(text)
+            self._last_fingerprint = self._fingerprint(text)
 
-    def _get_wx_app(self) -> wx.App:
-        """确保每个线程都有一个wx.App实例"""
-        if not hasattr(self._thread_local, 'app'):
-            # 对于非GUI线程，必须创建一个wx.App实例
-            self._thread_local.app = wx.App(False)
-        return self._thread_local.app
+    def read_text(self) -> Optional[str]:
+        """读取当前剪贴板文本"""
+        return self._backend.read_text()
 
     def _run_task(self) -> Optional[Tuple[str, float]]:
         """
         检查剪贴板内容是否变化。
         如果变化，则返回 (新内容, 时间戳) 元组，否则返回 None。
         """
-        # 确保线程有wx.App实例
-        self._get_wx_app()
-        
-        clipboard = wx.Clipboard.Get()
-        if not clipboard.Open():
-            self.logger.error("无法打开剪贴板。")
-            return None
-            
+        with self._lock:
+            return self._poll()
+
+    def _poll(self) -> Optional[Tuple[str, float]]:
+        """在锁内执行一次探测与读取"""
         try:
-            # 尝试获取文本数据
-            text_data = wx.TextDataObject()
-            if clipboard.GetData(text_data):
-                current_content = text_data.GetText()
-                
-                # 检查内容是否有效且与上次不同
-                if current_content and current_content != self._last_content:
-                    self._last_content = current_content
-                    timestamp = time.time()
-                    self.logger.debug(f"检测到剪贴板变化: {current_content[:50]}...")
-                    return (current_content, timestamp)
-                    
+            # 廉价探测：变化标记未变则无需读取内容
+            token = self._backend.change_token()
+            if token is not None and token == self._last_token:
+                return None
+            self._last_token = token
+
+            current_content = self._backend.read_text()
+            # 检查内容是否有效且与上次不同
+            if not current_content:
+                return None
+            fingerprint = self._fingerprint(current_content)
+            if fingerprint != self._last_fingerprint:
+                self._last_fingerprint = fingerprint
+                timestamp = time.time()
+                self.logger.debug(f"检测到剪贴板变化: {current_content[:50]}...")
+                return (current_content, timestamp)
+
         except Exception as e:
             self.logger.error(f"读取剪贴板时出错: {e}", exc_info=True)
-        finally:
-            clipboard.Close()
-            
+
         # 如果没有变化或获取失败，则返回None
         return None
 
 
+# 剪贴板历史持久化线程：合并短时间内的多次保存请求，在后台写盘
+class HistoryPersister(BaseThreadedWorker):
+    """
+    写后持久化：界面线程只发出"脏"通知，本线程在合并窗口结束后
+    把待写blob和历史日志一次性写入磁盘，界面线程从不等待磁盘I/O。
+    同时定期按保留策略挑选应淘汰的条目，通过回调交给界面线程删除。
+    启动后先在本线程扫描历史快照元数据（去重索引、blob清理），读取失败时稍后重试；
+    第一次搜索请求全文索引后在本线程建立，界面线程无需等待。
+    """
+    _WARM_UP_RETRY_INTERVAL = 5.0  # 启动扫描失败后的重试间隔(秒)
+
+    def __init__(self, history, blob_store, log_level: int = logging.WARNING,
+                 coalesce_window: float = 0.5, loop_interval: float = 0.05,
+                 retention_policy=None, retention_interval: float = 30.0, search_index=None):
+        """
+        :param history: ClipboardHistory 实例
+        :param blob_store: BlobStore 实例
+        :param search_index: 请求后在本线程建立的 SearchIndex，None表示不建立
+        :param coalesce_window: 合并窗口(秒)，窗口内的多次保存只写一次
+        :param loop_interval: 检查间隔(秒)
+        :param retention_policy: RetentionPolicy 实例，None表示不限制
+        :param retention_interval: 检查保留策略的间隔(秒)
+        """
+        super().__init__(log_level=log_level, loop_interval=loop_interval)
+        self._history = history
+        self._blob_store = blob_store
+        self._coalesce_window = coalesce_window
+        self._dirty_since: Optional[float] = None  # 第一次脏通知的时间
+        self._retention_policy = retention_policy
+        self._retention_interval = retention_interval
+        self._next_retention_check = 0.0  # 启动后立即检查一次
+        self._search_index = search_index
+        self._warmed_up = False
+        self._next_warm_up = 0.0  # 启动扫描失败后的重试时间
+
+    def mark_dirty(self):
+        """通知有数据需要保存（不阻塞）"""
+        if self._dirty_since is None:
+            self._dirty_since = time.monotonic()
+
+    def flush(self):
+        """立即写出所有待保存数据（blob先于引用它的日志记录落盘）"""
+        self._dirty_since = None
+        self._blob_store.flush()
+        self._history.flush_pending()
+        # 写盘期间又有新修改登记进来，留到下一个窗口
+        if self._history.has_pending():
+            self.mark_dirty()
+
+    def _warm_up(self) -> list:
+        """
+        扫描快照元数据、建立去重索引并清理不再被引用的blob（成功后不再执行）
+        :return: 去重索引建立之前加入的重复条目的标识
+        """
+        self._next_warm_up = time.monotonic() + self._WARM_UP_RETRY_INTERVAL
+        duplicates = self._history.warm_up()
+        if not self._history.is_warmed_up():
+            return []
+        self._blob_store.collect_garbage(self._history.blob_digests())
+        self._warmed_up = True
+        return duplicates
+
+    def _run_task(self) -> Optional[list]:
+        """合并窗口结束后写盘；到达检查间隔时返回应淘汰条目的标识（含启动时发现的重复条目）"""
+        victims = []
+        if not self._warmed_up and time.monotonic() >= self._next_warm_up:
+            victims = self._warm_up()
+            if victims:
+                self.logger.info(f"去重：{len(victims)} 条重复记录待删除")
+        if self._search_index is not None and self._search_index.is_requested():
+            self._search_index.build(self._history)
+        now = time.monotonic()
+        dirty_since = self._dirty_since
+        if dirty_since is not None and now - dirty_since >= self._coalesce_window:
+            self.flush()
+
+        if self._retention_policy is not None and now >= self._next_retention_check:
+            self._next_retention_check = now + self._retention_interval
+            evictions = self._history.select_evictions(self._retention_policy)
+            if evictions:
+                self.logger.info(f"保留策略：{len(evictions)} 条记录待淘汰")
+                victims += evictions
+        return victims or None
+
+
+def _is_grapheme_extend(ch: str) -> bool:
+    """是否附着在前一个字符上（组合符号、变体选择符、肤色修饰、标签字符、零宽连接符）"""
+    code = ord(ch)
+    return (unicodedata.category(ch) in ('Mn', 'Me', 'Mc')
+            or 0xFE00 <= code <= 0xFE0F or 0x1F3FB <= code <= 0x1F3FF
+            or 0xE0020 <= code <= 0xE007F or code == 0x200D)
+
+
+def _is_regional_indicator(ch: str) -> bool:
+    return 0x1F1E6 <= ord(ch) <= 0x1F1FF
+
+
+# 全角/半角形式（含全角空格）映射为 NFKC 对应的单个字符，用于查找时忽略宽度
+_WIDTH_TABLE = {0x3000: ' '}
+for _code in range(0xFF01, 0xFFEF):
+    _normalized = unicodedata.normalize('NFKC', chr(_code))
+    if len(_normalized) == 1:
+        _WIDTH_TABLE[_code] = _normalized
+del _code, _normalized
+
+
+def normalize_for_search(text: str) -> Tuple[str, Optional[array]]:
+    """
+    查找用的规范化：统一全半角并转小写
+    :return: (规范化文本, 偏移映射)；长度不变时（绝大多数情况）偏移映射为None，
+             否则映射[i]为规范化文本第i个字符在原文中的位置
+    """
+    normalized = text.translate(_WIDTH_TABLE).lower()
+    if len(normalized) == len(text):
+        return normalized, None
+    # 少数字符小写后变长（如 'İ'），逐字符建立偏移映射
+    offsets = array('q')
+    pieces = []
+    for pos, ch in enumerate(text):
+        piece = ch.translate(_WIDTH_TABLE).lower()
+        pieces.append(piece)
+        offsets.extend([pos] * len(piece))
+    return "".join(pieces), offsets
+
+
 class TextBrowser:
-    def __init__(self):
+    """
+    文本浏览：set_text 时一次性建立行首偏移数组，行列定位用二分查找，取行直接切片，
+    每次导航的开销与文本大小无关。
+    除字、行外还可按词、句、段移动：各单位的起止偏移数组在第一次使用时建立，之后每步二分查找；
+    词和句不跨行，按行分块建立，长文本只处理焦点所在的块。
+    字按字素簇移动（组合符号、emoji序列不会被拆开）。
+    按条目（内容摘要）缓存最近浏览过的文本的焦点位置和索引，切换回来时恢复阅读位置。
+    查找在忽略大小写和全半角的影子文本上进行，影子文本每段文本只在第一次查找时建立一次
+    """
+    _NEWLINE = re.compile('\n')
+    UNITS = ("char", "word", "sentence", "paragraph", "line")  # 转子可选的浏览单位
+    UNIT_BLOCK_LINES = 4096  # 词、句索引每块的行数
+    _CJK = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+    _WORD = re.compile(f"[{_CJK}]+|[^\\W{_CJK}]+(?:['’][^\\W{_CJK}]+)*")
+    _CJK_RUN = re.compile(f"[{_CJK}]+")
+    # 句末：中英文终止标点（及其后的引号、括号），或换行
+    _SENTENCE_END = re.compile("(?:[。！？!?；;…]+|\\.(?=\\s|$))[」』”’\"'）)\\]]*|\n")
+    _PARAGRAPH = re.compile("[^\n]*\\S[^\n]*(?:\n[^\n]*\\S[^\n]*)*")
+
+    def __init__(self, state_cache_size: int = 16, state_cache_chars: int = 64 * 1024 * 1024):
+        """
+        :param state_cache_size: 最多缓存多少个条目的浏览状态
+        :param state_cache_chars: 缓存的文本总字数上限
+        """
         self.current_text = ""  # 存储传入的文本
         self.focus_pos = 0  # 浏览焦点的虚拟坐标（字符索引）
         self._total_chars = 0  # 文本总字数
         self._row_column = (0, 0)  #行列坐标
         self._current_line = ""  # 当前行内容
-
-
-    def set_text(self, text: str) -> None:
-        """存储传入的文本"""
+        self._line_starts = array('q', [0])  # 每行起始字符索引
+        self._unit_index: dict = {}  # (单位, 块号) -> (起始偏移数组, 结束偏移数组)，按需建立
+        self.unit = "char"  # 字/词/句/段/行导航的当前单位
+        self._shadow: Optional[Tuple[str, Optional[array]]] = None  # 查找用的(规范化文本, 偏移映射)
+        self.last_query = ""  # 上次查找的内容
+        self._last_match: Optional[int] = None  # 上次查找命中的位置，焦点仍在此处时继续查找会跳过它
+        # 浏览状态缓存：条目标识 -> (文本, 焦点, 行首偏移, 单位索引, 当前行, 行列坐标, 影子文本, 上次命中位置)
+        self._states: OrderedDict = OrderedDict()
+        self._state_key = None  # 当前文本的条目标识
+        self._state_cache_size = state_cache_size
+        self._state_cache_chars = state_cache_chars
+        self._cached_chars = 0
+
+
+    def set_text(self, text: str, key: Optional[str] = None) -> bool:
+        """
+        存储传入的文本并建立行首偏移索引
+        :param key: 文本所属条目的标识（如内容摘要），给出时缓存/恢复该条目的浏览状态
+        :return: 是否恢复了之前的阅读位置
+        """
+        self._save_state()
+        self._state_key = key
+        state = self._states.pop(key, None) if key is not None else None
+        if state is not None:
+            self._cached_chars -= self._state_chars(state)
+            (self.current_text, self.focus_pos, self._line_starts, self._unit_index,
+             self._current_line, self._row_column, self._shadow, self._last_match) = state
+            self._total_chars = len(self.current_text)
+            return True
         self.current_text = text
         self._total_chars = len(text)
         self.focus_pos = 0  # 重置焦点位置
+        self._line_starts = array('q', [0])
+        self._line_starts.extend(m.end() for m in self._NEWLINE.finditer(text))
+        self._unit_index = {}
+        self._shadow = None
+        self._last_match = None
+        return False
+
+
+    def _save_state(self):
+        """把当前文本的浏览状态放入缓存，超出条数或总字数时淘汰最久未用的"""
+        if self._state_key is None:
+            return
+        state = (self.current_text, self.focus_pos, self._line_starts, self._unit_index,
+                 self._current_line, self._row_column, self._shadow, self._last_match)
+        self._states[self._state_key] = state
+        self._cached_chars += self._state_chars(state)
+        while self._states and (len(self._states) > self._state_cache_size
+                                or self._cached_chars > self._state_cache_chars):
+            _, evicted = self._states.popitem(last=False)
+            self._cached_chars -= self._state_chars(evicted)
+
+
+    @staticmethod
+    def _state_chars(state: tuple) -> int:
+        """缓存的浏览状态占用的字数（原文加影子文本）"""
+        shadow = state[6]
+        return len(state[0]) + (len(shadow[0]) if shadow is not None else 0)
+
+
+    def find(self, query: str, forward: bool = True) -> Optional[str]:
+        """
+        从焦点向后/前查找（忽略大小写和全半角），找到时焦点移到匹配处
+        焦点处的匹配也算在内，除非焦点正停在上次找到的匹配上（继续查找下一处）
+        :param query: 要查找的内容
+        :return: 匹配所在行的内容，没有找到返回None
+        """
+        self.last_query = query
+        if not self.current_text or not query:
+            return None
+        if self._shadow is None:
+            self._shadow = normalize_for_search(self.current_text)
+        shadow, offsets = self._shadow
+        needle, _ = normalize_for_search(query)
+        # 影子文本中的焦点位置
+        pos = bisect_left(offsets, self.focus_pos) if offsets is not None else self.focus_pos
+        skip = 1 if self._last_match == self.focus_pos else 0
+        if forward:
+            hit = shadow.find(needle, pos + skip)
+        else:
+            hit = shadow.rfind(needle, 0, pos + len(needle) - skip)
+        if hit < 0:
+            return None
+        self.focus_pos = offsets[hit] if offsets is not None else hit
+        self._last_match = self.focus_pos
+        line = self._get_current_line()
+        self._current_line = self._get_line_text(line) or '\n'
+        self._row_column = (line + 1, self.focus_pos - self._line_starts[line] + 1)
+        return self._current_line
+
+
+    def cycle_unit(self) -> str:
+        """转子：切换到下一个浏览单位并返回"""
+        self.unit = self.UNITS[(self.UNITS.index(self.unit) + 1) % len(self.UNITS)]
+        return self.unit
 
 
     def browse(self, direction: str) -> Tuple[str]:
@@ -543,41 +988,45 @@ class TextBrowser:
         if not self.current_text:
             return
         
+        # 按当前单位移动
+        if direction in ("prev_unit", "next_unit"):
+            direction = f"{direction[:5]}{self.unit}"
+
         # 前一个字
         if direction == "prev_char":
-            self.focus_pos = max(0, self.focus_pos - 1)
-            spoken_text = self.current_text[self.focus_pos:self.focus_pos + 1]
+            self.focus_pos = self._prev_grapheme(self.focus_pos)
+            spoken_text = self.current_text[self.focus_pos:self._next_grapheme(self.focus_pos)]
         
         # 后一个字
         elif direction == "next_char":
-            self.focus_pos = min(self._total_chars - 1, self.focus_pos + 1)
-            spoken_text = self.current_text[self.focus_pos:self.focus_pos + 1]
-        
-        # 上一行
-        elif direction == "prev_line":
-            lines = self.current_text.split('\n')
-            current_line = self._get_current_line(lines)
-            target_line = max(0, current_line - 1)
-            spoken_text = lines[target_line] if lines else ""
-            if not spoken_text:  # 手动处理空行
-                spoken_text = '\n'
-            self._current_line = spoken_text
-            self.focus_pos = self._get_line_start_index(lines, target_line)
+            next_pos = self._next_grapheme(self.focus_pos)
+            if next_pos < self._total_chars:
+                self.focus_pos = next_pos
+            elif self.focus_pos >= self._total_chars:
+                # 焦点在结尾换行之后的空行上：停在最后一个字（换行）上并读出
+                self.focus_pos = self._prev_grapheme(self._total_chars)
+            spoken_text = self.current_text[self.focus_pos:self._next_grapheme(self.focus_pos)]
+
+        # 上/下一个词、句、段
+        elif direction[5:] in ("word", "sentence", "paragraph"):
+            spoken_text = self._move_by_unit(direction[5:], direction.startswith("next"))
         
-        # 下一行
-        elif direction == "next_line":
-            lines = self.current_text.split('\n')
-            current_line = self._get_current_line(lines)
-            target_line = min(len(lines) - 1, current_line + 1)
-            spoken_text = lines[target_line] if lines else ""
+        # 上一行 / 下一行
+        elif direction in ("prev_line", "next_line"):
+            current_line = self._get_current_line()
+            if direction == "prev_line":
+                target_line = max(0, current_line - 1)
+            else:
+                target_line = min(len(self._line_starts) - 1, current_line + 1)
+            spoken_text = self._get_line_text(target_line)
             if not spoken_text:  # 手动处理空行
                 spoken_text = '\n'
             self._current_line = spoken_text
-            self.focus_pos = self._get_line_start_index(lines, target_line)
+            self.focus_pos = self._line_starts[target_line]
         
         # 返回焦点位置内容
         elif direction == "explain_char":
-            spoken_text = self.current_text[self.focus_pos:self.focus_pos + 1]
+            spoken_text = self.current_text[self.focus_pos:self._next_grapheme(self.focus_pos)]
 
         # 粘贴剪贴板当前行
         elif direction == "paste_line":
@@ -587,47 +1036,472 @@ class TextBrowser:
             spoken_text = "null"
         
         # 计算当前焦点的行、列坐标
-        lines = self.current_text.split('\n')
-        current_line = self._get_current_line(lines)
-        line_start = self._get_line_start_index(lines, current_line)
-        current_col = self.focus_pos - line_start  # 列坐标 = 焦点索引 - 行起始索引
+        current_line = self._get_current_line()
+        current_col = self.focus_pos - self._line_starts[current_line]  # 列坐标 = 焦点索引 - 行起始索引
 
         self._row_column = (current_line + 1, current_col + 1)
         return self.get_char_explanation(spoken_text)
 
 
-    # 辅助方法：获取当前焦点所在行
-    def _get_current_line(self, lines: list) -> int:
-        if not lines:
+    # 辅助方法：pos 所在字素簇之后的下一个字素簇起点
+    def _next_grapheme(self, pos: int) -> int:
+        text = self.current_text
+        n = self._total_chars
+        if pos >= n:
+            return n
+        i = pos + 1
+        if text[pos] == '\r' and i < n and text[i] == '\n':
+            return i + 1
+        if _is_regional_indicator(text[pos]) and i < n and _is_regional_indicator(text[i]):
+            i += 1  # 国旗：两个区域指示符
+        while i < n and (_is_grapheme_extend(text[i]) or text[i - 1] == '\u200d'):
+            i += 1
+        return i
+
+
+    # 辅助方法：pos 之前的上一个字素簇起点
+    def _prev_grapheme(self, pos: int) -> int:
+        text = self.current_text
+        if pos <= 0:
             return 0
-        cumulative = 0
-        for i, line in enumerate(lines):
-            cumulative += len(line) + 1  # +1 包含换行符
-            if self.focus_pos < cumulative:
-                return i
-        return len(lines) - 1
+        i = pos - 1
+        if text[i] == '\n' and i > 0 and text[i - 1] == '\r':
+            return i - 1
+        while i > 0 and (_is_grapheme_extend(text[i]) or text[i - 1] == '\u200d'):
+            i -= 1
+        if i > 0 and _is_regional_indicator(text[i]):
+            # 连续的区域指示符两两成对，按从头数的奇偶决定是否与前一个配对
+            run_start = i
+            while run_start > 0 and _is_regional_indicator(text[run_start - 1]):
+                run_start -= 1
+            if (i - run_start) % 2 == 1:
+                i -= 1
+        return i
+
+
+    # 辅助方法：建立词、句、段在某一块内的起止偏移数组（段只有一块，即全文）
+    def _get_unit_index(self, unit: str, block: int) -> Tuple[array, array]:
+        index = self._unit_index.get((unit, block))
+        if index is not None:
+            return index
+        text = self.current_text
+        if unit == "paragraph":
+            lo, hi = 0, self._total_chars
+        else:
+            lo = self._line_starts[block * self.UNIT_BLOCK_LINES]
+            end_line = (block + 1) * self.UNIT_BLOCK_LINES
+            hi = self._line_starts[end_line] if end_line < len(self._line_starts) else self._total_chars
+        starts, ends = array('q'), array('q')
+        if unit == "word":
+            for m in self._WORD.finditer(text, lo, hi):
+                if self._CJK_RUN.fullmatch(m.group()):
+                    if jieba is not None:
+                        # 连续的中文用词典分词
+                        for _, start, end in jieba.tokenize(m.group()):
+                            starts.append(m.start() + start)
+                            ends.append(m.start() + end)
+                    else:
+                        starts.extend(range(m.start(), m.end()))
+                        ends.extend(range(m.start() + 1, m.end() + 1))
+                else:
+                    starts.append(m.start())
+                    ends.append(m.end())
+        elif unit == "sentence":
+            pos = lo
+            for m in self._SENTENCE_END.finditer(text, lo, hi):
+                end = m.start() if m.group() == '\n' else m.end()
+                segment = text[pos:end]
+                stripped = segment.lstrip()
+                if stripped.strip():
+                    starts.append(end - len(stripped))
+                    ends.append(end)
+                pos = m.end()
+            tail = text[pos:hi]
+            if tail.strip():
+                starts.append(hi - len(tail.lstrip()))
+                ends.append(hi)
+        else:
+            for m in self._PARAGRAPH.finditer(text):
+                starts.append(m.start())
+                ends.append(m.end())
+        self._unit_index[(unit, block)] = (starts, ends)
+        return starts, ends
 
 
-    # 辅助方法：获取指定行的起始索引
-    def _get_line_start_index(self, lines: list, line_num: int) -> int:
-        if line_num <= 0:
-            return 0
-        start = 0
-        for i in range(line_num):
-            start += len(lines[i]) + 1  # +1 包含换行符
-        return start
+    # 辅助方法：从焦点向前/后查找最近的单位，inclusive 表示起点等于焦点也算
+    def _find_unit(self, unit: str, forward: bool, inclusive: bool) -> Optional[Tuple[int, int]]:
+        if unit == "paragraph":
+            block, block_count = 0, 1
+        else:
+            block = self._get_current_line() // self.UNIT_BLOCK_LINES
+            block_count = (len(self._line_starts) - 1) // self.UNIT_BLOCK_LINES + 1
+        while 0 <= block < block_count:
+            starts, ends = self._get_unit_index(unit, block)
+            if forward:
+                k = (bisect_left if inclusive else bisect_right)(starts, self.focus_pos)
+                if k < len(starts):
+                    return starts[k], ends[k]
+                block += 1
+            else:
+                k = (bisect_right if inclusive else bisect_left)(starts, self.focus_pos) - 1
+                if k >= 0:
+                    return starts[k], ends[k]
+                block -= 1
+        return None
+
+
+    # 辅助方法：移动到上/下一个词、句、段，返回其内容；到头时停在首/尾一个
+    def _move_by_unit(self, unit: str, forward: bool) -> str:
+        found = self._find_unit(unit, forward, False) or self._find_unit(unit, not forward, True)
+        if found is None:
+            return ""
+        self.focus_pos, end = found
+        return self.current_text[self.focus_pos:end]
+
+
+    # 辅助方法：获取当前焦点所在行（二分查找行首偏移）
+    def _get_current_line(self) -> int:
+        return bisect_right(self._line_starts, self.focus_pos) - 1
+
+
+    # 辅助方法：获取指定行的内容（不含换行符）
+    def _get_line_text(self, line_num: int) -> str:
+        start = self._line_starts[line_num]
+        if line_num + 1 < len(self._line_starts):
+            return self.current_text[start:self._line_starts[line_num + 1] - 1]
+        return self.current_text[start:]
 
 
     def get_char_explanation(self, char: str) -> str:
         #  特定字符解释
-        return setting.chars_dict[setting.current_lang].get(char, char)
+        with diagnostics.span("char_lookup"):
+            return setting.chars_dict[setting.current_lang].get(char, char)
 
 
 def reboot_VoiceOver(event):
     os.system('killall -9 VoiceOver')
 
 
+_CHINESE_DIGITS = '零一二三四五六七八九'
+# 万进制大数单位：第i个四位组的单位，10^12 沿用“万亿”（“兆”在大陆常指10^6，不使用），
+# 10^16 起依次为京、垓……，10^44（载）以上递归组合，如 10^48 为“一万载”
+_LEVEL_UNITS = ('', '万', '亿', '万亿', '京', '垓', '秭', '穰', '沟', '涧', '正')
+_SUPER_UNIT = '载'
+_SUPER_GROUP_DIGITS = 4 * len(_LEVEL_UNITS)
+# 四则运算符号（用字母输入，只在两个数字之间且两侧都有空白时转换）
+_OPERATORS = {'a': ' + ', 's': ' - ', 'm': ' × ', 'd': ' ÷ '}
+_NUMERAL = re.compile(r"""
+    (?=[-.0-9\s])                                                  # 首字符预筛，其余位置直接跳过
+    (?:
+        # 两个数字之间、两侧都有空白的四则运算符号（及其后的负号）；紧贴数字的字母是单位（如 1990s、100m），不转换
+        (?P<op>(?<=[0-9])\s+[aAsSmMdD]\s+)(?P<opsign>-)?(?=\.?[0-9]) |
+        (?:(?<![\w.])(?P<sign>-))?                                     # 负号（前面不是字母数字时）
+        (?:
+            (?P<int>[0-9]+)
+            (?:
+                /(?P<den>[0-9]+) |                                     # 分数
+                (?:\.(?P<dec>[0-9]+|(?=%)))?(?P<pct>%)?                 # 小数、百分数
+            ) |
+            \.(?P<dotdec>[0-9]+)                                       # 点开头的小数，如 .123
+        )
+    )
+""", re.VERBOSE)
+# 一个数字（或运算式）可能包含的字符；流式处理时块尾的这些字符留到下一块
+_NUMERAL_CHARS = "0123456789.-/%aAsSmMdD \t\n\r\f\v\u3000"
+# 保留字符中仍可安全断开的位置：数字之后、后面的空白紧接着另一个数字（没有运算符号，前一个数已结束）
+_NUMERAL_BREAK = re.compile(r"(?<=[0-9])(?=\s+-?\.?[0-9])")
+
+
+@lru_cache(maxsize=None)
+def _four_digits_to_chinese(group: str, leading: bool) -> str:
+    """
+    1-4位数字转中文（开头的零跳过，组内的零合并读作一个“零”）
+    :param leading: 是否为整个数的最高组（只有最高组的 10-19 省略“一”，读作“十几”）
+    """
+    result = ''
+    zero_flag = False
+    digit_units = ('千', '百', '十', '')[4 - len(group):]
+    for i, ch in enumerate(group):
+        if ch == '0':
+            zero_flag = bool(result)
+            continue
+        if zero_flag:
+            result += _CHINESE_DIGITS[0]
+            zero_flag = False
+        if digit_units[i] == '十' and ch == '1' and leading and not result:
+            result += '十'
+        else:
+            result += _CHINESE_DIGITS[int(ch)] + digit_units[i]
+    return result
+
+
+def _digits_to_chinese(digits: str, leading: bool = True) -> str:
+    """不超过 44 位的数字串按万进制分组转换，全零返回空串"""
+    groups = [digits[max(0, i - 4):i] for i in range(len(digits), 0, -4)]
+    result = ''
+    zero_flag = False
+    for level in reversed(range(len(groups))):
+        group = groups[level]
+        group_cn = _four_digits_to_chinese(group.lstrip('0'), leading and not result) if group.strip('0') else ''
+        if not group_cn:
+            # 空组之后再出现非零组时补“零”（非最高段开头的空组也算，如 1载0…05）
+            zero_flag = zero_flag or bool(result) or not leading
+            continue
+        # 前面有空组，或本组不足四位有效数字（如 10005 的 0005），补读“零”
+        if (zero_flag or (len(group) == 4 and group[0] == '0')) and (result or not leading):
+            result += _CHINESE_DIGITS[0]
+        zero_flag = False
+        result += group_cn + _LEVEL_UNITS[level]
+    return result
+
+
+@lru_cache(maxsize=4096)
+def int_to_chinese(digits: str) -> str:
+    """
+    任意长度的非负整数（数字串，不经 int 转换）转中文
+    超过 10^44 的部分按“载”逐级组合：A载B 表示 A×10^44+B
+    """
+    digits = digits.lstrip('0')
+    if not digits:
+        return _CHINESE_DIGITS[0]
+    head = len(digits) % _SUPER_GROUP_DIGITS or _SUPER_GROUP_DIGITS
+    result = _digits_to_chinese(digits[:head])
+    for start in range(head, len(digits), _SUPER_GROUP_DIGITS):
+        chunk = digits[start:start + _SUPER_GROUP_DIGITS]
+        result += _SUPER_UNIT + _digits_to_chinese(chunk, leading=False)
+    return result
+
+
+_DECIMAL_TABLE = str.maketrans('0123456789', _CHINESE_DIGITS)
+
+
+def _decimal_to_chinese(decimal_digits: Optional[str]) -> str:
+    if not decimal_digits:
+        return ''
+    return '点' + decimal_digits.translate(_DECIMAL_TABLE)
+
+
+def _numeral_to_chinese(m) -> str:
+    """_NUMERAL 的替换回调"""
+    integer, den, dec, pct, dotdec = m.group('int', 'den', 'dec', 'pct', 'dotdec')
+    if integer is None and dotdec is None:
+        return _OPERATORS[m.group('op').strip().lower()] + ('负' if m.group('opsign') else '')
+    sign = '负' if m.group('sign') else ''
+    if dotdec is not None:
+        return f"{sign}零{_decimal_to_chinese(dotdec)}"
+    integer_cn = int_to_chinese(integer)
+    if den is not None:
+        if den.lstrip('0') == '1':
+            return sign + integer_cn
+        return f"{sign}{int_to_chinese(den)}分之{integer_cn}"
+    if pct is not None:
+        return f"{sign}百分之{integer_cn}{_decimal_to_chinese(dec)}"
+    return f"{sign}{integer_cn}{_decimal_to_chinese(dec)}"
+
+
+def numerals_to_chinese(text: str) -> str:
+    """把文本中的阿拉伯数字（整数、小数、分数、百分数及数字间的运算符号）原地替换为中文，一次线性扫描"""
+    return _NUMERAL.sub(_numeral_to_chinese, text)
+
+
+# 文本处理步骤的三种形式：字符映射表、正则替换、任意函数
+TranslateStep = namedtuple('TranslateStep', ('table',))
+# chars: 正则能匹配到的全部字符（字符类连续串），用于判断多个正则能否合并为一次扫描
+RegexStep = namedtuple('RegexStep', ('pattern', 'repl', 'chars'))
+# chars: 跨分块边界时可能属于同一匹配的字符（流式处理时块尾的这些字符留到下一块），None表示需要完整文本
+# breaks: 可选的零宽正则，匹配块尾保留字符中仍可安全断开的位置，避免纯数字等文本一直留到下一块
+FuncStep = namedtuple('FuncStep', ('func', 'chars', 'breaks'), defaults=(None,))
+
+
+def _compose_tables(first: dict, second: dict) -> dict:
+    """合成两个 str.translate 映射表：结果等价于先用first再用second"""
+    table = dict(second)
+    for code, value in first.items():
+        if value is None:
+            table[code] = None
+        else:
+            table[code] = (chr(value) if isinstance(value, int) else value).translate(second)
+    return table
+
+
+def _can_fuse_regex(group: list, step: RegexStep) -> bool:
+    """
+    正则步骤能否与前面的步骤合并为一次扫描（交替匹配）：
+    替换文本相同（合并后仍是字面替换，在C层完成；不同替换需要Python回调，反而比分开扫描慢），
+    且各步骤匹配的字符集互不相交、替换文本非空且不含任何步骤匹配的字符，
+    此时同时替换与依次替换的结果相同
+    """
+    if not isinstance(step.repl, str) or not step.repl or step.repl != group[0].repl:
+        return False
+    if set(step.repl) & set(step.chars) or any(set(step.repl) & set(other.chars) for other in group):
+        return False
+    return not any(set(other.chars) & set(step.chars) for other in group)
+
+
+class TextPipeline:
+    """
+    由多个文本处理步骤组成的流水线，构造时把相邻的步骤尽量合并：
+    相邻的字符映射表合成一张表，替换相同且互不干扰的相邻正则合并为一个交替正则，
+    多步清理在大文本上只需扫描很少几遍。
+    stream() 以有界的分块处理文件或字符串迭代器，每一遍把块尾可能跨块的字符（如连续空白、数字）
+    留到下一块再处理，惰性产出结果，内存占用与输入大小无关
+    """
+    MAX_CARRY = 64 * 1024  # 流式处理时每遍最多留到下一块的字符数
+    def __init__(self, steps: Iterable[str]):
+        """
+        :param steps: 步骤名称（TextProcessor.STEPS 的键），按顺序执行
+        """
+        self.steps = list(steps)
+        specs = []
+        for name in self.steps:
+            if name not in TextProcessor.STEPS:
+                raise ValueError(f"未知的文本处理步骤: {name}")
+            specs.extend(TextProcessor.STEPS[name])
+        self._passes = self._fuse(specs)
+
+    @staticmethod
+    def _fuse(specs: list) -> list:
+        """合并相邻的同类步骤，返回每遍扫描的 (函数, 跨块保留字符, 安全断点正则)"""
+        groups: list = []
+        for spec in specs:
+            last = groups[-1] if groups else None
+            if isinstance(spec, TranslateStep) and last and isinstance(last[0], TranslateStep):
+                last[0] = TranslateStep(_compose_tables(last[0].table, spec.table))
+            elif isinstance(spec, RegexStep) and last and isinstance(last[0], RegexStep) and _can_fuse_regex(last, spec):
+                last.append(spec)
+            else:
+                groups.append([spec])
+
+        passes = []
+        for group in groups:
+            spec = group[0]
+            if isinstance(spec, TranslateStep):
+                # 逐字符映射，分块处理无需保留
+                passes.append((lambda text, table=spec.table: text.translate(table), "", None))
+            elif isinstance(spec, RegexStep):
+                pattern = re.compile("|".join(f"(?:{step.pattern})" for step in group))
+                passes.append((lambda text, pattern=pattern, repl=spec.repl: pattern.sub(repl, text),
+                               "".join(step.chars for step in group), None))
+            else:
+                passes.append((spec.func, spec.chars, spec.breaks))
+        return passes
+
+    @property
+    def pass_count(self) -> int:
+        """合并后需要扫描文本的遍数"""
+        return len(self._passes)
+
+    def run(self, text: str) -> str:
+        for text_pass, _, _ in self._passes:
+            text = text_pass(text)
+        return text
+
+    @property
+    def streamable(self) -> bool:
+        """所有步骤是否都支持分块处理"""
+        return all(chars is not None for _, chars, _ in self._passes)
+
+    def stream(self, source, chunk_size: int = 1024 * 1024):
+        """
+        分块处理文本，惰性产出结果
+        :param source: 文本模式打开的文件对象（有read方法），或产出字符串的可迭代对象
+        :param chunk_size: 从文件读取时每块的字符数
+        :return: 产出处理后文本片段的生成器，依次拼接即为完整结果
+        """
+        if not self.streamable:
+            raise ValueError("流水线中包含需要完整文本的步骤，无法分块处理")
+        if hasattr(source, 'read'):
+            chunks = iter(lambda: source.read(chunk_size), "")
+        else:
+            chunks = iter(source)
+        for text_pass, chars, breaks in self._passes:
+            chunks = self._stream_pass(chunks, text_pass, chars, breaks)
+        return (chunk for chunk in chunks if chunk)
+
+    @classmethod
+    def _stream_pass(cls, chunks, text_pass, chars: str, breaks=None):
+        """
+        一遍分块处理：块尾由 chars 中字符组成的部分可能与下一块连成一个匹配，留到下一块；
+        这部分中有安全断点（breaks）时从最后一个断点断开。
+        留下的文本超过 MAX_CARRY 时直接处理（只有超长的单个数字或空白串会受影响），
+        保证内存有界、每个字符只被重复扫描有限次
+        """
+        carry = ""
+        for chunk in chunks:
+            text = carry + chunk if carry else chunk
+            if not chars:
+                yield text_pass(text)
+                continue
+            # 多留一个字符作为下一块开头的上下文（如判断负号前是否为字母）
+            tail = len(text.rstrip(chars))
+            cut = tail - 1
+            if breaks is not None:
+                for match in breaks.finditer(text, max(tail, 1)):
+                    cut = match.start()
+            if len(text) - max(cut, 0) > cls.MAX_CARRY:
+                cut = len(text)
+            if cut <= 0:
+                carry = text
+                continue
+            carry = text[cut:]
+            yield text_pass(text[:cut])
+        if carry:
+            yield text_pass(carry)
+
+    def run_file(self, src_path: str, dst_path: str, chunk_size: int = 1024 * 1024):
+        """分块处理一个文本文件并写出结果（UTF-8）"""
+        with open(src_path, "r", encoding="utf-8") as src, open(dst_path, "w", encoding="utf-8") as dst:
+            for piece in self.stream(src, chunk_size):
+                dst.write(piece)
+
+
+# 用户定义的宏：宏名称 -> 步骤名称列表，保存为 JSON
+class MacroStore:
+    def __init__(self, path: str):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.path = path
+        self.macros: dict = {}
+
+    def load(self) -> dict:
+        """读取宏文件，忽略无效的宏"""
+        self.macros = {}
+        if not os.path.exists(self.path):
+            return self.macros
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.error(f"读取宏文件失败: {str(e)}")
+            return self.macros
+        for name, steps in data.items():
+            if isinstance(steps, list) and steps and all(step in TextProcessor.STEPS for step in steps):
+                self.macros[name] = steps
+            else:
+                self.logger.warning(f"忽略无效的宏: {name}")
+        return self.macros
+
+    def save(self):
+        try:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self.macros, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            self.logger.error(f"保存宏文件失败: {str(e)}")
+
+    def pipeline(self, name: str) -> TextPipeline:
+        return TextPipeline(self.macros[name])
+
+
 class TextProcessor:
+    # 可组合的处理步骤：名称 -> 规格列表，单独调用和宏流水线共用同一份定义
+    STEPS = {
+        "remove_whitespace": [TranslateStep(str.maketrans('', '', ' \t\n\r\f\v'))],
+        # 只匹配需要改动的串（两个以上的换行；含制表符或两个以上的空白），单个空格和换行不触发替换
+        "merge_spaces": [RegexStep(r'\n\n+', '\n', '\n'), RegexStep(r'\t[ \t]*| [ \t]+', ' ', ' \t')],
+        "punc_to_newline": [TranslateStep(str.maketrans({punc: '\n' for punc in ',，.。!！?？;；:："-'}))],
+        "to_halfwidth": [TranslateStep(str.maketrans(_WIDTH_TABLE))],
+        "num_to_chinese": [FuncStep(numerals_to_chinese, _NUMERAL_CHARS, _NUMERAL_BREAK)],
+    }
+
     def __init__(self, text: str):
         # 外部文本
         self.text = text
@@ -638,171 +1512,33 @@ class TextProcessor:
         self.text = text
 
 
+    def run(self, steps: List[str]) -> str:
+        """按顺序执行多个处理步骤（相邻步骤合并扫描）"""
+        return TextPipeline(steps).run(self.text)
+
+
+    @staticmethod
+    def stream(steps: List[str], source, chunk_size: int = 1024 * 1024):
+        """对文件或字符串迭代器分块执行处理步骤，惰性产出结果（见 TextPipeline.stream）"""
+        return TextPipeline(steps).stream(source, chunk_size)
+
+
     # 删除文本空白
     def remove_all_whitespace(self) -> str:
-        return self.text.translate(str.maketrans('', '', ' \t\n\r\f\v'))
+        return self.run(["remove_whitespace"])
 
 
     # 合并多个空格
     def merge_multiple_spaces(self) -> str:
-        text = re.sub(r'\n+', '\n', self.text)
-        # 合并连续空白
-        return re.sub(r'[ \t]+', ' ', text)
+        # 合并连续换行和连续空白（两遍正则扫描，替换文本不同，不合并）
+        return self.run(["merge_spaces"])
 
 
     #  分行
     def replace_punctuation_with_newline(self) -> str:
-        common_punctuations = [
-            ',', '，', '.', '。', '!', '！', '?', '？', ';', '；',
-            ':', '：', '"', 
-            '-'
-        ]
-        trans_table = str.maketrans({punc: '\n' for punc in common_punctuations})
-        return self.text.translate(trans_table)
+        return self.run(["punc_to_newline"])
 
 
-    # 阿拉伯数字转中文
+    # 阿拉伯数字转中文（原地替换，保留其余文本）
     def arabic_to_chinese(self) -> str:
-        chinese_nums = ['零', '一', '二', '三', '四', '五', '六', '七', '八', '九']
-        level_units = ['', '万', '亿', '万亿']  # 第0组=个级、第1组=万级、第2组=亿级
-        # 四则运算符号映射表
-        op_map = {
-            'a': ' + ',
-            's': ' - ',
-            'm': ' × ',
-            'd': ' ÷ '
-        }
-
-        def four_digit_to_chinese(num_str: str) -> str:
-            """直接处理1-4位数字，自动跳过开头零，组内零正常处理"""
-            if not num_str or num_str == '0000':
-                return ''
-            
-            result = ''
-            zero_flag = False
-            digit_units = ['千', '百', '十', '']  # 对应4位的位权（从左到右）
-            # 找到第一个非零数字的位置，跳过开头零
-            first_non_zero = 0
-            while first_non_zero < len(num_str) and num_str[first_non_zero] == '0':
-                first_non_zero += 1
-            if first_non_zero == len(num_str):
-                return ''  # 全零返回空
-
-            # 从第一个非零数字开始处理，按4位位权对应（不足4位时自动匹配）
-            for i in range(len(num_str)):
-                digit = int(num_str[i])
-                unit = digit_units[4 - len(num_str) + i]  # 匹配正确位权
-                if digit == 0:
-                    zero_flag = True
-                else:
-                    if zero_flag:
-                        result += chinese_nums[0]
-                        zero_flag = False
-                    # 十位特殊处理：仅10-19（两位数）省略"一"
-                    if unit == '十' and digit == 1 and first_non_zero == i:
-                        result += unit
-                    else:
-                        result += chinese_nums[digit] + unit
-            return result
-
-        def int_to_chinese(num: int) -> str:
-            if num == 0:
-                return chinese_nums[0]
-            
-            # 处理负数
-            is_negative = False
-            if num < 0:
-                is_negative = True
-                num = -num
-
-            num_str = str(num)
-            # 去除整体前导零（开头的0全部忽略）
-            num_str = num_str.lstrip('0')
-            # 全零特殊处理：还原为"0"
-            if not num_str:
-                num_str = "0"
-
-            # 从右往左4位分组，不补零
-            groups = []
-            for i in range(len(num_str), 0, -4):
-                start = max(0, i - 4)
-                groups.append(num_str[start:i])
-
-            result = ''
-            level_zero_flag = False
-            # 逆序遍历分组（从万/亿级到个级）
-            for i in reversed(range(len(groups))):
-                group = groups[i]
-                group_cn = four_digit_to_chinese(group)
-                level_unit = level_units[i]
-
-                if not group_cn:
-                    level_zero_flag = True
-                    continue
-
-                if level_zero_flag:
-                    result += chinese_nums[0]
-                    level_zero_flag = False
-
-                result += group_cn + level_unit
-
-            # 清理末尾零和开头"一十"
-            result = result.rstrip('零')
-            if result.startswith('一十') and len(result) == 2:
-                result = '十'
-
-            return ('负' + result) if is_negative else result
-
-        def decimal_to_chinese(decimal_str: str) -> str:
-            if not decimal_str:
-                return ''
-            return '点' + ''.join([chinese_nums[int(c)] for c in decimal_str])
-
-        def fraction_to_chinese(numerator: str, denominator: str) -> str:
-            numerator_cn = int_to_chinese(int(numerator))
-            denominator_cn = int_to_chinese(int(denominator))
-            return f"{denominator_cn}分之{numerator_cn}" if denominator != '1' else numerator_cn
-
-        # 关键修改1：正则新增匹配四则运算符号（+、-、*、/），保持原顺序提取
-        pattern = r"""
-            (-?\d+\/\d+) |                # 分数（优先匹配，避免被/符号单独匹配）
-            (-?\d+\.?\d*%) |              # 百分数
-            (-?\d+\.\d+) |                # 小数（正常格式如1.23）
-            (-?\.\d+) |                   # 小数（点开头如.123）
-            (-?\d+) |                     # 整数
-            ([aAsSmMdD])                  # 四则运算符号（单独分组）
-        """
-        # 提取所有匹配项（包括数字类和符号类），保持原文本顺序
-        matches = re.findall(pattern, self.text, re.VERBOSE | re.MULTILINE)
-
-        chinese_results = []
-        for match in matches:
-            (fraction, percent, decimal_normal, decimal_dot_start, integer, op) = match
-            if fraction:
-                # 分数处理（注意：分数的/已包含在分组内，不会被符号匹配）
-                numerator, denominator = fraction.split('/', 1)
-                chinese_results.append(fraction_to_chinese(numerator, denominator))
-            elif percent:
-                num_part = percent[:-1]
-                if '.' in num_part:
-                    int_part, dec_part = num_part.split('.', 1)
-                    chinese_results.append(f"百分之{int_to_chinese(int(int_part))}{decimal_to_chinese(dec_part)}")
-                else:
-                    chinese_results.append(f"百分之{int_to_chinese(int(num_part))}")
-            elif decimal_normal:
-                int_part, dec_part = decimal_normal.split('.', 1)
-                chinese_results.append(f"{int_to_chinese(int(int_part))}{decimal_to_chinese(dec_part)}")
-            elif decimal_dot_start:
-                dec_part = decimal_dot_start.lstrip('.')
-                chinese_results.append(f"零{decimal_to_chinese(dec_part)}")
-            elif integer:
-                chinese_results.append(int_to_chinese(int(integer)))
-            elif op:
-                # 关键修改2：符号映射，按规则添加前后空格
-                chinese_results.append(op_map[op.lower()])
-
-        # 关键修改3：拼接所有结果，最后清理首尾多余空格（避免符号在开头/结尾导致的空格）
-        final_result = ''.join(chinese_results).strip()
-        # 清理可能的连续空格（如符号前后与数字拼接时的冗余空格）
-        final_result = re.sub(r'\s+', ' ', final_result)
-        return final_result
+        return numerals_to_chinese(self.text)
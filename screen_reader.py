@@ -0,0 +1,153 @@
+import diagnostics
+import logging
+import random
+import threading
+import time
+
+from typing import Optional
+
+
+# 屏幕阅读器后端基类：统一查询最后朗读内容与朗读文本的接口，并统计每次调用
+class ScreenReaderBackend:
+    """
+    屏幕阅读器后端接口
+    子类实现 _last_phrase()/_output()，外部统一调用 last_phrase()/output()。
+    每次调用（一次IPC往返）按方法和发起者（热键或工作线程）计数并计时，
+    用于衡量每个热键产生了多少次往返
+    """
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self._call_stats: dict = {}  # (方法, 发起者) -> [次数, 失败次数, 总耗时, 最大耗时]
+
+    def _last_phrase(self) -> Optional[str]:
+        raise NotImplementedError("子类必须实现_last_phrase方法")
+
+    def _output(self, text: str) -> None:
+        raise NotImplementedError("子类必须实现_output方法")
+
+    def last_phrase(self) -> Optional[str]:
+        """查询屏幕阅读器最后朗读的内容"""
+        return self._timed("last_phrase", self._last_phrase)
+
+    def output(self, text: str) -> None:
+        """让屏幕阅读器朗读文本"""
+        return self._timed("output", self._output, text)
+
+    def _timed(self, method: str, func, *args):
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = func(*args)
+            failed = False
+            return result
+        finally:
+            elapsed = time.perf_counter() - start
+            # 发起者优先取延迟追踪的热键名（朗读在朗读线程中执行，仍归到触发它的热键），其次取线程标签
+            trace = diagnostics.tracer.current()
+            key = (method, trace.name if trace is not None else diagnostics.current_tag() or "-")
+            with self._stats_lock:
+                stats = self._call_stats.get(key)
+                if stats is None:
+                    stats = self._call_stats[key] = [0, 0, 0.0, 0.0]
+                stats[0] += 1
+                stats[1] += failed
+                stats[2] += elapsed
+                stats[3] = max(stats[3], elapsed)
+
+    def call_stats(self) -> dict:
+        """
+        调用统计
+        :return: {方法: {发起者: {'calls', 'failures', 'total_ms', 'mean_ms', 'max_ms'}}}
+        """
+        result: dict = {}
+        with self._stats_lock:
+            items = [(key, list(stats)) for key, stats in self._call_stats.items()]
+        for (method, caller), (calls, failures, total, longest) in items:
+            result.setdefault(method, {})[caller] = {
+                'calls': calls,
+                'failures': failures,
+                'total_ms': round(total * 1000, 2),
+                'mean_ms': round(total * 1000 / calls, 3),
+                'max_ms': round(longest * 1000, 2),
+            }
+        return result
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._call_stats.clear()
+
+
+# macOS VoiceOver：通过 AppleScript（appscript）通信，每次调用一次AppleEvent往返
+class AppleScriptBackend(ScreenReaderBackend):
+    def __init__(self):
+        super().__init__()
+        import appscript
+        self._vo = appscript.app("VoiceOver")  # 建立与VoiceOver的连接
+
+    def _last_phrase(self) -> Optional[str]:
+        return self._vo.last_phrase.content()
+
+    def _output(self, text: str) -> None:
+        self._vo.output(text)
+
+
+# 内存屏幕阅读器：用于Linux下测试与基准，可设置往返延迟和注入失败
+class FakeScreenReaderBackend(ScreenReaderBackend):
+    def __init__(self, phrase: Optional[str] = None, latency: float = 0.0, failure_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        """
+        :param phrase: 初始的最后朗读内容
+        :param latency: 每次调用模拟的往返延迟（秒）
+        :param failure_rate: 每次调用随机失败的概率
+        :param seed: 随机失败的种子，便于复现
+        """
+        super().__init__()
+        self._lock = threading.Lock()
+        self._phrase = phrase
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._fail_next = 0
+        self.spoken: list = []  # output() 收到的文本
+
+    def set_phrase(self, text: Optional[str]):
+        """模拟VoiceOver朗读了一段内容"""
+        with self._lock:
+            self._phrase = text
+
+    def fail_next(self, count: int = 1):
+        """让接下来的若干次调用失败"""
+        with self._lock:
+            self._fail_next += count
+
+    def _round_trip(self):
+        if self.latency > 0:
+            time.sleep(self.latency)
+        with self._lock:
+            if self._fail_next > 0:
+                self._fail_next -= 1
+                fail = True
+            else:
+                fail = self.failure_rate > 0 and self._random.random() < self.failure_rate
+        if fail:
+            # 与 VoiceOver 关闭时的错误信息一致，走相同的错误处理分支
+            raise RuntimeError("VoiceOver is not running")
+
+    def _last_phrase(self) -> Optional[str]:
+        self._round_trip()
+        with self._lock:
+            return self._phrase
+
+    def _output(self, text: str) -> None:
+        self._round_trip()
+        with self._lock:
+            self.spoken.append(text)
+
+
+def default_backend() -> ScreenReaderBackend:
+    """优先使用VoiceOver，appscript不可用时（非macOS）回退到内存实现"""
+    try:
+        return AppleScriptBackend()
+    except ImportError:
+        logging.getLogger(__name__).warning("appscript不可用，使用内存屏幕阅读器")
+        return FakeScreenReaderBackend()
@@ -275,15 +275,30 @@ lang_dict = {
         'delete_btn_tips': '删除选中项',
         'edit_btn': '编辑',
         'edit_btn_tips': '编辑选中项',
+        'pin_btn': '固定',
+        'pin_btn_tips': '固定/取消固定选中项，固定项不会被自动清理',
+        'pinned_mark': '[固定]',
+        'pinned': '已固定',
+        'unpinned': '已取消固定',
         'confirm_btn': '确定',
         'cancel_btn': '取消',
         'vo_warning': '获取VoiceOver朗读内容失败',
+        'vo_monitor_off': '未开启VoiceOver朗读监听',
+        'unit_char': '字',
+        'unit_word': '词',
+        'unit_sentence': '句',
+        'unit_paragraph': '段',
+        'unit_line': '行',
         'model_warning': '翻译模型加载失败,仅保留本地词典功能',
         'menu_about': '关于 Magic Toolbox',
         'menubar_opt': '操作',
         'menu_opt_rebootVO': '重启旁白',
         'menu_opt_reboot_proc': '重启处理器',
         'menu_opt_clean_list': '清空剪贴板列表',
+        'menu_opt_profiler': '性能采样',
+        'profiler_saved': '性能采样结果已保存',
+        'menu_opt_latency': '导出热键延迟统计',
+        'latency_saved': '热键延迟统计已保存',
         'about_dialog': ''' ''',
         'now': '当前',
         'row': '行',
@@ -294,8 +309,21 @@ lang_dict = {
         'edd_merge_spaces_btn': '合并连续空格',
         'edd_num_to_chinese_btn': '数字转中文',
         'edd_punc_to_newline_btn': '分句',
+        'edd_to_halfwidth_btn': '全角转半角',
+        'edd_new_macro': '新建宏…',
+        'edd_macro_name_prompt': '输入宏名称',
+        'edd_macro_step_prompt': '选择第{}步（选“完成”结束）',
+        'edd_macro_done': '完成',
         'msg_motice': '提示',
         'msg_is_close': '确定要退出吗？',
+        'search_title': '搜索剪贴板',
+        'search_prompt': '输入要搜索的内容',
+        'find_title': '在当前剪贴板中查找',
+        'find_prompt': '输入要查找的内容（忽略大小写和全半角）',
+        'find_not_found': '未找到',
+        'search_no_result': '没有找到匹配项',
+        'search_indexing': '正在建立搜索索引，请稍后再试',
+        'search_result': '找到',
     },
     'en': {
 'app_name': 'Magic Toolbox',
@@ -309,15 +337,30 @@ lang_dict = {
         'delete_btn_tips': 'Delete current item',
         'edit_btn': 'Edit',
         'edit_btn_tips': 'Edit current item',
+        'pin_btn': 'Pin',
+        'pin_btn_tips': 'Pin or unpin current item; pinned items are never cleaned up',
+        'pinned_mark': '[Pinned]',
+        'pinned': 'Pinned',
+        'unpinned': 'Unpinned',
         'confirm_btn': 'OK',
         'cancel_btn': 'Cancel',
         'vo_warning': 'Getting VoiceOver Reading Failed',
+        'vo_monitor_off': 'VoiceOver phrase monitor is off',
+        'unit_char': 'Character',
+        'unit_word': 'Word',
+        'unit_sentence': 'Sentence',
+        'unit_paragraph': 'Paragraph',
+        'unit_line': 'Line',
         'model_warning': 'Translation model loading failed, retaining only local dictionary functions',
         'menu_about': 'About Magic Toolbox',
         'menubar_opt': 'Operation',
         'menu_opt_rebootVO': 'Reboot VoiceOver',
         'menu_opt_reboot_proc': 'Reboot Processer',
         'menu_opt_clean_list': 'Empty Clipboard List',
+        'menu_opt_profiler': 'Sampling Profiler',
+        'profiler_saved': 'Profile saved',
+        'menu_opt_latency': 'Export hotkey latency',
+        'latency_saved': 'Hotkey latency saved',
         'now': 'Is',
         'row': 'Row',
         'column': 'Column',
@@ -327,8 +370,21 @@ lang_dict = {
         'edd_merge_spaces_btn': 'Merge Consecutive Spaces',
         'edd_num_to_chinese_btn': 'Convert Numbers to Chinese',
         'edd_punc_to_newline_btn': 'Split into Sentences',
+        'edd_to_halfwidth_btn': 'Full-width to Half-width',
+        'edd_new_macro': 'New Macro…',
+        'edd_macro_name_prompt': 'Enter a macro name',
+        'edd_macro_step_prompt': 'Choose step {} (choose "Done" to finish)',
+        'edd_macro_done': 'Done',
         'msg_motice': 'Notice',
-        'msg_is_close': 'Are you sure you want to quit?'
+        'msg_is_close': 'Are you sure you want to quit?',
+        'search_title': 'Search Clipboard',
+        'search_prompt': 'Enter text to search for',
+        'find_title': 'Find in Current Clipboard',
+        'find_prompt': 'Enter text to find (case and width insensitive)',
+        'find_not_found': 'Not found',
+        'search_no_result': 'No matches found',
+        'search_indexing': 'The search index is still being built, please try again shortly',
+        'search_result': 'Found',
     }
 }
 
@@ -371,6 +427,43 @@ def get_system_language():
 # 全局语言变量
 current_lang = get_system_language()
 
+# 剪贴板内容超过该字符数时存为磁盘blob，内存中只保留摘要、长度和预览
+clipboard_blob_threshold = 64 * 1024
+# 剪贴板内容超过该字符数时压缩保存（内存、快照和blob），预览不压缩；安装zstandard时使用zstd，否则用zlib
+clipboard_compress_threshold = 4 * 1024
+# 剪贴板历史日志记录数超过该值时在后台压缩为快照
+history_compact_threshold = 500
+# 剪贴板历史快照每页的条目数，启动时只加载第一页
+history_page_size = 256
+# 保存请求的合并窗口（秒），窗口内的多次修改只写一次盘
+history_save_delay = 0.5
+# 剪贴板历史保留策略（0表示不限制，默认全部不限制，需要时自行开启），固定的条目不受限制
+# 例如 history_max_items = 5000、history_max_chars = 200 * 1024 * 1024、history_max_age_days = 365
+history_max_items = 0
+history_max_chars = 0
+history_max_age_days = 0
+
+# 全文搜索：每个条目最多索引的字符数、朗读的结果条数
+search_max_indexed_chars = 200000
+search_result_limit = 5
+# 后台事件（新剪贴板内容、翻译结果）合并刷新界面的最短间隔（秒）
+ui_frame_interval = 1 / 60
+# 翻译编辑框停止输入多久（秒）后朗读变化的部分
+text_speech_delay = 0.4
+# 在历史条目间切换时缓存最近浏览过的条目的阅读位置和索引（条数、总字数上限）
+browse_state_cache_size = 16
+browse_state_cache_chars = 64 * 1024 * 1024
+# 编辑对话框的用户宏（多个处理步骤合并执行），保存在应用数据目录
+macros_file_name = "macros.json"
+# 后台监听VoiceOver朗读并记入环形缓冲区，热键从内存读取最近的朗读（关闭则每次热键查询VoiceOver）
+# 监听每次轮询都是一次AppleEvent往返，默认关闭；开启后热键读到的朗读最多滞后一个轮询间隔
+# alt+shift+d / alt+shift+r 需要开启监听
+vo_phrase_monitor = False
+vo_phrase_poll_interval = 0.2
+vo_phrase_buffer_size = 64
+# alt+shift+d / alt+shift+r 一次取用的最近朗读条数
+vo_recent_phrase_count = 5
+
 #快捷键定义
 hotKeys = [
     {
@@ -434,7 +527,14 @@ hotKeys = [
         "modifiers": ["ALT", "SHIFT"],
         "key": "u",
         "handler": "on_hotkey_altshiftu",
-        "description": "alt+shift+u: 当前剪贴板前一个字"
+        "description": "alt+shift+u: 当前剪贴板前一个字（或当前单位）"
+    },
+    {
+        "name": "altshiftl",
+        "modifiers": ["ALT", "SHIFT"],
+        "key": "l",
+        "handler": "on_hotkey_altshiftl",
+        "description": "alt+shift+l: 切换浏览单位（字/词/句/段/行）"
     },
     {
         "name": "altshifti",
@@ -448,7 +548,7 @@ hotKeys = [
         "modifiers": ["ALT", "SHIFT"],
         "key": "o",
         "handler": "on_hotkey_altshifto",
-        "description": "alt+shift+o: 当前剪贴板后一个字"
+        "description": "alt+shift+o: 当前剪贴板后一个字（或当前单位）"
     },
     {
         "name": "altshiftj",
@@ -471,12 +571,54 @@ hotKeys = [
         "handler": "on_hotkey_altshiftm",
         "description": "alt+shift+m: 当前剪贴板字数统计"
     },
+    {
+        "name": "altshifts",
+        "modifiers": ["ALT", "SHIFT"],
+        "key": "s",
+        "handler": "on_hotkey_altshifts",
+        "description": "alt+shift+s: 搜索剪贴板历史"
+    },
     {
         "name": "altshiftp",
         "modifiers": ["ALT", "SHIFT"],
         "key": "p",
         "handler": "on_hotkey_altshiftp",
         "description": "alt+shift+p: 粘贴剪贴板当前行"
+    },
+    {
+        "name": "altshiftd",
+        "modifiers": ["ALT", "SHIFT"],
+        "key": "d",
+        "handler": "on_hotkey_altshiftd",
+        "description": "alt+shift+d: 最近几条VO内容添加到列表第一行"
+    },
+    {
+        "name": "altshiftr",
+        "modifiers": ["ALT", "SHIFT"],
+        "key": "r",
+        "handler": "on_hotkey_altshiftr",
+        "description": "alt+shift+r: 翻译最近几条VO内容"
+    },
+    {
+        "name": "altshiftf",
+        "modifiers": ["ALT", "SHIFT"],
+        "key": "f",
+        "handler": "on_hotkey_altshiftf",
+        "description": "alt+shift+f: 在当前剪贴板中查找"
+    },
+    {
+        "name": "altshiftg",
+        "modifiers": ["ALT", "SHIFT"],
+        "key": "g",
+        "handler": "on_hotkey_altshiftg",
+        "description": "alt+shift+g: 查找下一个"
+    },
+    {
+        "name": "altshiftb",
+        "modifiers": ["ALT", "SHIFT"],
+        "key": "b",
+        "handler": "on_hotkey_altshiftb",
+        "description": "alt+shift+b: 查找上一个"
     }
 ]
 
@@ -0,0 +1,344 @@
+import os
+
+import pytest
+
+from clipboard_store import BlobStore, ClipboardHistory, ClipEntry, RetentionPolicy, SearchIndex
+
+
+BLOB_THRESHOLD = 2000
+COMPRESS_THRESHOLD = 200
+
+
+def open_history(data_dir, **kwargs) -> ClipboardHistory:
+    """按界面中的方式打开历史：blob目录放在数据目录下，加载快照并重放日志"""
+    blob_store = BlobStore(os.path.join(data_dir, "blobs"), threshold=BLOB_THRESHOLD,
+                           compress_threshold=COMPRESS_THRESHOLD)
+    kwargs.setdefault('compact_threshold', 1000)
+    history = ClipboardHistory(str(data_dir), blob_store=blob_store, **kwargs)
+    history.load()
+    return history
+
+
+def add(history: ClipboardHistory, text: str) -> int:
+    return history.add_front(history.blob_store.make_entry(text))
+
+
+def save(history: ClipboardHistory):
+    """与 HistoryPersister.flush 相同的顺序：blob先于引用它的日志记录落盘"""
+    history.blob_store.flush()
+    history.flush_pending()
+
+
+def texts(history: ClipboardHistory) -> list:
+    return [history.text_at(idx) for idx in range(len(history))]
+
+
+def journal_path(data_dir) -> str:
+    return os.path.join(data_dir, ClipboardHistory.JOURNAL_NAME)
+
+
+# 小文本、压缩文本和blob文本混合
+SAMPLES = ["short", "压缩" * 300, "blob" * 1000, "another", "x" * 250]
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    return str(tmp_path)
+
+
+def test_journal_replay(data_dir):
+    history = open_history(data_dir)
+    for text in SAMPLES:
+        add(history, text)
+    history.move(3, 0)
+    del history[1]
+    expected = texts(history)
+    save(history)
+    history.close()
+
+    assert texts(open_history(data_dir)) == expected
+
+
+def test_torn_tail_record_is_dropped(data_dir):
+    history = open_history(data_dir)
+    for text in SAMPLES[:3]:
+        add(history, text)
+    save(history)
+    expected = texts(history)
+    add(history, "torn")
+    save(history)
+    history.close()
+
+    # 模拟写最后一条记录时崩溃：只留下记录的前半部分
+    path = journal_path(data_dir)
+    size = os.path.getsize(path)
+    with open(path, "r+b") as f:
+        f.truncate(size - 5)
+
+    history = open_history(data_dir)
+    assert texts(history) == expected
+    # 残缺的记录被截掉，之后追加的记录可以正常重放
+    add(history, "after crash")
+    save(history)
+    history.close()
+    assert texts(open_history(data_dir)) == ["after crash"] + expected
+
+
+def test_corrupt_record_stops_replay(data_dir):
+    history = open_history(data_dir)
+    add(history, "first")
+    save(history)
+    valid_size = os.path.getsize(journal_path(data_dir))
+    add(history, "second")
+    save(history)
+    history.close()
+
+    # 最后一条记录长度完整但内容损坏（CRC不符）
+    with open(journal_path(data_dir), "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes((last[0] ^ 0xFF,)))
+
+    history = open_history(data_dir)
+    assert texts(history) == ["first"]
+    assert os.path.getsize(journal_path(data_dir)) == valid_size
+
+
+def test_crash_between_snapshot_and_journal_truncation(data_dir):
+    history = open_history(data_dir)
+    for text in SAMPLES:
+        add(history, text)
+    history.move(4, 0)
+    save(history)
+    with open(journal_path(data_dir), "rb") as f:
+        journal = f.read()
+
+    # 快照已替换，但日志没来得及清空：恢复压缩前的日志
+    with history._io_lock:
+        history._compact()
+    expected = texts(history)
+    history.close()
+    with open(journal_path(data_dir), "wb") as f:
+        f.write(journal)
+
+    history = open_history(data_dir)
+    # 快照已包含的记录被跳过，不会重复插入
+    assert texts(history) == expected
+    add(history, "new")
+    save(history)
+    history.close()
+    assert texts(open_history(data_dir)) == ["new"] + expected
+
+
+def test_reload_after_compaction(data_dir):
+    history = open_history(data_dir, compact_threshold=4, page_size=2)
+    for idx in range(12):
+        add(history, f"{idx}:" + SAMPLES[idx % len(SAMPLES)])
+        save(history)
+    expected = texts(history)
+    history.close()
+
+    history = open_history(data_dir, compact_threshold=4, page_size=2)
+    assert len(history) == len(expected)
+    # 启动时只加载第一页，其余条目是快照序号占位
+    assert any(not isinstance(item, ClipEntry) for item in history._items)
+    assert texts(history) == expected
+    history.close()
+
+
+def test_compaction_remaps_unloaded_entries(data_dir):
+    history = open_history(data_dir, compact_threshold=1000, page_size=2)
+    for idx in range(10):
+        add(history, f"{idx}:" + SAMPLES[idx % len(SAMPLES)])
+    save(history)
+    with history._io_lock:
+        history._compact()
+    history.close()
+
+    history = open_history(data_dir, compact_threshold=3, page_size=3)
+    expected = texts(history)
+    history.close()
+
+    # 重新打开后不读取条目，直接修改占位条目并触发压缩
+    history = open_history(data_dir, compact_threshold=3, page_size=3)
+    history.move(7, 0)
+    history.set_pinned(5, True)
+    del history[8]
+    add(history, "inserted")
+    expected.insert(0, expected.pop(7))
+    del expected[8]
+    expected.insert(0, "inserted")
+    save(history)
+    assert history._journal_records == 0  # 已压缩
+    # 去重索引中的占位序号随压缩改为新快照中的序号
+    assert add(history, expected[4]) == 4
+    expected.insert(0, expected.pop(4))
+    assert texts(history) == expected
+    save(history)
+    history.close()
+
+    history = open_history(data_dir, compact_threshold=3, page_size=3)
+    assert texts(history) == expected
+    assert [idx for idx in range(len(history)) if history[idx].pinned] == [6]
+
+
+def test_add_front_deduplicates_and_moves(data_dir):
+    history = open_history(data_dir)
+    for text in SAMPLES:
+        assert add(history, text) == -1
+    assert add(history, SAMPLES[-1]) == 0  # 已在第一项，不变
+    assert add(history, SAMPLES[1]) == 3  # 移到最前，不新增副本
+    expected = [SAMPLES[1], SAMPLES[4], SAMPLES[3], SAMPLES[2], SAMPLES[0]]
+    assert texts(history) == expected
+    save(history)
+    with history._io_lock:
+        history._compact()
+    history.close()
+
+    # 重新打开后的去重索引同样识别快照中未加载的条目
+    history = open_history(data_dir, page_size=2)
+    assert history.warm_up() == []
+    assert add(history, SAMPLES[0]) == 4
+    assert texts(history) == [SAMPLES[0]] + expected[:-1]
+    assert len(history) == len(SAMPLES)
+
+
+def test_duplicates_added_before_warm_up_are_removed(data_dir):
+    history = open_history(data_dir)
+    for idx in range(6):
+        add(history, f"item{idx}")
+    save(history)
+    with history._io_lock:
+        history._compact()
+    history.close()
+
+    history = open_history(data_dir, page_size=2)
+    # 去重索引建立之前不读取快照，与未加载条目重复的内容先作为新条目加入
+    history[0]  # 列表显示过的条目已加载
+    assert add(history, "item0") == -1
+    assert add(history, "item5") == 1  # 已加载的条目仍能找到
+    duplicates = history.warm_up()
+    assert duplicates == [history.select_evictions(RetentionPolicy(max_items=6))[0]]
+    assert history.remove_entries(duplicates) == 1
+    assert texts(history) == ["item5", "item0", "item4", "item3", "item2", "item1"]
+    assert add(history, "item1") == 5
+
+
+def test_update_removes_duplicate(data_dir):
+    history = open_history(data_dir)
+    for text in ("a", "b", "c"):
+        add(history, text)
+    # 历史为 c, b, a；把 a 改成与第一项相同的 c，删除原来的 c
+    idx = history.update(2, ClipEntry("c"))
+    assert idx == 1
+    assert texts(history) == ["b", "c"]
+    assert add(history, "c") == 1
+    save(history)
+    history.close()
+    assert texts(open_history(data_dir)) == ["c", "b"]
+
+
+def test_evictions_survive_compaction(data_dir):
+    history = open_history(data_dir, page_size=4)
+    for idx in range(10):
+        add(history, f"item{idx}")
+    save(history)
+    with history._io_lock:
+        history._compact()
+    history.close()
+
+    history = open_history(data_dir, page_size=4)
+    victims = history.select_evictions(RetentionPolicy(max_items=9))
+    assert len(victims) == 2
+    # 挑选之后、界面线程删除之前发生了插入和压缩，快照序号已重新编号
+    add(history, "new")
+    save(history)
+    with history._io_lock:
+        history._compact()
+
+    assert history.remove_entries(victims) == 2
+    assert texts(history) == ["new"] + [f"item{idx}" for idx in range(9, 1, -1)]
+    # 已删除的条目不会再被删除
+    assert history.remove_entries(victims) == 0
+
+
+def test_evictions_skip_entries_pinned_or_reused_after_selection(data_dir):
+    history = open_history(data_dir, page_size=4)
+    for idx in range(10):
+        add(history, f"item{idx}")
+    save(history)
+    with history._io_lock:
+        history._compact()
+    history.close()
+
+    history = open_history(data_dir, page_size=4)
+    victims = history.select_evictions(RetentionPolicy(max_items=8))
+    assert len(victims) == 3
+    history.set_pinned(9, True)  # item0
+    add(history, "item1")  # 重新复制，移到最前并更新使用时间
+    assert history.remove_entries(victims) == 1
+    assert texts(history) == ["item1"] + [f"item{idx}" for idx in range(9, 2, -1)] + ["item0"]
+
+
+def test_unlimited_policy_selects_nothing():
+    policy = RetentionPolicy()
+    assert not policy.is_limited()
+    assert policy.select([ClipEntry("old", timestamp=0)]) == []
+
+
+def test_search_index_catches_up_with_changes_during_build(data_dir):
+    history = open_history(data_dir, page_size=2)
+    for text in ("apple pie", "banana split", "cherry tart", "苹果派"):
+        add(history, text)
+    save(history)
+    with history._io_lock:
+        history._compact()
+    history.close()
+    history = open_history(data_dir, page_size=2)
+    history.warm_up()
+
+    changed = []
+
+    def text_of(entry):
+        # 模拟建立索引期间界面线程修改历史
+        if not changed:
+            changed.append(True)
+            add(history, "apricot jam")
+            del history[history.find(ClipEntry("banana split"))]
+        return history.entry_text(entry)
+
+    index = SearchIndex(text_of)
+    history.add_observer(index)
+    assert index.search("apple") == []
+    index.build(history)
+    assert index.is_built()
+
+    def found(query):
+        return [history.entry_text(entry) for entry in index.search(query)]
+
+    assert found("ap") == ["apricot jam", "apple pie"]
+    assert found("banana") == []
+    assert found("苹果") == ["苹果派"]
+    add(history, "apple pie")  # 移到最前，排序随之改变
+    assert found("ap") == ["apple pie", "apricot jam"]
+    assert [history.index(entry) for entry in index.search("cherry")] == [3]
+
+
+def test_replace_all_reports_failed_snapshot(data_dir, monkeypatch):
+    history = open_history(data_dir)
+    add(history, "old")
+    save(history)
+
+    real_replace = os.replace
+
+    def failing_replace(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "replace", failing_replace)
+    assert not history.replace_all([ClipEntry("migrated")])
+    monkeypatch.setattr(os, "replace", real_replace)
+    # 失败后在下次写日志时重试压缩
+    save(history)
+    history.close()
+    assert texts(open_history(data_dir)) == ["migrated"]
@@ -0,0 +1,107 @@
+import json
+import os
+import pstats
+import threading
+import time
+
+import pytest
+
+import diagnostics
+from diagnostics import LatencyTracer, SamplingProfiler
+
+
+def record(tracer: LatencyTracer, name: str, latency: float):
+    """完成一条在 latency 秒后开始朗读的追踪"""
+    with tracer.trace(name) as trace:
+        trace.add_span(LatencyTracer.OUTPUT_SPAN, trace.start + latency, trace.start + latency)
+
+
+def test_summary_percentiles():
+    tracer = LatencyTracer()
+    for ms in range(100, 0, -1):
+        record(tracer, "hotkey", ms / 1000)
+    summary = tracer.summary()['hotkey']
+    assert summary['count'] == 100
+    assert summary['latency_ms'] == {'p50': 51.0, 'p95': 96.0, 'p99': 100.0}
+    assert set(summary['phases_ms']) == {LatencyTracer.OUTPUT_SPAN, "handler"}
+
+
+def test_window_keeps_recent_samples():
+    tracer = LatencyTracer(window=10)
+    for ms in range(1, 101):
+        record(tracer, "hotkey", ms / 1000)
+    summary = tracer.summary()['hotkey']
+    assert summary['count'] == 10
+    assert summary['latency_ms']['p50'] == 96.0
+
+
+def test_periodic_dump_runs_off_the_releasing_thread(tmp_path, monkeypatch):
+    tracer = LatencyTracer(output_dir=str(tmp_path), dump_every=2)
+    dump_threads = []
+    real_dump = tracer.dump
+
+    def dump():
+        dump_threads.append(threading.get_ident())
+        return real_dump()
+
+    monkeypatch.setattr(tracer, "dump", dump)
+    record(tracer, "hotkey", 0.01)
+    assert dump_threads == []
+    record(tracer, "hotkey", 0.02)
+    tracer._dump_thread.join(timeout=5)
+    assert dump_threads and threading.get_ident() not in dump_threads
+    with open(os.path.join(str(tmp_path), LatencyTracer.SUMMARY_NAME), encoding="utf-8") as f:
+        assert json.load(f)['hotkey']['count'] == 2
+
+
+def spin_until(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(100))
+
+
+def profile_tagged_worker(profiler: SamplingProfiler) -> str:
+    """在带标签的工作线程忙碌期间采样，返回输出文件路径"""
+    stop = threading.Event()
+
+    def worker():
+        with diagnostics.sample_tag("busy_tag"):
+            spin_until(stop)
+
+    thread = threading.Thread(target=worker, name="BusyWorker")
+    thread.start()
+    try:
+        profiler.start()
+        deadline = time.monotonic() + 5
+        while sum(profiler._samples.values()) < 20 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return profiler.stop()
+    finally:
+        stop.set()
+        thread.join()
+
+
+def test_profiler_writes_collapsed_stacks_by_tag(tmp_path):
+    path = profile_tagged_worker(SamplingProfiler(str(tmp_path), interval=0.001))
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    busy = [line for line in lines if line.startswith("busy_tag;BusyWorker;")]
+    assert busy
+    assert any(f"spin_until ({os.path.basename(__file__)}:" in line for line in busy)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+
+def test_profiler_writes_pstats(tmp_path):
+    path = profile_tagged_worker(SamplingProfiler(str(tmp_path), interval=0.001, output_format="pstats"))
+    stats = pstats.Stats(path)
+    assert any(name == "spin_until" for _, _, name in stats.stats)
+
+
+def test_profiler_from_env(tmp_path, monkeypatch):
+    monkeypatch.delenv("MAGIC_TOOLBOX_PROFILE", raising=False)
+    assert SamplingProfiler.from_env(str(tmp_path)) is None
+    monkeypatch.setenv("MAGIC_TOOLBOX_PROFILE", "pstats")
+    assert SamplingProfiler.from_env(str(tmp_path)).output_format == "pstats"
+    monkeypatch.setenv("MAGIC_TOOLBOX_PROFILE", "1")
+    assert SamplingProfiler.from_env(str(tmp_path)).output_format == "collapsed"
+    with pytest.raises(ValueError):
+        SamplingProfiler(str(tmp_path), output_format="json")
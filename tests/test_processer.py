@@ -0,0 +1,305 @@
+import threading
+import time
+
+import pytest
+
+import setting
+
+# processer 依赖翻译模型的包
+for _name in ('torch', 'transformers'):
+    pytest.importorskip(_name)
+
+from clipboard_backend import MemoryClipboardBackend
+from clipboard_store import BlobStore, ClipboardHistory, SearchIndex
+from processer import (ClipboardMonitor, HistoryPersister, RegexStep, SpeechQueue, TextBrowser, TextPipeline,
+                       TextProcessor, VoiceOverHandler, changed_segment, numerals_to_chinese)
+from screen_reader import FakeScreenReaderBackend
+
+
+def test_clipboard_monitor_reads_only_on_change():
+    backend = MemoryClipboardBackend()
+    monitor = ClipboardMonitor(backend=backend)
+    backend.set_text("copied")
+    assert monitor._run_task()[0] == "copied"
+    reads = backend.read_count
+    assert monitor._run_task() is None
+    assert backend.read_count == reads  # 变化标记未变，不读取内容
+
+
+def test_clipboard_monitor_skips_own_writes():
+    backend = MemoryClipboardBackend()
+    monitor = ClipboardMonitor(backend=backend)
+    monitor.write_text("from app")
+    assert monitor._run_task() is None
+    backend.set_text("from other app")
+    assert monitor._run_task()[0] == "from other app"
+
+
+def test_history_persister_retries_warm_up_and_builds_index_on_request(tmp_path, monkeypatch):
+    blob_store = BlobStore(str(tmp_path / "blobs"), threshold=2000)
+    history = ClipboardHistory(str(tmp_path), blob_store=blob_store)
+    history.load()
+    history.add_front(blob_store.make_entry("apple pie"))
+    index = SearchIndex(history.entry_text)
+    history.add_observer(index)
+
+    real_warm_up = history.warm_up
+    calls = []
+
+    def flaky_warm_up():
+        calls.append(True)
+        if len(calls) == 1:
+            raise OSError("snapshot busy")
+        return real_warm_up()
+
+    monkeypatch.setattr(history, "warm_up", flaky_warm_up)
+    monkeypatch.setattr(HistoryPersister, "_WARM_UP_RETRY_INTERVAL", 0.0)
+    persister = HistoryPersister(history, blob_store, search_index=index)
+    with pytest.raises(OSError):
+        persister._run_task()
+    persister._run_task()  # 失败后重试
+    assert history.is_warmed_up()
+    # 全文索引在第一次搜索请求之后才建立
+    assert not index.is_built()
+    index.request_build()
+    persister._run_task()
+    assert index.is_built()
+    assert index.search("apple") == [history[0]]
+    assert len(calls) == 2
+
+
+def test_speech_queue_keeps_only_the_latest_interrupting_text():
+    spoken = []
+    queue = SpeechQueue(spoken.append)
+    for step in ("a", "b", "c"):
+        queue.say(step)  # 连续导航：只朗读最新的位置
+    queue.say("")  # 空文本不入队
+    queue.say("queued", interrupt=False)
+    while queue._queue:
+        queue._run_task()
+    assert spoken == ["c", "queued"]
+    stats = queue.latency_stats()
+    assert stats['spoken'] == 2
+    assert stats['coalesced'] == 2
+
+
+def test_speech_queue_speaks_on_its_own_thread():
+    threads = []
+    done = threading.Event()
+
+    def speak(text):
+        threads.append(threading.get_ident())
+        done.set()
+
+    queue = SpeechQueue(speak)
+    queue.start_worker()
+    try:
+        queue.say("hello")
+        assert done.wait(5)
+    finally:
+        queue.stop_worker()
+    assert threads and threads[0] != threading.get_ident()
+
+
+def test_stream_numeric_only_input_is_bounded():
+    pipeline = TextPipeline(['num_to_chinese', 'merge_spaces'])
+    text = "12.5 13.75 -4\n" * 20000
+    lines = text.splitlines(keepends=True)
+    pieces = list(pipeline.stream(lines))
+    assert "".join(pieces) == pipeline.run(text)
+    # 每行都能在数字之间断开，不会把整个输入留到最后
+    assert max(map(len, pieces)) < 100
+
+
+def test_stream_carry_is_capped():
+    pipeline = TextPipeline(['num_to_chinese'])
+    chunk = "9" * 1000
+    pieces = list(pipeline.stream([chunk] * 200))
+    assert len(pieces) > 1
+    # 超长数字串按上限断开处理（每个数字转换后不超过几个汉字）
+    assert max(map(len, pieces)) <= (TextPipeline.MAX_CARRY + len(chunk)) * 8
+
+
+def test_line_navigation_and_position():
+    browser = TextBrowser()
+    browser.set_text("first\n\nthird line")
+    assert browser.browse("next_line") == setting.chars_dict[setting.current_lang]['\n']  # 空行
+    assert browser.browse("next_line") == "third line"
+    assert browser._row_column == (3, 1)
+    assert browser.browse("next_line") == "third line"  # 已是最后一行
+    assert browser.browse("prev_line") == setting.chars_dict[setting.current_lang]['\n']
+    assert browser.browse("prev_line") == "first"
+    assert browser.browse("next_char") == "i"
+    assert browser._row_column == (1, 2)
+
+
+def test_next_char_on_trailing_empty_line_reads_newline():
+    browser = TextBrowser()
+    browser.set_text("ab\n")
+    browser.browse("next_line")
+    assert browser.focus_pos == 3  # 结尾换行之后的空行
+    new_line = setting.chars_dict[setting.current_lang]['\n']
+    assert browser.browse("next_char") == new_line
+    assert browser.focus_pos == 2
+    assert browser.browse("next_char") == new_line
+
+
+def run_sequentially(steps: list, text: str) -> str:
+    """逐个步骤分别处理，作为合并扫描结果的对照"""
+    for name in steps:
+        text = TextPipeline([name]).run(text)
+    return text
+
+
+SAMPLE_TEXT = "Ｈｅｌｌｏ，  world!\n\n\n第二段：１２３\t 个  ** 标记 ## 和 *# 混合\n"
+
+
+def test_adjacent_tables_fuse_into_one_pass():
+    steps = ["to_halfwidth", "punc_to_newline", "remove_whitespace"]
+    pipeline = TextPipeline(steps)
+    assert pipeline.pass_count == 1
+    assert pipeline.run(SAMPLE_TEXT) == run_sequentially(steps, SAMPLE_TEXT)
+
+
+def test_adjacent_regex_steps_fuse_into_one_pass(monkeypatch):
+    monkeypatch.setitem(TextProcessor.STEPS, "strip_stars", [RegexStep(r'\*+', '-', '*')])
+    monkeypatch.setitem(TextProcessor.STEPS, "strip_hashes", [RegexStep(r'#+', '-', '#')])
+    steps = ["strip_stars", "strip_hashes"]
+    pipeline = TextPipeline(steps)
+    assert pipeline.pass_count == 1
+    assert pipeline.run(SAMPLE_TEXT) == run_sequentially(steps, SAMPLE_TEXT)
+    assert "".join(pipeline.stream(SAMPLE_TEXT[i:i + 3] for i in range(0, len(SAMPLE_TEXT), 3))) == \
+        pipeline.run(SAMPLE_TEXT)
+
+
+def test_regex_steps_that_interfere_are_not_fused(monkeypatch):
+    # 第一步的替换文本会被第二步匹配，同时替换与依次替换结果不同
+    monkeypatch.setitem(TextProcessor.STEPS, "stars_to_hash", [RegexStep(r'\*+', '#', '*')])
+    monkeypatch.setitem(TextProcessor.STEPS, "strip_hashes", [RegexStep(r'#+', '#', '#')])
+    steps = ["stars_to_hash", "strip_hashes"]
+    pipeline = TextPipeline(steps)
+    assert pipeline.pass_count == 2
+    assert pipeline.run(SAMPLE_TEXT) == run_sequentially(steps, SAMPLE_TEXT)
+    # 替换不同的相邻正则（如 merge_spaces 的两步）也分开扫描
+    assert TextPipeline(["merge_spaces"]).pass_count == 2
+
+
+def test_word_sentence_and_paragraph_navigation():
+    browser = TextBrowser()
+    browser.set_text("Hello world. It's a test! 你好世界。\n\nSecond para here.")
+    assert [browser.browse("next_word") for _ in range(3)] == ["world", "It's", "a"]
+    assert browser.browse("prev_word") == "It's"
+    assert browser.browse("next_sentence") == "你好世界。"
+    assert browser.browse("next_sentence") == "Second para here."
+    assert browser.browse("next_sentence") == "Second para here."  # 已是最后一句
+    assert browser.browse("prev_paragraph") == "Hello world. It's a test! 你好世界。"
+    assert browser.browse("next_paragraph") == "Second para here."
+    assert browser._row_column == (3, 1)
+
+
+def test_unit_rotor_moves_by_selected_unit():
+    browser = TextBrowser()
+    browser.set_text("one two\nthree")
+    assert browser.cycle_unit() == "word"
+    assert browser.browse("next_unit") == "two"
+    assert [browser.cycle_unit() for _ in range(3)] == ["sentence", "paragraph", "line"]
+    assert browser.browse("next_unit") == "three"
+    assert browser.cycle_unit() == "char"
+
+
+def test_char_navigation_keeps_grapheme_clusters():
+    browser = TextBrowser()
+    browser.set_text("e\u0301x\U0001F44D\U0001F3FDy\U0001F1E8\U0001F1F3\U0001F1FA\U0001F1F8z")
+    assert browser.browse("explain_char") == "e\u0301"  # 组合符号
+    steps = [browser.browse("next_char") for _ in range(6)]
+    assert steps == ["x", "\U0001F44D\U0001F3FD", "y", "\U0001F1E8\U0001F1F3", "\U0001F1FA\U0001F1F8", "z"]
+    assert browser.browse("next_char") == "z"  # 已是最后一个字
+    assert browser.browse("prev_char") == "\U0001F1FA\U0001F1F8"  # 国旗按区域指示符两两配对
+    assert browser.browse("prev_char") == "\U0001F1E8\U0001F1F3"
+
+
+def test_find_includes_match_at_focus():
+    browser = TextBrowser()
+    browser.set_text("abc abc")
+    browser.find("abc")
+    assert browser.focus_pos == 0
+    browser.find("abc")
+    assert browser.focus_pos == 4
+    assert browser.find("abc") is None
+    browser.find("abc", forward=False)
+    assert browser.focus_pos == 0
+
+
+def test_find_continues_after_restored_state():
+    browser = TextBrowser()
+    browser.set_text("Ｘ x X", key="a")
+    browser.find("x")
+    browser.set_text("other", key="b")
+    assert browser.set_text("Ｘ x X", key="a")
+    browser.find("x")
+    assert browser.focus_pos == 2
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("10005", "一万零五"),
+    ("1000000000000", "一万亿"),
+    ("123456789012345", "一百二十三万亿四千五百六十七亿八千九百零一万二千三百四十五"),
+    ("10000000000000000", "一京"),
+    ("3a5 and 3 a -5", "三a五 and 三 + 负五"),
+    ("2 m 3 D 4", "二 × 三 ÷ 四"),
+    # 紧贴数字的字母是单位，不是运算符号
+    ("1990s 2000s", "一千九百九十s 二千s"),
+    ("100m 200m", "一百m 二百m"),
+    ("5s 10s", "五s 十s"),
+    ("abc-5", "abc-五"),
+    ("12.5%", "百分之十二点五"),
+    ("1/3", "三分之一"),
+])
+def test_numerals_to_chinese(text, expected):
+    assert numerals_to_chinese(text) == expected
+    # 分块处理时运算符号和单位跨块也得到相同结果
+    pipeline = TextPipeline(['num_to_chinese'])
+    assert "".join(pipeline.stream(text[i:i + 2] for i in range(0, len(text), 2))) == expected
+
+
+@pytest.mark.parametrize("old, new, expected", [
+    ("hello", "hello world", " world"),
+    ("The cat sat on the mat", "The dog sat on the mat", "dog"),
+    ("translate", "translation", "translation"),  # 改动在单词中间时读整个词
+    ("hello world", "hello", ""),  # 纯删除不朗读
+    ("", "The dog sat on the mat", "The dog sat on the mat"),  # 程序写入后从空白重新朗读
+])
+def test_changed_segment(old, new, expected):
+    assert changed_segment(old, new) == expected
+
+
+def test_phrase_ring_buffer_keeps_latest():
+    backend = FakeScreenReaderBackend()
+    handler = VoiceOverHandler(backend=backend, phrase_capacity=3)
+    for text in ("one", "two", "two", "three", "four"):
+        backend.set_phrase(text)
+        handler._run_task()
+    # 连续相同的朗读只记一次，超出容量覆盖最旧的
+    assert [text for text, _ in handler.get_recent_phrases(10)] == ["two", "three", "four"]
+    assert [text for text, _ in handler.get_recent_phrases(2)] == ["three", "four"]
+
+
+def test_latest_phrase_reads_buffer_while_monitoring():
+    backend = FakeScreenReaderBackend("first")
+    handler = VoiceOverHandler(backend=backend, loop_interval=60)
+    # 未监听时直接查询
+    assert handler.latest_phrase()[0] == "first"
+    handler.start_worker()
+    try:
+        deadline = time.monotonic() + 5
+        while not handler.get_recent_phrases(1) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        queries = backend.call_stats()['last_phrase']
+        calls = sum(caller['calls'] for caller in queries.values())
+        backend.set_phrase("second")
+        # 监听时从缓冲区读取，不发起查询，下次轮询之前是旧内容
+        assert handler.latest_phrase()[0] == "first"
+        queries = backend.call_stats()['last_phrase']
+        assert sum(caller['calls'] for caller in queries.values()) == calls
+    finally:
+        handler.stop_worker()
@@ -0,0 +1,32 @@
+import pytest
+
+import diagnostics
+
+from screen_reader import FakeScreenReaderBackend
+
+
+def test_fake_backend_round_trip():
+    backend = FakeScreenReaderBackend("hello")
+    assert backend.last_phrase() == "hello"
+    backend.set_phrase("world")
+    assert backend.last_phrase() == "world"
+    backend.output("spoken")
+    assert backend.spoken == ["spoken"]
+
+
+def test_failures_are_counted_per_caller():
+    backend = FakeScreenReaderBackend("hello")
+    backend.fail_next()
+    with pytest.raises(RuntimeError):
+        backend.last_phrase()
+    with diagnostics.tracer.trace("on_hotkey_test"):
+        backend.last_phrase()
+        backend.last_phrase()
+
+    stats = backend.call_stats()['last_phrase']
+    assert stats['on_hotkey_test']['calls'] == 2
+    assert stats['on_hotkey_test']['failures'] == 0
+    assert sum(caller['failures'] for caller in stats.values()) == 1
+
+    backend.reset_stats()
+    assert backend.call_stats() == {}